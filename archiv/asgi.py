@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'archiv.settings')
+os.environ.setdefault('ARCHIV_ROOT_URLCONF', 'archiv.urls_async')
 
 application = get_asgi_application()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,16 +35,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'archiv_app.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'archiv_app.middleware.ReplicaStickinessMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'archiv.urls'
+# ASGI nasazení (archiv/asgi.py) používá archiv.urls_async s asynchronními pohledy.
+ROOT_URLCONF = os.environ.get('ARCHIV_ROOT_URLCONF', 'archiv.urls')
 
 TEMPLATES = [
     {
@@ -66,14 +70,46 @@ WSGI_APPLICATION = 'archiv.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite pro souběžný provoz: čekání na zámek místo okamžité chyby „database is locked“
+# a zápisové transakce rovnou přes BEGIN IMMEDIATE. Režim WAL (čtenáři neblokují zapisovatele)
+# se ukládá přímo do souboru databáze, nastaví ho proto jednou migrace 0016_sqlite_wal.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f"PRAGMA {nazev}={hodnota}" for nazev, hodnota in SQLITE_PRAGMAS.items()),
+        },
     }
 }
 
 
+# Čtecí replika: soubor s kopií primární databáze (např. udržovanou přes litestream nebo
+# `sqlite3 .backup`). Seznamy a vyhledávání čtou z ní, zápisy jdou vždy do 'default'.
+# Bez ARCHIV_REPLICA_DB ukazuje alias na primární soubor a čte se jen z primární databáze.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.environ.get('ARCHIV_REPLICA_DB', DATABASES['default']['NAME']),
+    # Z repliky se jen čte; BEGIN IMMEDIATE by si na ní zbytečně bral zápisový zámek.
+    'OPTIONS': {nazev: hodnota for nazev, hodnota in DATABASES['default']['OPTIONS'].items() if nazev != 'transaction_mode'},
+}
+DATABASE_ROUTERS = ['archiv_app.routers.ReplicaRouter']
+ARCHIV_READ_REPLICA = 'replica' if os.environ.get('ARCHIV_REPLICA_DB') else None
+# Jak dlouho po zápisu čte klient z primární databáze (read-your-writes)
+ARCHIV_REPLICA_STICKY_SECONDS = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,3 +170,58 @@ CRISPY_CLASS_CONVERTERS = {
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Stránkování seznamů (keyset)
+ARCHIV_PAGE_SIZE = 50
+ARCHIV_PAGE_SIZE_CHOICES = (25, 50, 100, 200)
+
+# Fasety seznamů dokumentů a fotografií: kolik nejčastějších hodnot se u fasety nabídne
+ARCHIV_FACET_LIMIT = 20
+
+# Cache vykreslených řádků seznamů dokumentů a fotografií v sekundách (0 = necachovat)
+ARCHIV_ROW_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Denormalizovaný počet archiválií u osob (udržován signály, opravuje příkaz `recount`)
+ARCHIV_DENORMALIZED_COUNTS = False
+
+# Fulltextové vyhledávání (SQLite FTS5)
+ARCHIV_SEARCH_LIMIT = 100
+
+# Našeptávač osob ve formulářích dokumentů a fotografií: nejvýše tolik návrhů na jeden dotaz
+ARCHIV_AUTOCOMPLETE_LIMIT = 20
+
+# Náhledy fotografií (vyžaduje Pillow)
+ARCHIV_THUMBNAIL_SIZE = (320, 320)
+ARCHIV_THUMBNAIL_WORKERS = 2
+ARCHIV_THUMBNAILS_ASYNC = True
+
+# Text nahraných souborů (PDF přes pypdf, ODT, DOCX, TXT) pro fulltext; doplnění u starších souborů: `extract_text`
+ARCHIV_EXTRACT_WORKERS = 2
+ARCHIV_EXTRACT_ASYNC = True
+ARCHIV_EXTRACT_MAX_CHARS = 2_000_000
+
+# Servírování médií: None = přímo z Djanga (Range, ETag, sendfile přes wsgi.file_wrapper),
+# 'x-accel-redirect' = předání nginxu, 'x-sendfile' = předání Apache/lighttpd
+ARCHIV_MEDIA_SENDFILE = None
+ARCHIV_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Hromadné mazání: soubory se z disku odstraní až po potvrzení transakce na pozadí
+# (False = hned po potvrzení ve vlákně požadavku); co se nepodaří, uklidí příkaz `gc_soubory`
+ARCHIV_UNLINK_ASYNC = True
+
+# Fronta úloh v databázi (příkaz `runworker`): True = náhledy, extrakce textu a mazání souborů se zařadí jako úlohy
+# místo vláken a procesů webového serveru; vyžaduje běžícího pracovníka
+ARCHIV_JOB_QUEUE = False
+ARCHIV_JOB_WORKERS = 2
+ARCHIV_JOB_MAX_ATTEMPTS = 5
+ARCHIV_JOB_BACKOFF = 30
+ARCHIV_JOB_MAX_BACKOFF = 60 * 60
+# Zámek zabrané úlohy v sekundách; běžící pracovník ho průběžně prodlužuje, vyprší jen po jeho pádu
+ARCHIV_JOB_LEASE = 10 * 60
+
+# Měření požadavků (ServerTimingMiddleware): hlavička Server-Timing s časem SQL, šablon a pohledu,
+# log pomalých požadavků s nejpomalejšími dotazy a dotazů opakovaných v jednom požadavku (N+1)
+ARCHIV_SERVER_TIMING = False
+ARCHIV_SLOW_REQUEST_MS = 500
+ARCHIV_SLOW_QUERIES_LOGGED = 5
+ARCHIV_DUPLICATE_QUERY_LIMIT = 5
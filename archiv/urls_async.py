@@ -0,0 +1,21 @@
+"""
+URL configuration for the ASGI deployment (see archiv/asgi.py).
+
+Same routes as archiv.urls; list views, the main page and media downloads use
+their async variants so slow clients do not hold worker threads.
+"""
+from django.contrib import admin
+from django.urls import path, include
+from django.conf import settings
+from django.views.generic import RedirectView
+
+from archiv_app.media import aserve_media
+from archiv_app.urls import async_urlpatterns
+
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', RedirectView.as_view(url='archiv_app/', permanent=False)),
+    path('archiv_app/', include((async_urlpatterns, 'archiv_app'))),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", aserve_media, name='media'),
+]
@@ -7,7 +7,7 @@ from polymorphic.admin import (
 
 from .models import (
     Osoba, Soubor, ArchivovanyObjekt,
-    Dokument, Fotografie, Druh
+    Dokument, Fotografie, Druh, Uloha
 )
 
 @admin.register(Osoba)
@@ -18,7 +18,8 @@ class OsobaAdmin(admin.ModelAdmin):
 
 @admin.register(Soubor)
 class SouborAdmin(admin.ModelAdmin):
-    list_display = ("file",)
+    list_display = ("file", "velikost", "pocet_odkazu")
+    search_fields = ("file", "sha256")
 
 
 @admin.register(Druh)
@@ -48,3 +49,9 @@ class ArchivovanyObjektAdmin(PolymorphicParentModelAdmin):
     child_models = (Dokument, Fotografie)
     list_filter = (PolymorphicChildModelFilter,)
     list_display = ("id", "typ", "osoba", "datum_archivace", "get_datace_display")
+
+
+@admin.register(Uloha)
+class UlohaAdmin(admin.ModelAdmin):
+    list_display = ("id", "nazev", "stav", "pokusy", "spustit_po", "trvani", "pracovnik")
+    list_filter = ("stav", "nazev")
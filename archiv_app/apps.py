@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ArchivAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'archiv_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
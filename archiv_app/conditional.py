@@ -0,0 +1,71 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, F, Func, Max, Subquery, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Pocitadlo
+
+
+def _verze(versions):
+    return Pocitadlo.objects.filter(nazev__in=versions).order_by()
+
+
+def compute_validators(request, upraveno, pocet, verze, zmeneno):
+    last_modified = max((cas for cas in (upraveno, zmeneno) if cas), default=None)
+    # Stránky obsahují CSRF token, proto ETag závisí i na CSRF cookie daného klienta.
+    parts = [
+        upraveno.isoformat() if upraveno else '',
+        pocet,
+        verze,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    etag = quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def _list_state(versions):
+    # Stav tabulky i verze souvisejících tabulek jedním dotazem.
+    verze = _verze(versions)
+    return {
+        'upraveno': Max('upraveno'),
+        'pocet': Count('pk'),
+        'verze': Max(Subquery(verze.annotate(soucet=Func(F('hodnota'), function='SUM')).values('soucet'))),
+        'zmeneno': Max(Subquery(verze.annotate(posledni=Func(F('zmeneno'), function='MAX')).values('posledni'))),
+    }
+
+
+def list_validators(request, queryset, versions):
+    return compute_validators(request, **queryset.order_by().aggregate(**_list_state(versions)))
+
+
+async def alist_validators(request, queryset, versions):
+    return compute_validators(request, **await queryset.order_by().aaggregate(**_list_state(versions)))
+
+
+def object_validators(request, obj, versions):
+    stav = _verze(versions).aggregate(verze=Sum('hodnota'), zmeneno=Max('zmeneno'))
+    return compute_validators(request, obj.upraveno, 1, **stav)
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def not_modified_response(request, validators):
+    # Čekající zprávy se musí vykreslit, odpověď 304 by je odložila na další stránku.
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, validators)
+    return response
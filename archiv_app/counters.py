@@ -0,0 +1,63 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Dokument, Fotografie, Osoba, Pocitadlo
+
+COUNTERS = {
+    'dokumenty': Dokument,
+    'fotografie': Fotografie,
+    'osoby': Osoba,
+}
+# Verze tabulek se zvyšují při každé změně řádků i vazeb, včetně mazání.
+VERSIONS = ('verze_objekty', 'verze_osoby', 'verze_druhy')
+
+
+def actual_count(nazev):
+    return COUNTERS[nazev].objects.count()
+
+
+def increment(nazev, rozdil=1):
+    if not rozdil:
+        return
+    if not Pocitadlo.objects.filter(nazev=nazev).update(hodnota=F('hodnota') + rozdil, zmeneno=timezone.now()):
+        # Chybějící řádek se založí ze skutečného stavu, který už změnu obsahuje.
+        Pocitadlo.objects.get_or_create(nazev=nazev, defaults={'hodnota': actual_count(nazev)})
+
+
+def get_counts():
+    counts = dict(Pocitadlo.objects.filter(nazev__in=COUNTERS).values_list('nazev', 'hodnota'))
+    for nazev in COUNTERS.keys() - counts.keys():
+        counts[nazev] = Pocitadlo.objects.get_or_create(nazev=nazev, defaults={'hodnota': actual_count(nazev)})[0].hodnota
+    return counts
+
+
+async def aget_counts():
+    counts = {nazev: hodnota async for nazev, hodnota in Pocitadlo.objects.filter(nazev__in=COUNTERS).values_list('nazev', 'hodnota')}
+    for nazev in COUNTERS.keys() - counts.keys():
+        pocitadlo, _ = await Pocitadlo.objects.aget_or_create(nazev=nazev, defaults={'hodnota': await COUNTERS[nazev].objects.acount()})
+        counts[nazev] = pocitadlo.hodnota
+    return counts
+
+
+def reconcile(dry_run=False):
+    # Vrací seznam (název, uloženo, skutečně) pro počítadla, která se rozešla se skutečností.
+    ulozene = dict(Pocitadlo.objects.filter(nazev__in=COUNTERS).values_list('nazev', 'hodnota'))
+    odchylky = []
+    for nazev in COUNTERS:
+        skutecne = actual_count(nazev)
+        if ulozene.get(nazev) != skutecne:
+            odchylky.append((nazev, ulozene.get(nazev), skutecne))
+            if not dry_run:
+                Pocitadlo.objects.update_or_create(nazev=nazev, defaults={'hodnota': skutecne})
+    return odchylky
+
+
+def bump_version(nazev):
+    if not Pocitadlo.objects.filter(nazev=nazev).update(hodnota=F('hodnota') + 1, zmeneno=timezone.now()):
+        Pocitadlo.objects.get_or_create(nazev=nazev, defaults={'hodnota': 1})
+
+
+def get_versions(nazvy):
+    # Vrací {název: (verze, čas změny)}; chybějící verze znamená, že se tabulka dosud neměnila.
+    return {nazev: (hodnota, zmeneno) for nazev, hodnota, zmeneno in
+            Pocitadlo.objects.filter(nazev__in=nazvy).values_list('nazev', 'hodnota', 'zmeneno')}
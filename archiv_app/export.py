@@ -0,0 +1,169 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Dokument, Fotografie, Osoba
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+OBJEKT_COLUMNS = [
+    'id', 'typ', 'popis', 'datum_archivace', 'datace', 'typ_datace',
+    'datum_vzniku_presne', 'rok_vzniku', 'stoleti_vzniku', 'osoby', 'soubor',
+]
+EXPORT_COLUMNS = {
+    'dokumenty': OBJEKT_COLUMNS + ['druh', 'jazyk', 'jazyk_nazev'],
+    'fotografie': OBJEKT_COLUMNS + ['typ_fotografie', 'vyska', 'sirka'],
+    'osoby': ['id', 'typ', 'jmeno', 'prijmeni', 'narozeni', 'umrti', 'pohlavi'],
+}
+
+
+def _osoby_queryset():
+    return Osoba.objects.order_by().only('jmeno', 'prijmeni')
+
+
+def _objekty(model):
+    return (
+        model.objects.non_polymorphic()
+        .select_related('osoba', 'soubor')
+        .prefetch_related(Prefetch('osoby', queryset=_osoby_queryset()))
+        .order_by('pk')
+    )
+
+
+def _typ_datace(objekt):
+    if objekt.datum_vzniku_presne:
+        return 'datum'
+    if objekt.rok_vzniku:
+        return 'rok'
+    if objekt.stoleti_vzniku:
+        return 'stoleti'
+    return ''
+
+
+def _osoby(objekt):
+    osoby = ([objekt.osoba] if objekt.osoba else []) + [p for p in objekt.osoby.all() if p.pk != objekt.osoba_id]
+    return [{'jmeno': p.jmeno, 'prijmeni': p.prijmeni} for p in osoby]
+
+
+def _objekt_record(objekt):
+    return {
+        'id': objekt.pk,
+        'typ': objekt.typ,
+        'popis': objekt.popis,
+        'datum_archivace': objekt.datum_archivace,
+        'datace': objekt.get_datace_display(),
+        'typ_datace': _typ_datace(objekt),
+        'datum_vzniku_presne': objekt.datum_vzniku_presne,
+        'rok_vzniku': objekt.rok_vzniku,
+        'stoleti_vzniku': objekt.stoleti_vzniku,
+        'osoby': _osoby(objekt),
+        'soubor': objekt.soubor.file.name if objekt.soubor else '',
+    }
+
+
+def dokument_record(dokument):
+    record = _objekt_record(dokument)
+    record.update({
+        'druh': dokument.druh.nazev if dokument.druh else '',
+        'jazyk': dokument.jazyk,
+        'jazyk_nazev': dokument.get_jazyk_display(),
+    })
+    return record
+
+
+def fotografie_record(foto):
+    record = _objekt_record(foto)
+    record.update({
+        'typ_fotografie': foto.typ_fotografie,
+        'vyska': foto.vyska,
+        'sirka': foto.sirka,
+    })
+    return record
+
+
+OBJEKT_RECORDS = {
+    'dokument': dokument_record,
+    'fotografie': fotografie_record,
+}
+
+
+def objekt_record(objekt):
+    return OBJEKT_RECORDS[objekt.typ](objekt)
+
+
+def iter_dokumenty():
+    for dokument in _objekty(Dokument).select_related('druh').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield dokument_record(dokument)
+
+
+def iter_fotografie():
+    for foto in _objekty(Fotografie).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield fotografie_record(foto)
+
+
+def iter_osoby():
+    for osoba in Osoba.objects.order_by('pk').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'id': osoba.pk,
+            'typ': 'osoba',
+            'jmeno': osoba.jmeno,
+            'prijmeni': osoba.prijmeni,
+            'narozeni': osoba.narozeni,
+            'umrti': osoba.umrti,
+            'pohlavi': osoba.pohlavi or '',
+        }
+
+
+EXPORT_SOURCES = {
+    'dokumenty': iter_dokumenty,
+    'fotografie': iter_fotografie,
+    'osoby': iter_osoby,
+}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_osoba(osoba):
+    # Import dělí „Jméno Příjmení“ podle poslední mezery; víceslovné příjmení se proto píše jako „Příjmení, Jméno“.
+    if ' ' in osoba['prijmeni'].strip():
+        return f"{osoba['prijmeni']}, {osoba['jmeno']}"
+    return f"{osoba['jmeno']} {osoba['prijmeni']}"
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '; '.join(_csv_osoba(p) for p in value)
+    return value
+
+
+def render_csv(records, columns):
+    writer = csv.writer(_Echo())
+    # BOM kvůli správnému zobrazení češtiny v tabulkových procesorech; import jej ignoruje.
+    yield '\ufeff' + writer.writerow(columns)
+    for record in records:
+        yield writer.writerow([_csv_value(record[column]) for column in columns])
+
+
+def render_jsonl(records, columns):
+    for record in records:
+        yield json.dumps({column: record[column] for column in columns}, ensure_ascii=False, default=str) + '\n'
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'jsonl': render_jsonl,
+}
+
+
+def stream_export(typ, fmt):
+    return RENDERERS[fmt](EXPORT_SOURCES[typ](), EXPORT_COLUMNS[typ])
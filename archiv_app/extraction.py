@@ -0,0 +1,187 @@
+import logging
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .storage import hash_file
+
+try:
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+except ImportError:
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXTRACT_WORKERS = 2
+DEFAULT_MAX_CHARS = 2_000_000
+TEXT_ENCODINGS = ('utf-8-sig', 'cp1250', 'latin-1')
+ODT_TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+DOCX_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+_executor = None
+
+
+class Nepodporovano(Exception):
+    # Formát nebo chybějící knihovna; soubor se zpracuje, až to bude možné (nic se neukládá).
+    pass
+
+
+def get_extract_workers():
+    return getattr(settings, 'ARCHIV_EXTRACT_WORKERS', DEFAULT_EXTRACT_WORKERS)
+
+
+def _suffix(name):
+    return PurePosixPath(name).suffix.lower()
+
+
+def _pdf_text(path):
+    if PdfReader is None:
+        raise Nepodporovano("Pro PDF je potřeba nainstalovat knihovnu pypdf.")
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def _txt_text(path):
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+
+def _xml_paragraphs(path, member, paragraph_tag):
+    with zipfile.ZipFile(path) as archive, archive.open(member) as handle:
+        root = ElementTree.parse(handle).getroot()
+    return '\n'.join(''.join(paragraph.itertext()) for paragraph in root.iter(paragraph_tag))
+
+
+def _odt_text(path):
+    # Nadpisy (text:h) i odstavce (text:p); vnořené odstavce v tabulkách prochází iter().
+    with zipfile.ZipFile(path) as archive, archive.open('content.xml') as handle:
+        root = ElementTree.parse(handle).getroot()
+    tags = {f'{{{ODT_TEXT_NS}}}p', f'{{{ODT_TEXT_NS}}}h'}
+    return '\n'.join(''.join(element.itertext()) for element in root.iter() if element.tag in tags)
+
+
+def _docx_text(path):
+    return _xml_paragraphs(path, 'word/document.xml', f'{{{DOCX_NS}}}p')
+
+
+EXTRACTORS = {
+    '.pdf': _pdf_text,
+    '.txt': _txt_text,
+    '.odt': _odt_text,
+    '.docx': _docx_text,
+}
+
+
+def is_supported(name):
+    suffix = _suffix(name)
+    return suffix in EXTRACTORS and (suffix != '.pdf' or PdfReader is not None)
+
+
+def extract_text(path, max_chars=DEFAULT_MAX_CHARS):
+    # Běží v pracovním procesu – pracuje pouze s cestou, bez ORM. Vrací (text, chyba).
+    extractor = EXTRACTORS.get(_suffix(path))
+    if extractor is None:
+        raise Nepodporovano(f"Formát {_suffix(path) or '(bez přípony)'} není podporován.")
+    try:
+        text = extractor(path)
+    except Nepodporovano:
+        raise
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        return '', f"{type(e).__name__}: {e}"
+    except Exception as e:
+        if PdfReader is not None and isinstance(e, PdfReadError):
+            return '', f"{type(e).__name__}: {e}"
+        raise
+    # Bílé znaky se sloučí; FTS z nich stejně nic neindexuje a text se lépe komprimuje.
+    text = ' '.join((text or '').split())
+    return text[:max_chars], ''
+
+
+def extraction_job(soubor, known_sha256=None):
+    max_chars = getattr(settings, 'ARCHIV_EXTRACT_MAX_CHARS', DEFAULT_MAX_CHARS)
+    return soubor.pk, (default_storage.path(soubor.file.name), soubor.sha256, known_sha256, max_chars)
+
+
+def run_extraction_job(args):
+    # Vrací (sha256, text, chyba); text None znamená, že se obsah od minulé extrakce nezměnil.
+    path, sha256, known_sha256, max_chars = args
+    sha256 = sha256 or hash_file(path)
+    if sha256 == known_sha256:
+        return sha256, None, ''
+    try:
+        text, chyba = extract_text(path, max_chars)
+    except Nepodporovano as e:
+        return sha256, None, str(e)
+    return sha256, text, chyba
+
+
+def store_result(soubor_pk, sha256, text, chyba):
+    # Vrací True, pokud se obsah uložil (a přeindexovaly objekty se souborem).
+    from . import search
+    from .models import ObsahSouboru, Soubor
+    if text is None:
+        if chyba:
+            logger.info("Soubor #%s: %s", soubor_pk, chyba)
+        return False
+    with transaction.atomic():
+        if not Soubor.objects.filter(pk=soubor_pk).exists():
+            return False
+        obsah = ObsahSouboru(soubor_id=soubor_pk, sha256=sha256, chyba=chyba)
+        obsah.text = text
+        obsah.save()
+        search.index_soubory([soubor_pk])
+    if chyba:
+        logger.warning("Text souboru #%s se nepodařilo vytáhnout: %s", soubor_pk, chyba)
+    return True
+
+
+def extract_now(soubor):
+    soubor_pk, args = extraction_job(soubor)
+    return store_result(soubor_pk, *run_extraction_job(args))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=get_extract_workers())
+    return _executor
+
+
+def _on_done(soubor_pk, future):
+    try:
+        store_result(soubor_pk, *future.result())
+    except Exception:
+        logger.exception("Extrakce textu souboru #%s selhala.", soubor_pk)
+    finally:
+        connection.close()
+
+
+def generate(soubor):
+    if not soubor.file or not is_supported(soubor.file.name):
+        return
+    if not getattr(settings, 'ARCHIV_EXTRACT_ASYNC', True):
+        extract_now(soubor)
+        return
+    soubor_pk, args = extraction_job(soubor)
+    _get_executor().submit(run_extraction_job, args).add_done_callback(lambda f: _on_done(soubor_pk, f))
+
+
+def schedule(soubor):
+    from . import jobs
+    if not soubor.file or not is_supported(soubor.file.name):
+        return
+    if jobs.is_enabled():
+        jobs.enqueue('extrahovat_text', soubor_id=soubor.pk)
+        return
+    transaction.on_commit(lambda: generate(soubor))
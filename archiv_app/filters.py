@@ -0,0 +1,179 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast, Concat
+
+from .models import BEZ_DATACE, NEJDELSI_DATACE_LET, STOLETÍ_CHOICES, ArchivovanyObjekt, Dokument
+
+# Objekty bez datace jsou v obou směrech až na konci.
+RAZENI = {
+    'datace': [BEZ_DATACE.asc(), 'datace_od', 'datace_do', 'pk'],
+    '-datace': ['-datace_od', '-datace_do', '-pk'],
+}
+RAZENI_CHOICES = [
+    ('', 'Podle data archivace'),
+    ('datace', 'Podle datace – od nejstarších'),
+    ('-datace', 'Podle datace – od nejmladších'),
+]
+
+
+# Fasety seznamů: parametr v URL -> sloupec, podle kterého se filtruje a seskupuje, a jeho popisek.
+FACETY = {
+    'jazyk': {'titulek': 'Jazyk', 'pole': 'jazyk', 'choices': Dokument.JAZYK_CHOICES},
+    'druh': {'titulek': 'Druh', 'pole': 'druh_id', 'popisek': F('druh__nazev'), 'cislo': True},
+    'stoleti': {'titulek': 'Století', 'pole': 'stoleti_vzniku', 'choices': STOLETÍ_CHOICES},
+    'typ_fotografie': {'titulek': 'Typ fotografie', 'pole': 'typ_fotografie'},
+    'osoba': {
+        'titulek': 'Osoba',
+        'pole': 'osoby__id',
+        'popisek': Concat('osoby__prijmeni', Value(' '), 'osoby__jmeno'),
+        'cislo': True,
+        'vazba': True,
+    },
+}
+DEFAULT_FACET_LIMIT = 20
+
+
+def _rok(request, key):
+    try:
+        rok = int(request.GET.get(key, ''))
+    except ValueError:
+        return None
+    return rok if datetime.MINYEAR <= rok <= datetime.MAXYEAR else None
+
+
+def datace_filter(request):
+    od, do = _rok(request, 'datace_od'), _rok(request, 'datace_do')
+    if od is not None and do is not None and od > do:
+        od, do = do, od
+    return {'datace_od': od, 'datace_do': do, 'prekryv': request.GET.get('prekryv') == '1'}
+
+
+def filter_datace(queryset, datace_od=None, datace_do=None, prekryv=False):
+    # Bez příznaku překryvu musí celá datace ležet v rozmezí; s ním stačí, aby do něj zasahovala.
+    zacatek = datetime.date(datace_od, 1, 1) if datace_od is not None else None
+    konec = datetime.date(datace_do, 12, 31) if datace_do is not None else None
+    if konec is not None:
+        queryset = queryset.filter(datace_od__lte=konec)
+        if not prekryv:
+            queryset = queryset.filter(datace_do__lte=konec)
+    if zacatek is not None:
+        if prekryv:
+            # Datace je nejvýš stoletá, takže i překryv dává dolní mez pro datace_od a index projde jen úsek.
+            nejdrive = zacatek.replace(year=max(zacatek.year - NEJDELSI_DATACE_LET, datetime.MINYEAR))
+            queryset = queryset.filter(datace_do__gte=zacatek, datace_od__gte=nejdrive)
+        else:
+            queryset = queryset.filter(datace_od__gte=zacatek)
+    return queryset
+
+
+def razeni(request):
+    return RAZENI.get(request.GET.get('razeni'))
+
+
+def facet_filter(request, nazvy):
+    vybrane = {}
+    for nazev in nazvy:
+        facet, hodnota = FACETY[nazev], request.GET.get(nazev, '')
+        if facet.get('cislo'):
+            hodnota = hodnota if hodnota.isdigit() else ''
+        elif 'choices' in facet and hodnota not in dict(facet['choices']):
+            hodnota = ''
+        if hodnota:
+            vybrane[nazev] = hodnota
+    return vybrane
+
+
+def filter_facets(queryset, vybrane):
+    for nazev, hodnota in vybrane.items():
+        facet = FACETY[nazev]
+        if facet.get('vazba'):
+            # Přes podotaz místo joinu, aby join na osoby zůstal volný pro seskupení fasety osob.
+            objekty = ArchivovanyObjekt.osoby.through.objects.filter(osoba_id=hodnota).values('archivovanyobjekt_id')
+            queryset = queryset.filter(pk__in=objekty)
+        else:
+            queryset = queryset.filter(**{facet['pole']: hodnota})
+    return queryset
+
+
+def facet_counts_queryset(queryset, nazvy, vybrane):
+    # Každá faseta se počítá bez vlastního výběru (ukazuje, co zbude po jeho změně);
+    # všechny fasety jdou jedním dotazem UNION ALL seskupených větví.
+    queryset = queryset.select_related(None).prefetch_related(None).order_by()
+    vetve = []
+    for nazev in nazvy:
+        facet = FACETY[nazev]
+        ostatni = {k: v for k, v in vybrane.items() if k != nazev}
+        vetev = filter_facets(queryset, ostatni).filter(**{f"{facet['pole']}__isnull": False})
+        if not facet.get('cislo'):
+            vetev = vetev.exclude(**{facet['pole']: ''})
+        vetve.append(
+            vetev.values(
+                faseta=Value(nazev),
+                hodnota=Cast(facet['pole'], CharField()),
+                popisek=facet.get('popisek', Value('')),
+            )
+            .annotate(pocet=Count('pk'))
+        )
+    return vetve[0].union(*vetve[1:], all=True)
+
+
+def _facety(radky_vsech, nazvy, vybrane):
+    limit = getattr(settings, 'ARCHIV_FACET_LIMIT', DEFAULT_FACET_LIMIT)
+    radky = {nazev: [] for nazev in nazvy}
+    for radek in radky_vsech:
+        radky[radek['faseta']].append(radek)
+
+    facety = []
+    for nazev in nazvy:
+        facet = FACETY[nazev]
+        if 'choices' in facet:
+            poradi = {hodnota: i for i, (hodnota, _) in enumerate(facet['choices'])}
+            popisky = dict(facet['choices'])
+            moznosti = sorted(radky[nazev], key=lambda r: poradi.get(r['hodnota'], len(poradi)))
+            for radek in moznosti:
+                radek['popisek'] = popisky.get(radek['hodnota'], radek['hodnota'])
+        else:
+            moznosti = sorted(radky[nazev], key=lambda r: (-r['pocet'], r['popisek'] or r['hodnota']))
+            for radek in moznosti:
+                radek['popisek'] = radek['popisek'] or radek['hodnota']
+        # U dlouhých faset (osoby) jen nejčastější hodnoty, vybraná hodnota ale zůstane vždy.
+        vybrana = vybrane.get(nazev)
+        moznosti = [r for i, r in enumerate(moznosti) if i < limit or r['hodnota'] == vybrana]
+        facety.append({'nazev': nazev, 'titulek': facet['titulek'], 'vybrano': vybrana or '', 'moznosti': moznosti})
+    return facety
+
+
+def facet_counts(queryset, nazvy, vybrane):
+    if not nazvy:
+        return []
+    return _facety(list(facet_counts_queryset(queryset, nazvy, vybrane)), nazvy, vybrane)
+
+
+async def afacet_counts(queryset, nazvy, vybrane):
+    if not nazvy:
+        return []
+    return _facety([radek async for radek in facet_counts_queryset(queryset, nazvy, vybrane)], nazvy, vybrane)
+
+
+def _list_filters(request, queryset, facety):
+    filtr = datace_filter(request)
+    context = {
+        **filtr,
+        'razeni': request.GET.get('razeni') if request.GET.get('razeni') in RAZENI else '',
+        'razeni_choices': RAZENI_CHOICES,
+    }
+    return filter_datace(queryset, **filtr), facet_filter(request, facety), context
+
+
+def apply_list_filters(request, queryset, facety=()):
+    queryset, vybrane, context = _list_filters(request, queryset, facety)
+    context['facety'] = facet_counts(queryset, facety, vybrane)
+    return filter_facets(queryset, vybrane), context
+
+
+async def aapply_list_filters(request, queryset, facety=()):
+    queryset, vybrane, context = _list_filters(request, queryset, facety)
+    context['facety'] = await afacet_counts(queryset, facety, vybrane)
+    return filter_facets(queryset, vybrane), context
@@ -4,9 +4,11 @@ from django.utils.safestring import mark_safe
 from django.urls import reverse
 from datetime import date
 from .models import *
+from . import extraction, storage, thumbnails
 
 TEXTAREA_ROWS = 3
 OSOBA_SELECT_SIZE = 8
+DEFAULT_AUTOCOMPLETE_LIMIT = 20
 MIN_YEAR = 1000
 MAX_YEAR = 2100
 
@@ -22,23 +24,124 @@ DATACE_CHOICES = [
     ('stoleti', 'Století'),
 ]
 
+def validate_datace(typ_datace, datum_presne, rok, stoleti):
+    errors = []
+    if typ_datace == 'datum':
+        if not datum_presne:
+            errors.append(('datum_vzniku_presne', "Při typu datace 'Přesné datum' musí být datum vyplněno."))
+        if rok or stoleti:
+            errors.append(('typ_datace', "Pokud je zvoleno 'Přesné datum', pole Rok a Století musí být prázdná."))
+
+    elif typ_datace == 'rok':
+        if not rok:
+            errors.append(('rok_vzniku', "Při typu datace 'Rok' musí být rok vyplněn."))
+        if datum_presne or stoleti:
+            errors.append(('typ_datace', "Pokud je zvolen 'Rok', pole Přesné datum a Století musí být prázdná."))
+
+    elif typ_datace == 'stoleti':
+        if not stoleti:
+            errors.append(('stoleti_vzniku', "Při typu datace 'Století' musí být století vyplněno."))
+        if datum_presne or rok:
+            errors.append(('typ_datace', "Pokud je zvoleno 'Století', pole Přesné datum a Rok musí být prázdná."))
+    return errors
+
+def validate_datum_vzniku(datum):
+    if datum:
+        if datum > date.today():
+            raise ValidationError("Datum vzniku nemůže být v budoucnosti.")
+        if datum.year < MIN_YEAR:
+            raise ValidationError(f"Rok v datu vzniku musí být {MIN_YEAR} nebo pozdější.")
+
+def validate_zivotni_data(narozeni, umrti):
+    errors = []
+    today = date.today()
+
+    if narozeni:
+        if narozeni > today:
+            errors.append(('narozeni', "Datum narození nemůže být v budoucnosti."))
+        if narozeni.year < MIN_YEAR:
+            errors.append(('narozeni', f"Rok narození musí být {MIN_YEAR} nebo pozdější."))
+
+    if umrti:
+        if umrti > today:
+            errors.append(('umrti', "Datum úmrtí nemůže být v budoucnosti."))
+        if umrti.year < MIN_YEAR:
+            errors.append(('umrti', f"Rok úmrtí musí být {MIN_YEAR} nebo pozdější."))
+
+    if narozeni and umrti:
+        if umrti < narozeni:
+            errors.append(('umrti', "Datum úmrtí nemůže být před datem narození."))
+        elif umrti == narozeni:
+            errors.append(('umrti', "Datum úmrtí nemůže být stejné jako datum narození."))
+    return errors
+
+def osoba_popisek(osoba):
+    zivotni_data = ''
+    if osoba.narozeni or osoba.umrti:
+        zivotni_data = f" ({osoba.narozeni.year if osoba.narozeni else '?'}–{osoba.umrti.year if osoba.umrti else ''})"
+    return f"{osoba.prijmeni} {osoba.jmeno}{zivotni_data}"
+
+class OsobyAutocompleteWidget(forms.SelectMultiple):
+    # Vykreslí jen vybrané osoby; další se dohledávají přes JSON našeptávač (static/js/form.js).
+    def __init__(self, attrs=None):
+        super().__init__(attrs={'size': OSOBA_SELECT_SIZE, 'data-autocomplete': 'osoby', **(attrs or {})})
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse('archiv_app:osoby_autocomplete')
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        ids = [str(pk) for pk in value if str(pk).isdigit()]
+        osoby = {str(osoba.pk): osoba for osoba in self.choices.queryset.filter(pk__in=ids)}
+        return [(None, [
+            self.create_option(name, pk, osoba_popisek(osoby[pk]), True, index, attrs=attrs)
+            for index, pk in enumerate(dict.fromkeys(ids)) if pk in osoby
+        ], 0)]
+
+class OsobyVyberField(forms.ModelMultipleChoiceField):
+    widget = OsobyAutocompleteWidget
+
+    def label_from_instance(self, obj):
+        return osoba_popisek(obj)
+
+    def clean(self, value):
+        # Dotaz se týká jen odeslaných ID; pořadí výběru se zachová (první osoba je hlavní).
+        osoby = super().clean(value)
+        poradi = {str(pk): index for index, pk in enumerate(value or [])}
+        return sorted(osoby, key=lambda osoba: poradi.get(str(osoba.pk), len(poradi)))
+
 class FileUploadMixin(forms.Form):
+    generate_thumbnails = False
+
     uploaded_file = forms.FileField(
         label="Soubor k nahrání", 
         required=False, 
         help_text="Vyberte soubor pro archivaci."
     )
 
+    _pripraveny_soubor = None
+
+    def prepare_upload(self):
+        # Pohled ji volá před transakcí, aby se soubor kopíroval a hashoval bez zámku databáze.
+        uploaded_file_data = self.cleaned_data.get('uploaded_file')
+        if uploaded_file_data and self._pripraveny_soubor is None:
+            self._pripraveny_soubor = storage.prepare_upload(uploaded_file_data)
+
     def save_uploaded_file(self, instance):
         uploaded_file_data = self.cleaned_data.get('uploaded_file')
         if uploaded_file_data:
-            if instance.pk and hasattr(instance, 'soubor') and instance.soubor:
-                old_soubor_to_delete = instance.soubor
-                instance.soubor = None
-                old_soubor_to_delete.delete()
+            self.prepare_upload()
+            pripraveny, self._pripraveny_soubor = self._pripraveny_soubor, None
+            soubor_obj, created = storage.store_prepared(pripraveny)
+            if created:
+                extraction.schedule(soubor_obj)
+            if instance.pk and getattr(instance, 'soubor', None):
+                instance.release_soubor()
 
-            soubor_obj = Soubor.objects.create(file=uploaded_file_data)
             instance.soubor = soubor_obj
+            if self.generate_thumbnails and not soubor_obj.nahled:
+                thumbnails.schedule(soubor_obj)
         return instance
 
 class BaseArchivovanyObjektForm(FileUploadMixin, forms.ModelForm):
@@ -48,11 +151,10 @@ class BaseArchivovanyObjektForm(FileUploadMixin, forms.ModelForm):
         required=False
     )
     
-    osoby_vyber = forms.ModelMultipleChoiceField(
-        queryset=Osoba.objects.all().order_by('prijmeni', 'jmeno'),
-        widget=forms.SelectMultiple(attrs={'size': OSOBA_SELECT_SIZE}),
+    osoby_vyber = OsobyVyberField(
+        queryset=Osoba.objects.all(),
         label="Osoby spojené s objektem",
-        help_text="Vyberte jednu nebo více osob (podržením Ctrl/Cmd). První vybraná osoba bude označena jako hlavní.",
+        help_text="Začněte psát příjmení nebo jméno a vyberte osobu z nabídky. První vybraná osoba bude označena jako hlavní.",
         required=False
     )
 
@@ -99,6 +201,11 @@ class BaseArchivovanyObjektForm(FileUploadMixin, forms.ModelForm):
         self._add_create_button_to_help_text('osoby_vyber', 'archiv_app:add_osoba', 'Přidat osobu')
 
         if self.instance and self.instance.pk:
+            osoby = list(ArchivovanyObjekt.osoby.through.objects.filter(archivovanyobjekt_id=self.instance.pk).values_list('osoba_id', flat=True))
+            if self.instance.osoba_id:
+                osoby = [self.instance.osoba_id] + [pk for pk in osoby if pk != self.instance.osoba_id]
+            self.fields['osoby_vyber'].initial = osoby
+
             if self.instance.datum_vzniku_presne:
                 self.fields['typ_datace'].initial = 'datum'
             elif self.instance.rok_vzniku:
@@ -109,30 +216,17 @@ class BaseArchivovanyObjektForm(FileUploadMixin, forms.ModelForm):
     def clean(self):
         cleaned_data = super().clean()
         typ_datace = cleaned_data.get('typ_datace')
-        datum_presne = cleaned_data.get('datum_vzniku_presne')
-        rok = cleaned_data.get('rok_vzniku')
-        stoleti = cleaned_data.get('stoleti_vzniku')
 
         if not typ_datace: 
             raise ValidationError("Musíte zvolit typ datace.")
 
-        if typ_datace == 'datum':
-            if not datum_presne:
-                self.add_error('datum_vzniku_presne', "Při typu datace 'Přesné datum' musí být datum vyplněno.")
-            if rok or stoleti:
-                self.add_error('typ_datace', "Pokud je zvoleno 'Přesné datum', pole Rok a Století musí být prázdná.")
-        
-        elif typ_datace == 'rok':
-            if not rok:
-                self.add_error('rok_vzniku', "Při typu datace 'Rok' musí být rok vyplněn.")
-            if datum_presne or stoleti:
-                self.add_error('typ_datace', "Pokud je zvolen 'Rok', pole Přesné datum a Století musí být prázdná.")
-
-        elif typ_datace == 'stoleti':
-            if not stoleti:
-                self.add_error('stoleti_vzniku', "Při typu datace 'Století' musí být století vyplněno.")
-            if datum_presne or rok:
-                self.add_error('typ_datace', "Pokud je zvoleno 'Století', pole Přesné datum a Rok musí být prázdná.")
+        for field, message in validate_datace(
+            typ_datace,
+            cleaned_data.get('datum_vzniku_presne'),
+            cleaned_data.get('rok_vzniku'),
+            cleaned_data.get('stoleti_vzniku'),
+        ):
+            self.add_error(field, message)
             
         return cleaned_data
 
@@ -173,11 +267,7 @@ class BaseArchivovanyObjektForm(FileUploadMixin, forms.ModelForm):
 
     def clean_datum_vzniku_presne(self):
         datum = self.cleaned_data.get('datum_vzniku_presne')
-        if datum:
-            if datum > date.today():
-                raise ValidationError("Datum vzniku nemůže být v budoucnosti.")
-            if datum.year < MIN_YEAR:
-                raise ValidationError(f"Rok v datu vzniku musí být {MIN_YEAR} nebo pozdější.")
+        validate_datum_vzniku(datum)
         return datum
 
 class DokumentForm(BaseArchivovanyObjektForm):
@@ -191,6 +281,8 @@ class DokumentForm(BaseArchivovanyObjektForm):
         self._add_create_button_to_help_text('druh', 'archiv_app:add_druh', 'Přidat druh')
 
 class FotografieForm(BaseArchivovanyObjektForm):
+    generate_thumbnails = True
+
     class Meta(BaseArchivovanyObjektForm.Meta):
         model = Fotografie
         fields = BaseArchivovanyObjektForm.Meta.fields + ['typ_fotografie', 'vyska', 'sirka']
@@ -206,28 +298,8 @@ class OsobaForm(forms.ModelForm):
 
     def clean(self):
         cleaned_data = super().clean()
-        narozeni = cleaned_data.get('narozeni')
-        umrti = cleaned_data.get('umrti')
-        today = date.today()
-
-        if narozeni:
-            if narozeni > today:
-                self.add_error('narozeni', "Datum narození nemůže být v budoucnosti.")
-            if narozeni.year < MIN_YEAR:
-                self.add_error('narozeni', f"Rok narození musí být {MIN_YEAR} nebo pozdější.")
-
-        if umrti:
-            if umrti > today:
-                self.add_error('umrti', "Datum úmrtí nemůže být v budoucnosti.")
-            if umrti.year < MIN_YEAR:
-                 self.add_error('umrti', f"Rok úmrtí musí být {MIN_YEAR} nebo pozdější.")
-
-        if narozeni and umrti:
-            if umrti < narozeni:
-                self.add_error('umrti', "Datum úmrtí nemůže být před datem narození.")
-            elif umrti == narozeni:
-                self.add_error('umrti', "Datum úmrtí nemůže být stejné jako datum narození.")
-
+        for field, message in validate_zivotni_data(cleaned_data.get('narozeni'), cleaned_data.get('umrti')):
+            self.add_error(field, message)
         return cleaned_data
 
 class DruhForm(forms.ModelForm):
@@ -0,0 +1,393 @@
+import csv
+import json
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.db import DatabaseError, connection, transaction
+from django.utils._os import safe_join
+
+from . import counters, extraction, search, storage, thumbnails
+from .forms import validate_datace, validate_datum_vzniku, validate_zivotni_data
+from .models import STOLETÍ_CHOICES, ArchivovanyObjekt, Dokument, Druh, Fotografie, Osoba, denormalized_counts_enabled
+
+TYPY_RADKU = ('dokument', 'fotografie', 'osoba')
+OSOBY_SEPARATOR = ';'
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+
+
+def insert_children(model, objs):
+    # bulk_create() nepodporuje dědičnost přes více tabulek; rodičovské řádky už existují,
+    # proto vkládáme jen vlastní sloupce potomka stejným mechanismem jako Model.save_base().
+    if not objs:
+        return
+    fields = model._meta.local_concrete_fields
+    batch_size = connection.ops.bulk_batch_size(fields, objs) or len(objs)
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=fields)
+
+
+class RowError(Exception):
+    def __init__(self, messages):
+        super().__init__('; '.join(messages))
+        self.messages = messages
+
+
+def read_rows(path, fmt=None):
+    path = Path(path)
+    fmt = fmt or ('jsonl' if path.suffix.lower() in ('.jsonl', '.json', '.ndjson') else 'csv')
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if fmt == 'csv':
+            for line_no, row in enumerate(csv.DictReader(handle), start=2):
+                yield line_no, row
+            return
+        for line_no, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, RowError([f"Neplatný JSON: {e}"])
+                continue
+            yield line_no, row if isinstance(row, dict) else RowError(["Řádek musí být JSON objekt."])
+
+
+def _text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def _date(row, key, errors):
+    value = row.get(key)
+    if value in (None, ''):
+        return None
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    errors.append(f"{key}: neplatné datum '{value}'.")
+    return None
+
+
+def _int(row, key, errors):
+    value = row.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        errors.append(f"{key}: '{value}' není celé číslo.")
+        return None
+
+
+def _osoba_key(jmeno, prijmeni):
+    return jmeno.casefold(), prijmeni.casefold()
+
+
+def _parse_osoby(value, errors):
+    if value in (None, ''):
+        return []
+    items = value if isinstance(value, list) else str(value).split(OSOBY_SEPARATOR)
+    osoby = []
+    for item in items:
+        if isinstance(item, dict):
+            jmeno, prijmeni = _text(item, 'jmeno'), _text(item, 'prijmeni')
+        elif ',' in str(item):
+            prijmeni, _, jmeno = str(item).strip().partition(',')
+        else:
+            jmeno, _, prijmeni = str(item).strip().rpartition(' ')
+        if not jmeno or not prijmeni:
+            if str(item).strip():
+                errors.append(f"osoby: '{item}' musí obsahovat jméno i příjmení.")
+            continue
+        osoby.append((jmeno.strip(), prijmeni.strip()))
+    return osoby
+
+
+def _field_errors(model, field_name, value, errors):
+    try:
+        model._meta.get_field(field_name).run_validators(value)
+    except ValidationError as e:
+        errors.extend(f"{field_name}: {message}" for message in e.messages)
+
+
+class ArchivImporter:
+    def __init__(self, media_dir=None, batch_size=1000, dry_run=False, report=None, report_error=None):
+        self.media_dir = Path(media_dir) if media_dir else None
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.report = report or (lambda message: None)
+        self.report_error = report_error or self.report
+        self.osoby = {}
+        self.druhy = {}
+        self.content_types = {}
+        self.stats = {'radky': 0, 'ulozeno': 0, 'chyby': 0, 'davky': 0}
+
+    def load_maps(self):
+        self.osoby = {
+            _osoba_key(jmeno, prijmeni): pk
+            for pk, jmeno, prijmeni in Osoba.objects.order_by('pk').values_list('pk', 'jmeno', 'prijmeni').iterator()
+        }
+        self.druhy = {nazev.casefold(): pk for pk, nazev in Druh.objects.order_by('pk').values_list('pk', 'nazev')}
+        for model in (Dokument, Fotografie):
+            self.content_types[model] = ContentType.objects.get_for_model(model, for_concrete_model=False).pk
+
+    def run(self, path, fmt=None):
+        self.load_maps()
+        batch = []
+        for line_no, row in read_rows(path, fmt):
+            self.stats['radky'] += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                batch.append((line_no, self.validate(row)))
+            except RowError as e:
+                self._row_error(line_no, e.messages)
+            if len(batch) >= self.batch_size:
+                self.process_batch(batch)
+                batch = []
+        if batch:
+            self.process_batch(batch)
+        return self.stats
+
+    def _row_error(self, line_no, messages):
+        self.stats['chyby'] += 1
+        self.report_error(f"Řádek {line_no}: {'; '.join(messages)}")
+
+    def validate(self, row):
+        errors = []
+        typ = _text(row, 'typ').lower()
+        if typ not in TYPY_RADKU:
+            raise RowError([f"typ: musí být jeden z {', '.join(TYPY_RADKU)}."])
+        if typ == 'osoba':
+            data = self._validate_osoba(row, errors)
+        else:
+            data = self._validate_objekt(typ, row, errors)
+        if errors:
+            raise RowError(errors)
+        data['typ'] = typ
+        return data
+
+    def _validate_osoba(self, row, errors):
+        data = {
+            'jmeno': _text(row, 'jmeno'),
+            'prijmeni': _text(row, 'prijmeni'),
+            'narozeni': _date(row, 'narozeni', errors),
+            'umrti': _date(row, 'umrti', errors),
+            'pohlavi': _text(row, 'pohlavi').upper() or None,
+        }
+        if not data['jmeno']:
+            errors.append("jmeno: Jméno osoby nesmí být prázdné.")
+        if not data['prijmeni']:
+            errors.append("prijmeni: Příjmení osoby nesmí být prázdné.")
+        for field_name in ('jmeno', 'prijmeni'):
+            _field_errors(Osoba, field_name, data[field_name], errors)
+        if data['pohlavi'] not in (None, 'M', 'F'):
+            errors.append(f"pohlavi: neplatná hodnota '{data['pohlavi']}'.")
+        errors.extend(f"{field}: {message}" for field, message in validate_zivotni_data(data['narozeni'], data['umrti']))
+        return data
+
+    def _validate_objekt(self, typ, row, errors):
+        data = {
+            'popis': _text(row, 'popis'),
+            'datum_archivace': _date(row, 'datum_archivace', errors) or date.today(),
+            'datum_vzniku_presne': _date(row, 'datum_vzniku_presne', errors),
+            'rok_vzniku': _int(row, 'rok_vzniku', errors),
+            'stoleti_vzniku': _text(row, 'stoleti_vzniku') or None,
+            'osoby': _parse_osoby(row.get('osoby'), errors),
+            'soubor': self._resolve_soubor(_text(row, 'soubor'), errors),
+        }
+        typ_datace = _text(row, 'typ_datace') or (
+            'datum' if data['datum_vzniku_presne'] else
+            'rok' if data['rok_vzniku'] else
+            'stoleti' if data['stoleti_vzniku'] else ''
+        )
+        if not typ_datace:
+            errors.append("Musíte zvolit typ datace.")
+        errors.extend(f"{field}: {message}" for field, message in validate_datace(
+            typ_datace, data['datum_vzniku_presne'], data['rok_vzniku'], data['stoleti_vzniku']))
+        try:
+            validate_datum_vzniku(data['datum_vzniku_presne'])
+        except ValidationError as e:
+            errors.extend(f"datum_vzniku_presne: {message}" for message in e.messages)
+        if data['rok_vzniku'] is not None:
+            _field_errors(ArchivovanyObjekt, 'rok_vzniku', data['rok_vzniku'], errors)
+        if data['stoleti_vzniku'] and data['stoleti_vzniku'] not in dict(STOLETÍ_CHOICES):
+            errors.append(f"stoleti_vzniku: neplatná hodnota '{data['stoleti_vzniku']}'.")
+
+        if typ == 'dokument':
+            data['druh'] = _text(row, 'druh')
+            _field_errors(Druh, 'nazev', data['druh'], errors)
+            data['jazyk'] = _text(row, 'jazyk') or Dokument._meta.get_field('jazyk').default
+            if data['jazyk'] not in dict(Dokument.JAZYK_CHOICES):
+                errors.append(f"jazyk: neplatná hodnota '{data['jazyk']}'.")
+        else:
+            data['typ_fotografie'] = _text(row, 'typ_fotografie')
+            _field_errors(Fotografie, 'typ_fotografie', data['typ_fotografie'], errors)
+            for field_name, label in (('vyska', 'Výška'), ('sirka', 'Šířka')):
+                data[field_name] = _int(row, field_name, errors)
+                if not data[field_name] or data[field_name] < 1:
+                    errors.append(f"{field_name}: {label} fotografie musí být vyplněna a větší než 0.")
+        return data
+
+    def _resolve_soubor(self, relative_path, errors):
+        if not relative_path:
+            return None
+        if self.media_dir is None:
+            errors.append("soubor: pro import souborů je nutné zadat --media-dir.")
+            return None
+        try:
+            path = Path(safe_join(self.media_dir, relative_path))
+        except SuspiciousFileOperation:
+            errors.append(f"soubor: cesta '{relative_path}' míří mimo adresář médií.")
+            return None
+        if not path.is_file():
+            errors.append(f"soubor: '{relative_path}' neexistuje.")
+            return None
+        return path
+
+    def process_batch(self, batch):
+        self.stats['davky'] += 1
+        start = time.perf_counter()
+        osoby_map, druhy_map = dict(self.osoby), dict(self.druhy)
+        pripravene = {}
+        try:
+            # Soubory se zkopírují a zahashují před transakcí dávky, která drží zámek zápisu.
+            pripravene = self._prepare_soubory(batch)
+            with transaction.atomic():
+                ulozeno = self._save_batch(batch, pripravene)
+                if self.dry_run:
+                    transaction.set_rollback(True)
+        except (DatabaseError, OSError) as e:
+            self.osoby, self.druhy = osoby_map, druhy_map
+            self.stats['chyby'] += len(batch)
+            self.report_error(f"Dávka {self.stats['davky']}: {len(batch)} řádků zamítnuto ({e})")
+            return
+        finally:
+            storage.discard_prepared(pripravene.values())
+        if self.dry_run:
+            self.osoby, self.druhy = osoby_map, druhy_map
+        self.stats['ulozeno'] += ulozeno
+        elapsed = time.perf_counter() - start
+        self.report(
+            f"Dávka {self.stats['davky']}: {ulozeno}/{len(batch)} řádků za {elapsed:.2f} s "
+            f"({len(batch) / elapsed if elapsed else 0:.0f} řádků/s), chyb celkem: {self.stats['chyby']}"
+        )
+
+    def _create_missing_osoby(self, osoby):
+        nove = {}
+        for values in osoby:
+            key = _osoba_key(values['jmeno'], values['prijmeni'])
+            if key not in self.osoby and key not in nove:
+                nove[key] = Osoba(**values)
+                # bulk_create() nevolá save(), klíče pro našeptávač je nutné nastavit zde.
+                nove[key].nastavit_klice()
+        Osoba.objects.bulk_create(nove.values(), batch_size=self.batch_size)
+        counters.increment('osoby', len(nove))
+        if nove:
+            counters.bump_version('verze_osoby')
+        self.osoby.update({key: osoba.pk for key, osoba in nove.items()})
+
+    def _prepare_soubory(self, batch):
+        # Vrací {pořadí řádku v dávce: připravený soubor} pro store_prepared().
+        pripravene = {}
+        if self.dry_run:
+            return pripravene
+        try:
+            for i, (_, data) in enumerate(batch):
+                if data.get('soubor'):
+                    with open(data['soubor'], 'rb') as handle:
+                        pripravene[i] = storage.prepare_upload(File(handle, name=data['soubor'].name))
+        except OSError:
+            storage.discard_prepared(pripravene.values())
+            raise
+        return pripravene
+
+    def _save_batch(self, batch, pripravene):
+        osoba_rows = [data for _, data in batch if data['typ'] == 'osoba']
+        objekt_rows = [data for _, data in batch if data['typ'] != 'osoba']
+
+        self._create_missing_osoby({k: v for k, v in data.items() if k != 'typ'} for data in osoba_rows)
+        if not objekt_rows:
+            return len(osoba_rows)
+
+        self._create_missing_osoby(
+            {'jmeno': jmeno, 'prijmeni': prijmeni}
+            for data in objekt_rows for jmeno, prijmeni in data['osoby']
+        )
+        nove_druhy = {}
+        for data in objekt_rows:
+            nazev = data.get('druh')
+            if nazev and nazev.casefold() not in self.druhy:
+                nove_druhy.setdefault(nazev.casefold(), Druh(nazev=nazev))
+        Druh.objects.bulk_create(nove_druhy.values())
+        self.druhy.update({key: druh.pk for key, druh in nove_druhy.items()})
+
+        rodice = []
+        for i, (_, data) in enumerate(batch):
+            if data['typ'] == 'osoba':
+                continue
+            osoba_ids = list(dict.fromkeys(self.osoby[_osoba_key(*osoba)] for osoba in data['osoby']))
+            data['osoba_ids'] = osoba_ids
+            data['soubor_obj'] = self._store_soubor(pripravene[i]) if i in pripravene else None
+            model = Dokument if data['typ'] == 'dokument' else Fotografie
+            rodice.append(ArchivovanyObjekt(
+                polymorphic_ctype_id=self.content_types[model],
+                typ=data['typ'],
+                osoba_id=osoba_ids[0] if osoba_ids else None,
+                soubor=data['soubor_obj'],
+                datum_archivace=data['datum_archivace'],
+                popis=data['popis'],
+                datum_vzniku_presne=data['datum_vzniku_presne'],
+                rok_vzniku=data['rok_vzniku'],
+                stoleti_vzniku=data['stoleti_vzniku'],
+            ))
+        for rodic in rodice:
+            rodic.nastavit_datace()
+        ArchivovanyObjekt.objects.bulk_create(rodice, batch_size=self.batch_size)
+
+        dokumenty, fotografie, vazby = [], [], []
+        for rodic, data in zip(rodice, objekt_rows):
+            if data['typ'] == 'dokument':
+                dokumenty.append(Dokument(
+                    archivovanyobjekt_ptr_id=rodic.pk,
+                    druh_id=self.druhy[data['druh'].casefold()] if data['druh'] else None,
+                    jazyk=data['jazyk'],
+                ))
+            else:
+                fotografie.append(Fotografie(
+                    archivovanyobjekt_ptr_id=rodic.pk,
+                    typ_fotografie=data['typ_fotografie'],
+                    vyska=data['vyska'],
+                    sirka=data['sirka'],
+                ))
+                if data['soubor_obj'] and not data['soubor_obj'].nahled:
+                    thumbnails.schedule(data['soubor_obj'])
+            vazby.extend(
+                ArchivovanyObjekt.osoby.through(archivovanyobjekt_id=rodic.pk, osoba_id=osoba_id)
+                for osoba_id in data['osoba_ids']
+            )
+        insert_children(Dokument, dokumenty)
+        insert_children(Fotografie, fotografie)
+        counters.increment('dokumenty', len(dokumenty))
+        counters.increment('fotografie', len(fotografie))
+        counters.bump_version('verze_objekty')
+        ArchivovanyObjekt.osoby.through.objects.bulk_create(vazby, batch_size=self.batch_size, ignore_conflicts=True)
+
+        objekt_ids = [rodic.pk for rodic in rodice]
+        search.index_objekty(objekt_ids)
+        if denormalized_counts_enabled():
+            Osoba.objects.filter(pk__in={osoba_id for data in objekt_rows for osoba_id in data['osoba_ids']}).recount_archivalie()
+        return len(batch)
+
+    def _store_soubor(self, pripraveny):
+        soubor, created = storage.store_prepared(pripraveny)
+        if created:
+            extraction.schedule(soubor)
+        return soubor
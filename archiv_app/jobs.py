@@ -0,0 +1,163 @@
+import datetime
+import logging
+import time
+import traceback
+
+from django.conf import settings
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Uloha
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 30
+DEFAULT_MAX_BACKOFF = 60 * 60
+DEFAULT_LEASE = 10 * 60
+
+ULOHY = {}
+
+
+def register(nazev):
+    def decorator(funkce):
+        ULOHY[nazev] = funkce
+        return funkce
+    return decorator
+
+
+def is_enabled():
+    return getattr(settings, 'ARCHIV_JOB_QUEUE', False)
+
+
+def _lease():
+    return datetime.timedelta(seconds=getattr(settings, 'ARCHIV_JOB_LEASE', DEFAULT_LEASE))
+
+
+def backoff(pokus):
+    # Exponenciální odstup: 30 s, 60 s, 120 s … nejvýše hodina.
+    zaklad = getattr(settings, 'ARCHIV_JOB_BACKOFF', DEFAULT_BACKOFF)
+    return min(zaklad * 2 ** (pokus - 1), getattr(settings, 'ARCHIV_JOB_MAX_BACKOFF', DEFAULT_MAX_BACKOFF))
+
+
+def enqueue(nazev, **parametry):
+    # Řádek vzniká v transakci volajícího; pracovník ho uvidí až po jejím potvrzení.
+    if nazev not in ULOHY:
+        raise KeyError(f"Neznámá úloha '{nazev}'.")
+    return Uloha.objects.create(
+        nazev=nazev,
+        parametry=parametry,
+        max_pokusu=getattr(settings, 'ARCHIV_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+    )
+
+
+def _k_vyzvednuti(now):
+    # Čekající úlohy, jejichž čas nadešel, a běžící úlohy pracovníka, kterému vypršel zámek (spadl).
+    return Uloha.objects.filter(
+        Q(stav=Uloha.CEKA, spustit_po__lte=now) | Q(stav=Uloha.BEZI, zamceno_do__lt=now)
+    )
+
+
+def claim(limit, pracovnik):
+    # SQLite nemá SELECT … FOR UPDATE SKIP LOCKED; úloha se proto zabírá podmíněným UPDATE
+    # (compare-and-set na stav a zámek). Zápisy jsou serializované, uspěje vždy jen jeden pracovník.
+    now = timezone.now()
+    kandidati = list(_k_vyzvednuti(now).order_by('spustit_po', 'pk').values_list('pk', 'stav', 'zamceno_do')[:limit * 2])
+    zabrane = []
+    for pk, stav, zamceno_do in kandidati:
+        if len(zabrane) >= limit:
+            break
+        if Uloha.objects.filter(pk=pk, stav=stav, zamceno_do=zamceno_do).update(
+            stav=Uloha.BEZI, pracovnik=pracovnik, zamceno_do=now + _lease(), zahajeno=now, pokusy=F('pokusy') + 1,
+        ):
+            zabrane.append(pk)
+    return zabrane
+
+
+def renew_interval():
+    # Zámky se obnovují po třetině jejich délky, aby obnovení stihlo proběhnout i se zpožděním dřív, než vyprší.
+    return _lease().total_seconds() / 3
+
+
+def renew(pks, pracovnik):
+    # Prodlouží zámek úloh, které pracovník právě provádí; bez toho by úlohu delší než ARCHIV_JOB_LEASE
+    # převzal jiný pracovník a běžela by dvakrát. Převzaté úlohy filtr na pracovníka vynechá.
+    if not pks:
+        return 0
+    return Uloha.objects.filter(pk__in=pks, stav=Uloha.BEZI, pracovnik=pracovnik).update(
+        zamceno_do=timezone.now() + _lease(),
+    )
+
+
+def execute(pk):
+    # Provede zabranou úlohu a zapíše výsledek; vrací True při úspěchu.
+    uloha = Uloha.objects.get(pk=pk)
+    if uloha.pokusy > uloha.max_pokusu:
+        # Úloha, při které pracovník opakovaně spadl, se už nespouští.
+        _fail(uloha, "Pracovník úlohu opakovaně nedokončil (vypršel zámek).", None)
+        return False
+    start = time.perf_counter()
+    try:
+        ULOHY[uloha.nazev](**uloha.parametry)
+    except Exception:
+        _fail(uloha, traceback.format_exc(), time.perf_counter() - start)
+        return False
+    _vlastni(uloha).update(
+        stav=Uloha.HOTOVO, dokonceno=timezone.now(), trvani=time.perf_counter() - start, zamceno_do=None, chyba='',
+    )
+    return True
+
+
+def _vlastni(uloha):
+    # Výsledek zapíše jen pracovník, který úlohu drží (po vypršení zámku ji mohl převzít jiný).
+    return Uloha.objects.filter(pk=uloha.pk, stav=Uloha.BEZI, pracovnik=uloha.pracovnik)
+
+
+def _fail(uloha, chyba, trvani):
+    pokusy = uloha.pokusy
+    zmeny = {'trvani': trvani, 'chyba': chyba, 'zamceno_do': None}
+    if pokusy < uloha.max_pokusu:
+        zmeny.update(stav=Uloha.CEKA, spustit_po=timezone.now() + datetime.timedelta(seconds=backoff(pokusy)))
+        logger.warning("Úloha %s selhala (pokus %s/%s), zopakuje se.", uloha, pokusy, uloha.max_pokusu)
+    else:
+        zmeny.update(stav=Uloha.CHYBA, dokonceno=timezone.now())
+        logger.error("Úloha %s selhala i po %s pokusech.", uloha, pokusy)
+    _vlastni(uloha).update(**zmeny)
+
+
+def stats():
+    return (
+        Uloha.objects.order_by('nazev').values('nazev').annotate(
+            pocet=Count('pk'),
+            hotovo=Count('pk', filter=Q(stav=Uloha.HOTOVO)),
+            ceka=Count('pk', filter=Q(stav__in=(Uloha.CEKA, Uloha.BEZI))),
+            chyby=Count('pk', filter=Q(stav=Uloha.CHYBA)),
+            pokusu_celkem=Sum('pokusy'),
+            prumer=Avg('trvani', filter=Q(stav=Uloha.HOTOVO)),
+            nejdele=Max('trvani', filter=Q(stav=Uloha.HOTOVO)),
+        )
+    )
+
+
+@register('smazat_soubory')
+def smazat_soubory(names):
+    from . import storage
+    storage.unlink_names(names)
+
+
+@register('vytvorit_nahled')
+def vytvorit_nahled(soubor_id):
+    from . import thumbnails
+    from .models import Soubor
+    soubor = Soubor.objects.filter(pk=soubor_id).first()
+    if soubor is not None and thumbnails.is_available() and soubor.file:
+        thumbnails.generate_now(soubor)
+
+
+@register('extrahovat_text')
+def extrahovat_text(soubor_id):
+    from . import extraction
+    from .models import Soubor
+    soubor = Soubor.objects.filter(pk=soubor_id).first()
+    if soubor is not None and soubor.file:
+        extraction.extract_now(soubor)
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+
+def _host():
+    # Bez ALLOWED_HOSTS Django při DEBUG povolí localhost.
+    return next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+
+
+class _Vlakna:
+    # Průběžně měří nejvyšší počet živých vláken procesu.
+    def __init__(self):
+        self.nejvic = threading.active_count()
+        self._konec = threading.Event()
+        self._vlakno = threading.Thread(target=self._mer, daemon=True)
+
+    def _mer(self):
+        while not self._konec.wait(0.005):
+            self.nejvic = max(self.nejvic, threading.active_count())
+
+    def __enter__(self):
+        self._vlakno.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._konec.set()
+        self._vlakno.join()
+
+
+def _wsgi_klient(app, path, rychlost):
+    environ = RequestFactory(HTTP_HOST=_host()).get(path).environ
+    stav = {}
+    result = app(environ, lambda status, headers, exc_info=None: stav.setdefault('status', status))
+    prijato = 0
+    try:
+        for chunk in result:
+            prijato += len(chunk)
+            if rychlost:
+                time.sleep(len(chunk) / rychlost)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(stav['status'].split()[0]), prijato
+
+
+async def _asgi_klient(app, path, rychlost):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', _host().encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (_host(), 80),
+    }
+    pozadavek_odeslan = False
+    stav = {'prijato': 0}
+
+    async def receive():
+        nonlocal pozadavek_odeslan
+        if not pozadavek_odeslan:
+            pozadavek_odeslan = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            stav['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            stav['prijato'] += len(message.get('body', b''))
+            if rychlost:
+                await asyncio.sleep(len(message.get('body', b'')) / rychlost)
+
+    await app(scope, receive, send)
+    return stav['status'], stav['prijato']
+
+
+class Command(BaseCommand):
+    help = (
+        "Porovná WSGI (pevný počet pracovních vláken) a ASGI (asynchronní pohledy) při mnoha souběžných "
+        "pomalých klientech stahujících soubor a při souběžném načítání seznamu dokumentů."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--klienti', type=int, default=50, help="Počet souběžných klientů.")
+        parser.add_argument('--velikost', type=int, default=1024, help="Velikost stahovaného souboru v kB.")
+        parser.add_argument('--rychlost', type=int, default=2048, help="Rychlost klienta v kB/s (0 = bez omezení).")
+        parser.add_argument('--vlakna', type=int, default=8, help="Počet pracovních vláken WSGI serveru.")
+        parser.add_argument('--seznamy', type=int, default=50, help="Počet souběžných požadavků na seznam dokumentů (0 = vynechat).")
+
+    def handle(self, *args, klienti, velikost, rychlost, vlakna, seznamy, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(media_root, 'benchmark'))
+            with open(os.path.join(media_root, 'benchmark', 'soubor.bin'), 'wb') as handle:
+                handle.write(os.urandom(velikost * 1024))
+            with override_settings(MEDIA_ROOT=media_root):
+                media_path = f"{settings.MEDIA_URL.rstrip('/')}/benchmark/soubor.bin"
+                self.scenar(f"stahování {klienti} × {velikost} kB při {rychlost} kB/s", media_path, klienti, rychlost * 1024, vlakna)
+                if seznamy:
+                    self.scenar(f"seznam dokumentů {seznamy}×", reverse('archiv_app:dokumenty_list'), seznamy, 0, vlakna)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.stdout.write(self.style.SUCCESS("Měření dokončeno."))
+
+    def scenar(self, nazev, path, klienti, rychlost, vlakna):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {nazev} =="))
+
+        wsgi = get_wsgi_application()
+        with _Vlakna() as mereni, ThreadPoolExecutor(max_workers=vlakna) as pool:
+            start = time.perf_counter()
+            vysledky = list(pool.map(lambda _: _wsgi_klient(wsgi, path, rychlost), range(klienti)))
+            cas = time.perf_counter() - start
+        self.vypis(f"WSGI ({vlakna} vláken)", vysledky, cas, mereni.nejvic)
+
+        with override_settings(ROOT_URLCONF='archiv.urls_async'):
+            asgi = get_asgi_application()
+
+            async def vsichni():
+                return await asyncio.gather(*(_asgi_klient(asgi, path, rychlost) for _ in range(klienti)))
+
+            with _Vlakna() as mereni:
+                start = time.perf_counter()
+                vysledky = asyncio.run(vsichni())
+                cas = time.perf_counter() - start
+        self.vypis("ASGI (async pohledy)", vysledky, cas, mereni.nejvic)
+
+    def vypis(self, nazev, vysledky, cas, vlaken):
+        chyby = sum(1 for status, _ in vysledky if status >= 400)
+        prenos = sum(prijato for _, prijato in vysledky)
+        self.stdout.write(
+            f"  {nazev}: {cas:.2f} s, {len(vysledky) / cas:.1f} pož./s, {prenos / 1024 / 1024:.1f} MB, "
+            f"nejvíc vláken {vlaken}, chybných odpovědí {chyby}"
+        )
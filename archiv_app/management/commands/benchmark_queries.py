@@ -0,0 +1,125 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from archiv_app import filters, synthetic, timeline
+from archiv_app.models import ArchivovanyObjekt, Dokument, Druh, Fotografie, Osoba
+from archiv_app.pagination import KeysetOrdering
+from archiv_app.views import LIST_QUERYSET_SPECS, _apply_list_queryset_spec
+
+FULL_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+def _list_queryset(model):
+    return _apply_list_queryset_spec(model.objects.all(), LIST_QUERYSET_SPECS.get(model, {}))
+
+
+def _objekty():
+    return ArchivovanyObjekt.objects.non_polymorphic().select_related('osoba', 'soubor')
+
+
+def _pages(name, queryset, ordering, page_size):
+    # První stránka a stránka za kurzorem, tak jak je sestavuje paginate_keyset().
+    keys = KeysetOrdering(queryset.model, ordering)
+    queryset = keys.annotate(queryset)
+    first = keys.queries(queryset)[0][:page_size + 1]
+    yield f"{name} (1. stránka)", first
+    rows = list(first)
+    if len(rows) > page_size:
+        cursor = keys.decode(keys.encode(rows[page_size - 1]))
+        for i, query in enumerate(keys.queries(queryset, cursor)):
+            yield f"{name} (další stránka{', další úsek' if i else ''})", query[:page_size + 1]
+
+
+def catalogue(page_size):
+    objekt_ordering = list(ArchivovanyObjekt._meta.ordering)
+    yield from _pages("dokumenty", _list_queryset(Dokument), list(Dokument._meta.ordering), page_size)
+    yield from _pages("fotografie", _list_queryset(Fotografie), list(Fotografie._meta.ordering), page_size)
+    yield from _pages("osoby", _list_queryset(Osoba), list(Osoba._meta.ordering), page_size)
+    yield from _pages("druhy", _list_queryset(Druh), ['nazev'], page_size)
+    yield from _pages("časová osa", timeline.base_queryset(), objekt_ordering, page_size)
+    yield from _pages("filtr rok_vzniku", _objekty().filter(rok_vzniku=1950), objekt_ordering, page_size)
+    yield from _pages("filtr stoleti_vzniku", _objekty().filter(stoleti_vzniku='19'), objekt_ordering, page_size)
+    yield from _pages(
+        "filtr datum_vzniku_presne",
+        _objekty().filter(datum_vzniku_presne__range=(datetime.date(1900, 1, 1), datetime.date(1910, 12, 31))),
+        objekt_ordering, page_size,
+    )
+    yield from _pages("datace 1890–1920", filters.filter_datace(_objekty(), 1890, 1920), objekt_ordering, page_size)
+    yield from _pages(
+        "datace 1890–1920 s překryvem, řazeno podle datace",
+        filters.filter_datace(_objekty(), 1890, 1920, prekryv=True), filters.RAZENI['datace'], page_size,
+    )
+    yield from _pages("časová osa podle datace", timeline.base_queryset(), filters.RAZENI['-datace'], page_size)
+    yield from _pages("dokumenty podle datace", _list_queryset(Dokument), filters.RAZENI['datace'], page_size)
+    for name, model in (("dokumentů", Dokument), ("fotografií", Fotografie)):
+        facety = LIST_QUERYSET_SPECS[model]['facets']
+        yield f"fasety {name}", filters.facet_counts_queryset(_list_queryset(model), facety, {})
+        yield (
+            f"fasety {name} (vybrané století a osoba)",
+            filters.facet_counts_queryset(_list_queryset(model), facety, {'stoleti': '19', 'osoba': '1'}),
+        )
+
+
+def sorts_whole_result(plan):
+    # Stránka se má číst v pořadí indexu. Třídění celého výsledku vadí i po SEARCH: rozsah filtru
+    # může zahrnovat většinu tabulky. Dotřídění „RIGHT PART OF ORDER BY“ v rámci skupin se toleruje.
+    return any(FULL_SORT in line for line in plan.splitlines())
+
+
+class Command(BaseCommand):
+    help = (
+        "Vypíše EXPLAIN QUERY PLAN a časy všech dotazů seznamů a filtrů. Data se vygenerují v transakci, "
+        "která se na konci vrátí, takže databáze zůstane beze změny."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objekty', type=int, default=20000, help="Počet generovaných archiválií.")
+        parser.add_argument('--osoby', type=int, help="Počet generovaných osob (výchozí desetina archiválií).")
+        parser.add_argument('--page-size', type=int, default=50, help="Velikost stránky měřených dotazů.")
+        parser.add_argument('--repeat', type=int, default=5, help="Počet opakování každého dotazu.")
+        parser.add_argument('--no-seed', action='store_true', help="Měřit nad stávajícími daty bez generování.")
+        parser.add_argument('--strict', action='store_true', help="Skončit chybou, pokud některý dotaz třídí celý výsledek v dočasném B-stromu.")
+
+    def handle(self, *args, objekty, osoby, page_size, repeat, no_seed, strict, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Rozbor plánů je připraven pro SQLite.")
+        with transaction.atomic():
+            if not no_seed:
+                start = time.perf_counter()
+                pocty = synthetic.seed(objekty=objekty, osoby=osoby)
+                self.stdout.write(
+                    f"Vygenerováno {pocty['dokumenty']} dokumentů, {pocty['fotografie']} fotografií "
+                    f"a {pocty['osoby']} osob za {time.perf_counter() - start:.1f} s"
+                )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            problemy = self.measure(page_size, repeat)
+            transaction.set_rollback(True)
+
+        zprava = f"Dotazů s tříděním celého výsledku v dočasném B-stromu: {len(problemy)}"
+        if problemy and strict:
+            raise CommandError(f"{zprava} ({', '.join(problemy)})")
+        self.stdout.write(self.style.SUCCESS(zprava) if not problemy else self.style.WARNING(zprava))
+
+    def measure(self, page_size, repeat):
+        problemy = []
+        for name, queryset in catalogue(page_size):
+            plan = queryset.explain()
+            casy = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset._chain())
+                casy.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name} =="))
+            for line in plan.splitlines():
+                self.stdout.write(f"  {line}")
+            vypis = f"  čas: {statistics.median(casy):.2f} ms (medián z {repeat})"
+            if sorts_whole_result(plan):
+                problemy.append(name)
+                vypis += "  ← třídění celého výsledku"
+            self.stdout.write(vypis)
+        return problemy
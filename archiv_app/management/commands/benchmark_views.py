@@ -0,0 +1,221 @@
+import contextlib
+import datetime
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from archiv_app import export, routers, synthetic, urls
+from archiv_app.management.commands.benchmark_asgi import _host
+from archiv_app.models import ArchivovanyObjekt, Dokument, Druh, Fotografie, Osoba
+
+NASOBKY = {'k': 1_000, 'm': 1_000_000}
+# Model, jehož první řádek dosadí pohled s <int:pk>, podle poslední části názvu URL.
+MODELY_PK = {'dokument': Dokument, 'fotografie': Fotografie, 'osoba': Osoba, 'druh': Druh}
+# Parametry dotazu pro pohledy, které bez nich nic nedělají.
+PARAMETRY = {'hledat': {'q': 'svatba'}, 'osoby_autocomplete': {'q': 'Nov'}}
+
+
+def pocet(value):
+    # 10000, 10k, 100k, 1M
+    value = value.strip().lower()
+    if value[-1:] in NASOBKY:
+        return int(float(value[:-1]) * NASOBKY[value[-1]])
+    return int(value)
+
+
+def _commit():
+    try:
+        vysledek = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return vysledek.stdout.strip() or None
+
+
+def scenare():
+    # (název, cesta, parametry) pro každou URL aplikace; export pro všechny zdroje a formáty.
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        if name == 'export':
+            for typ in export.EXPORT_SOURCES:
+                for format in export.EXPORT_FORMATS:
+                    yield f"export {typ}.{format}", reverse('archiv_app:export', kwargs={'typ': typ, 'format': format}), {}
+        elif 'pk' in pattern.pattern.converters:
+            pk = MODELY_PK[name.rsplit('_', 1)[-1]].objects.order_by('pk').values_list('pk', flat=True).first()
+            if pk is not None:
+                yield name, reverse(f'archiv_app:{name}', kwargs={'pk': pk}), {}
+        else:
+            yield name, reverse(f'archiv_app:{name}'), PARAMETRY.get(name, {})
+
+
+def _stahnout(client, path, parametry):
+    response = client.get(path, parametry)
+    obsah = b''.join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, len(obsah)
+
+
+def _dotazy(client, path, parametry):
+    # Počítají se i dotazy čtecích pohledů směrovaných na repliku.
+    aliasy = {'default', routers.replica_alias()} - {None}
+    with contextlib.ExitStack() as stack:
+        zachyceno = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliasy]
+        status, velikost = _stahnout(client, path, parametry)
+    return status, velikost, sum(len(context) for context in zachyceno)
+
+
+def zmerit(client, path, parametry, repeat):
+    # Studený požadavek (prázdná cache), opakované teplé požadavky a zvlášť špička paměti (tracemalloc zpomaluje).
+    cache.clear()
+    start = time.perf_counter()
+    status, velikost, dotazy = _dotazy(client, path, parametry)
+    studeny = (time.perf_counter() - start) * 1000
+    if status == 405:
+        return {'status': status, 'preskoceno': "pouze POST"}
+
+    casy = []
+    dotazy_tepla = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, _, dotazy_tepla = _dotazy(client, path, parametry)
+        casy.append((time.perf_counter() - start) * 1000)
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        _stahnout(client, path, parametry)
+        _, spicka = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': status,
+        'bajty': velikost,
+        'dotazy': dotazy,
+        'dotazy_tepla': dotazy_tepla,
+        'studeny_ms': round(studeny, 3),
+        'median_ms': round(statistics.median(casy), 3),
+        'min_ms': round(min(casy), 3),
+        'pamet_kb': round(spicka / 1024, 1),
+    }
+
+
+def regrese(vysledky, zaklad, tolerance):
+    # Horší čas nebo paměť o víc než toleranci (v %) a jakýkoli dotaz navíc.
+    nalezene = []
+    for name, nove in vysledky.items():
+        stare = zaklad.get(name)
+        if not stare or 'preskoceno' in nove or 'preskoceno' in stare:
+            continue
+        for klic in ('dotazy', 'dotazy_tepla'):
+            if nove[klic] > stare[klic]:
+                nalezene.append(f"{name}: {klic} {stare[klic]} → {nove[klic]}")
+        for klic in ('median_ms', 'pamet_kb'):
+            if nove[klic] > stare[klic] * (1 + tolerance / 100):
+                nalezene.append(f"{name}: {klic} {stare[klic]} → {nove[klic]}")
+    return nalezene
+
+
+class Command(BaseCommand):
+    help = (
+        "Změří čas, počet SQL dotazů a špičku paměti pro každou URL aplikace nad syntetickým archivem "
+        "a výsledek vypíše jako JSON. Data se vygenerují v transakci, která se na konci vrátí; "
+        "s --porovnat ohlásí zhoršení proti dřívějšímu měření."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objekty', type=pocet, default=10_000, help="Počet generovaných archiválií (např. 10k, 100k, 1M).")
+        parser.add_argument('--osoby', type=pocet, help="Počet generovaných osob (výchozí desetina archiválií).")
+        parser.add_argument('--soubory', type=pocet, default=0, help="Počet vygenerovaných souborů, které se přiřadí archiváliím.")
+        parser.add_argument('--seed', type=int, default=0, help="Semínko generátoru; stejné semínko dává stejná data.")
+        parser.add_argument('--repeat', type=int, default=5, help="Počet opakování každého požadavku.")
+        parser.add_argument('--no-seed', action='store_true', help="Měřit nad stávajícími daty bez generování.")
+        parser.add_argument('--vystup', default='-', help="Soubor pro výsledky v JSON (výchozí '-' = standardní výstup).")
+        parser.add_argument('--porovnat', help="JSON dřívějšího měření, se kterým se výsledky porovnají.")
+        parser.add_argument('--tolerance', type=float, default=25.0, help="Povolené zhoršení času a paměti v procentech.")
+        parser.add_argument('--strict', action='store_true', help="Skončit chybou, pokud se některá URL zhoršila.")
+
+    def handle(self, *args, objekty, osoby, soubory, seed, repeat, no_seed, vystup, porovnat, tolerance, strict, **options):
+        # Při výstupu JSON na standardní výstup jde průběh na chybový výstup.
+        prubeh = self.stderr if vystup == '-' else self.stdout
+        zaklad = None
+        if porovnat:
+            with open(porovnat, encoding='utf-8') as handle:
+                zaklad = json.load(handle)['vysledky']
+
+        # Vygenerované soubory jdou do dočasného MEDIA_ROOT, který se na konci smaže.
+        media_root = tempfile.mkdtemp() if soubory and not no_seed else None
+        media = override_settings(MEDIA_ROOT=media_root) if media_root else contextlib.nullcontext()
+        try:
+            with media, transaction.atomic():
+                pocty = None
+                if not no_seed:
+                    start = time.perf_counter()
+                    pocty = synthetic.seed(objekty=objekty, osoby=osoby, seed_value=seed, soubory=soubory)
+                    prubeh.write(
+                        f"Vygenerováno {pocty['dokumenty']} dokumentů, {pocty['fotografie']} fotografií, "
+                        f"{pocty['osoby']} osob a {pocty['soubory']} souborů za {time.perf_counter() - start:.1f} s"
+                    )
+                vysledky = self.measure(prubeh, repeat)
+                celkem = ArchivovanyObjekt.objects.count()
+                transaction.set_rollback(True)
+        finally:
+            if media_root:
+                shutil.rmtree(media_root, ignore_errors=True)
+
+        data = {
+            'commit': _commit(),
+            'cas': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'databaze': connections['default'].vendor,
+            'objekty': celkem,
+            'vygenerovano': pocty,
+            'seed': None if no_seed else seed,
+            'repeat': repeat,
+            'vysledky': vysledky,
+        }
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if vystup == '-':
+            self.stdout.write(text)
+        else:
+            with open(vystup, 'w', encoding='utf-8') as handle:
+                handle.write(text + '\n')
+
+        if zaklad is not None:
+            nalezene = regrese(vysledky, zaklad, tolerance)
+            for radek in nalezene:
+                prubeh.write(self.style.WARNING(f"Zhoršení: {radek}"))
+            zprava = f"URL se zhoršením proti {porovnat}: {len(nalezene)}"
+            if nalezene and strict:
+                raise CommandError(zprava)
+            prubeh.write(self.style.SUCCESS(zprava) if not nalezene else self.style.WARNING(zprava))
+        else:
+            prubeh.write(self.style.SUCCESS(f"Změřeno URL: {len(vysledky)}"))
+
+    def measure(self, prubeh, repeat):
+        client = Client(HTTP_HOST=_host())
+        vysledky = {}
+        for name, path, parametry in scenare():
+            vysledek = zmerit(client, path, parametry, repeat)
+            vysledky[name] = {'cesta': path, 'parametry': parametry, **vysledek}
+            if 'preskoceno' in vysledek:
+                prubeh.write(f"  {name}: přeskočeno ({vysledek['preskoceno']})")
+            else:
+                prubeh.write(
+                    f"  {name}: {vysledek['median_ms']:.1f} ms (studený {vysledek['studeny_ms']:.1f} ms), "
+                    f"dotazů {vysledek['dotazy']}/{vysledek['dotazy_tepla']}, paměť {vysledek['pamet_kb']:.0f} kB"
+                )
+        return vysledky
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from archiv_app import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Exportuje dokumenty, fotografie nebo osoby do CSV či JSONL. Data se čtou po dávkách, "
+        "takže paměťová náročnost nezávisí na velikosti archivu. Výstup lze znovu načíst příkazem import_archiv."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('typ', choices=sorted(export.EXPORT_SOURCES), help="Co exportovat.")
+        parser.add_argument('--format', choices=sorted(export.EXPORT_FORMATS), default='csv', help="Výstupní formát.")
+        parser.add_argument('--output', '-o', help="Cílový soubor (výchozí standardní výstup).")
+
+    def handle(self, *args, typ, format, output, **options):
+        if not output:
+            for chunk in export.stream_export(typ, format):
+                self.stdout.write(chunk, ending='')
+            return
+        try:
+            handle = open(output, 'w', encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(f"Soubor nelze otevřít: {e}")
+        zaznamy = 0
+        with handle:
+            for chunk in export.stream_export(typ, format):
+                handle.write(chunk)
+                zaznamy += 1
+        if format == 'csv':
+            zaznamy -= 1
+        self.stdout.write(self.style.SUCCESS(f"Exportováno záznamů: {zaznamy} do {output}"))
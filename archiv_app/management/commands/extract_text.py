@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from archiv_app import extraction, search
+from archiv_app.models import ObsahSouboru, Soubor
+
+
+class Command(BaseCommand):
+    help = (
+        "Vytáhne text z existujících souborů (PDF, ODT, DOCX, TXT) paralelně ve více procesech a doplní ho do fulltextu. "
+        "Soubory, jejichž obsah (SHA-256) se od poslední extrakce nezměnil, se přeskočí."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=extraction.get_extract_workers(), help="Počet pracovních procesů.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Počet souborů zpracovaných v jedné dávce.")
+        parser.add_argument('--force', action='store_true', help="Vytáhne znovu text i ze souborů, které se nezměnily.")
+
+    def handle(self, *args, workers, batch_size, force, **options):
+        soubory = Soubor.objects.exclude(file='').select_related('obsah').order_by('pk')
+        if not force:
+            soubory = soubory.filter(Q(obsah__isnull=True) | Q(sha256__isnull=True) | ~Q(obsah__sha256=F('sha256')))
+
+        hotovo = beze_zmeny = chyby = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            posledni_pk = 0
+            while True:
+                davka = list(soubory.filter(pk__gt=posledni_pk)[:batch_size])
+                if not davka:
+                    break
+                posledni_pk = davka[-1].pk
+                davka = [soubor for soubor in davka if extraction.is_supported(soubor.file.name)]
+                ulohy = [
+                    extraction.extraction_job(soubor, None if force else getattr(getattr(soubor, 'obsah', None), 'sha256', None))
+                    for soubor in davka
+                ]
+                vysledky = executor.map(extraction.run_extraction_job, [args for _, args in ulohy], chunksize=8)
+
+                k_ulozeni = []
+                for soubor, (sha256, text, chyba) in zip(davka, vysledky):
+                    if text is None:
+                        beze_zmeny += not chyba
+                        continue
+                    if chyba:
+                        chyby += 1
+                        self.stderr.write(f"Soubor #{soubor.pk} ({soubor.file.name}): {chyba}")
+                    obsah = ObsahSouboru(soubor=soubor, sha256=sha256, chyba=chyba)
+                    obsah.text = text
+                    k_ulozeni.append(obsah)
+                with transaction.atomic():
+                    ObsahSouboru.objects.bulk_create(
+                        k_ulozeni, update_conflicts=True, unique_fields=['soubor'],
+                        update_fields=['sha256', 'data', 'delka', 'chyba', 'extrahovano'],
+                    )
+                    search.index_soubory(obsah.soubor_id for obsah in k_ulozeni)
+                hotovo += len(k_ulozeni)
+                self.stdout.write(f"Zpracováno {hotovo} souborů ({hotovo / (time.perf_counter() - start):.1f}/s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Hotovo: {hotovo} souborů, beze změny: {beze_zmeny}, chyb: {chyby}"))
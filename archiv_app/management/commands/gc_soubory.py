@@ -0,0 +1,82 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from archiv_app import storage, thumbnails
+from archiv_app.models import ArchivovanyObjekt, Soubor
+
+BATCH_SIZE = 500
+
+
+def _soubory_na_disku(adresar):
+    # Vrací {jméno v úložišti: čas změny} pro všechny soubory pod adresářem.
+    root = default_storage.path('')
+    soubory = {}
+    for dirpath, _, filenames in os.walk(default_storage.path(adresar)):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                soubory[os.path.relpath(path, root).replace(os.sep, '/')] = os.stat(path).st_mtime
+            except FileNotFoundError:
+                pass
+    return soubory
+
+
+class Command(BaseCommand):
+    help = (
+        "Porovná soubory v MEDIA_ROOT s tabulkou Soubor a odstraní osiřelé soubory na disku i řádky Soubor, "
+        "na které neodkazuje žádný objekt (např. soubory nahrávání, jehož transakce se vrátila); "
+        "řádky odkazující na chybějící soubor vypíše. "
+        "Obě strany se načtou hromadně a porovnají jako množiny."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Pouze vypíše nalezené sirotky, nic nemaže.")
+        parser.add_argument(
+            '--min-stari', type=int, default=60,
+            help="Soubory mladší než tento počet minut se přeskočí (mohou patřit právě probíhajícímu nahrávání).",
+        )
+
+    def handle(self, *args, dry_run=False, min_stari, **options):
+        na_disku = {**_soubory_na_disku(storage.BLOB_DIR), **_soubory_na_disku(thumbnails.THUMBNAIL_DIR)}
+
+        odkazovane = set()
+        radky = []
+        for pk, file, nahled, nahled_webp in Soubor.objects.order_by().values_list(
+                'pk', 'file', 'nahled', 'nahled_webp').iterator(chunk_size=BATCH_SIZE * 4):
+            odkazovane.update((file, nahled, nahled_webp))
+            radky.append((pk, file))
+
+        hranice = time.time() - min_stari * 60
+        osirele_soubory = sorted(name for name, mtime in na_disku.items() if name not in odkazovane and mtime < hranice)
+        pouzite = set(ArchivovanyObjekt.objects.non_polymorphic().filter(soubor__isnull=False)
+                      .order_by().values_list('soubor_id', flat=True).distinct().iterator(chunk_size=BATCH_SIZE * 4))
+        nepouzite = [pk for pk, _ in radky if pk not in pouzite]
+        bez_souboru = [(pk, file) for pk, file in radky if pk in pouzite and file not in na_disku]
+
+        for name in osirele_soubory:
+            self.stdout.write(f"Osiřelý soubor: {name}")
+        for pk in nepouzite:
+            self.stdout.write(f"Soubor #{pk}: neodkazuje na něj žádný objekt")
+        for pk, file in bez_souboru:
+            self.stdout.write(self.style.WARNING(f"Soubor #{pk}: na disku chybí {file or '(prázdné jméno)'}"))
+
+        if not dry_run:
+            k_smazani = list(osirele_soubory)
+            for i in range(0, len(nepouzite), BATCH_SIZE):
+                with transaction.atomic():
+                    # Mezi načtením a mazáním mohl na soubor začít odkazovat nový objekt.
+                    davka = Soubor.objects.filter(pk__in=nepouzite[i:i + BATCH_SIZE]).exclude(
+                        pk__in=ArchivovanyObjekt.objects.non_polymorphic().filter(soubor__isnull=False).values('soubor'))
+                    k_smazani += [name for row in davka.values_list('file', 'nahled', 'nahled_webp') for name in row if name]
+                    davka.delete()
+            storage.unlink_names(k_smazani)
+
+        stav = "nalezeno" if dry_run else "odstraněno"
+        self.stdout.write(self.style.SUCCESS(
+            f"Osiřelých souborů {stav}: {len(osirele_soubory)}, nepoužitých řádků Soubor {stav}: {len(nepouzite)}, "
+            f"řádků s chybějícím souborem: {len(bez_souboru)}"
+        ))
@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from archiv_app import counters, thumbnails
+from archiv_app.models import Soubor
+
+
+class Command(BaseCommand):
+    help = "Doplní náhledy (JPEG a WebP) k existujícím souborům fotografií paralelně ve více procesech."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=thumbnails.get_thumbnail_workers(), help="Počet pracovních procesů.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Počet souborů zpracovaných v jedné dávce.")
+        parser.add_argument('--force', action='store_true', help="Přegeneruje i již existující náhledy.")
+
+    def handle(self, *args, workers, batch_size, force, **options):
+        if not thumbnails.is_available():
+            raise CommandError("Pro generování náhledů je potřeba nainstalovat knihovnu Pillow.")
+
+        soubory = Soubor.objects.filter(archivovanyobjekt__typ='fotografie').exclude(file='').distinct().order_by('pk')
+        if not force:
+            soubory = soubory.filter(nahled='')
+
+        hotovo = chyby = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            posledni_pk = 0
+            while True:
+                davka = list(soubory.filter(pk__gt=posledni_pk)[:batch_size])
+                if not davka:
+                    break
+                posledni_pk = davka[-1].pk
+                ulohy = [thumbnails.thumbnail_job(soubor) for soubor in davka]
+                vysledky = executor.map(thumbnails.run_thumbnail_job, [args for *_, args in ulohy], chunksize=8)
+
+                k_ulozeni = []
+                for soubor, (_, jpeg_name, webp_name, _), ok in zip(davka, ulohy, vysledky):
+                    if ok:
+                        soubor.nahled.name, soubor.nahled_webp.name = jpeg_name, webp_name
+                        k_ulozeni.append(soubor)
+                    else:
+                        chyby += 1
+                        self.stderr.write(f"Soubor #{soubor.pk} ({soubor.file.name}) nelze zpracovat.")
+                Soubor.objects.bulk_update(k_ulozeni, ['nahled', 'nahled_webp'])
+                counters.bump_version('verze_objekty')
+                hotovo += len(k_ulozeni)
+                self.stdout.write(f"Zpracováno {hotovo} náhledů ({hotovo / (time.perf_counter() - start):.1f}/s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Hotovo: {hotovo} náhledů, chyb: {chyby}"))
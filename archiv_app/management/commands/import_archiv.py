@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from archiv_app.importer import ArchivImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Hromadně importuje dokumenty, fotografie a osoby ze souboru CSV nebo JSONL. "
+        "Každý řádek má sloupec 'typ' (dokument, fotografie, osoba); osoby u objektů se zadávají "
+        "jako 'Jméno Příjmení' oddělené středníkem (v JSONL i jako seznam objektů {jmeno, prijmeni}), "
+        "soubory relativní cestou vůči --media-dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Cesta k souboru CSV nebo JSONL.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="Formát vstupu (výchozí podle přípony).")
+        parser.add_argument('--media-dir', help="Adresář, vůči kterému se vyhodnocují cesty ve sloupci 'soubor'.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Počet řádků v jedné transakci.")
+        parser.add_argument('--dry-run', action='store_true', help="Pouze ověří data, nic neuloží.")
+
+    def handle(self, *args, path, format, media_dir, batch_size, dry_run, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size musí být alespoň 1.")
+        importer = ArchivImporter(
+            media_dir=media_dir,
+            batch_size=batch_size,
+            dry_run=dry_run,
+            report=self.stdout.write,
+            report_error=self.stderr.write,
+        )
+        start = time.perf_counter()
+        try:
+            stats = importer.run(path, format)
+        except OSError as e:
+            raise CommandError(f"Soubor nelze načíst: {e}")
+        elapsed = time.perf_counter() - start
+        rychlost = stats['radky'] / elapsed if elapsed else 0
+        stav = "ověřeno (bez uložení)" if dry_run else "uloženo"
+        self.stdout.write(self.style.SUCCESS(
+            f"Hotovo: {stats['ulozeno']} z {stats['radky']} řádků {stav} v {stats['davky']} dávkách "
+            f"za {elapsed:.1f} s ({rychlost:.0f} řádků/s), chyb: {stats['chyby']}"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from archiv_app import search
+
+
+class Command(BaseCommand):
+    help = "Znovu sestaví fulltextový index (FTS5) archivovaných objektů, např. po hromadném importu."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Fulltextový index je dostupný pouze pro databázi SQLite.")
+        with transaction.atomic():
+            pocet = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Zaindexováno objektů: {pocet}"))
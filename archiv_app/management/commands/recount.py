@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from archiv_app import counters
+from archiv_app.models import Osoba, archivalie_count_subquery
+
+
+class Command(BaseCommand):
+    help = (
+        "Přepočítá denormalizovaný počet archiválií u osob a počítadla hlavní stránky a opraví odchylky. "
+        "Vhodné spouštět pravidelně (např. z cronu)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Pouze vypíše odchylky, nic neukládá.")
+
+    def handle(self, *args, dry_run=False, **options):
+        with transaction.atomic():
+            odchylky = list(
+                Osoba.objects.annotate(skutecny_pocet=archivalie_count_subquery())
+                .exclude(pocet_archivalii=F('skutecny_pocet'))
+                .values_list('pk', 'pocet_archivalii', 'skutecny_pocet')
+            )
+            for pk, ulozeny, skutecny in odchylky:
+                self.stdout.write(f"Osoba #{pk}: uloženo {ulozeny}, skutečně {skutecny}")
+            if odchylky and not dry_run:
+                Osoba.objects.filter(pk__in=[pk for pk, _, _ in odchylky]).recount_archivalie()
+
+            odchylky_pocitadel = counters.reconcile(dry_run=dry_run)
+            for nazev, ulozeny, skutecny in odchylky_pocitadel:
+                self.stdout.write(f"Počítadlo '{nazev}': uloženo {ulozeny}, skutečně {skutecny}")
+
+        stav = "nalezeno" if dry_run else "opraveno"
+        self.stdout.write(self.style.SUCCESS(f"Odchylek {stav}: {len(odchylky) + len(odchylky_pocitadel)}"))
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+DEFAULT_WORKERS = 2
+
+
+def _init_procesu():
+    # Pracovní procesy se spouštějí metodou spawn (bez zděděných databázových spojení) a nastaví si Django samy.
+    import django
+    django.setup()
+
+
+def _provest(pk):
+    # Modul se v procesech spawn importuje ještě před django.setup(), modely se proto načítají až zde.
+    from archiv_app import jobs
+    try:
+        return jobs.execute(pk)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Spustí pracovníka fronty úloh uložené v databázi (tabulka Uloha). Úlohy zabírá podmíněným UPDATE, "
+        "takže může běžet více pracovníků zároveň i nad SQLite; neúspěšné úlohy opakuje s rostoucím odstupem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pracovnici', type=int, default=getattr(settings, 'ARCHIV_JOB_WORKERS', DEFAULT_WORKERS),
+            help="Počet souběžně prováděných úloh.",
+        )
+        parser.add_argument('--pool', choices=('vlakna', 'procesy'), default='vlakna', help="Provádět úlohy ve vláknech, nebo v procesech.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Jak často (v sekundách) hledat nové úlohy.")
+        parser.add_argument('--jednou', action='store_true', help="Zpracuje připravené úlohy a skončí.")
+        parser.add_argument('--statistiky', action='store_true', help="Pouze vypíše statistiky úloh podle názvu.")
+
+    def handle(self, *args, pracovnici, pool, interval, jednou, statistiky, **options):
+        from archiv_app import jobs
+        if statistiky:
+            self.vypis_statistiky()
+            return
+
+        pracovnik = f"{socket.gethostname()}:{os.getpid()}"
+        if pool == 'procesy':
+            executor = ProcessPoolExecutor(max_workers=pracovnici, mp_context=multiprocessing.get_context('spawn'), initializer=_init_procesu)
+        else:
+            executor = ThreadPoolExecutor(max_workers=pracovnici, thread_name_prefix='archiv-uloha')
+        self.stdout.write(f"Pracovník {pracovnik}: {pracovnici} × {pool}")
+
+        hotovo = chyby = 0
+        bezici = {}
+        obnoveno = time.monotonic()
+        with executor:
+            try:
+                while True:
+                    if len(bezici) < pracovnici:
+                        for pk in jobs.claim(pracovnici - len(bezici), pracovnik):
+                            bezici[executor.submit(_provest, pk)] = pk
+                    if not bezici:
+                        if jednou:
+                            break
+                        time.sleep(interval)
+                        continue
+                    if time.monotonic() - obnoveno >= jobs.renew_interval():
+                        jobs.renew(list(bezici.values()), pracovnik)
+                        obnoveno = time.monotonic()
+                    dokoncene, _ = wait(bezici, timeout=min(interval, jobs.renew_interval()), return_when=FIRST_COMPLETED)
+                    for future in dokoncene:
+                        del bezici[future]
+                        try:
+                            ok = future.result()
+                        except Exception as e:
+                            ok = False
+                            self.stderr.write(f"Úlohu se nepodařilo provést: {e}")
+                        hotovo += ok
+                        chyby += not ok
+            except KeyboardInterrupt:
+                self.stdout.write("Ukončuji, čekám na rozpracované úlohy…")
+
+        self.stdout.write(self.style.SUCCESS(f"Zpracováno úloh: {hotovo}, neúspěšných pokusů: {chyby}"))
+
+    def vypis_statistiky(self):
+        from archiv_app import jobs
+        for radek in jobs.stats():
+            prumer = f"{radek['prumer']:.3f} s" if radek['prumer'] is not None else "-"
+            nejdele = f"{radek['nejdele']:.3f} s" if radek['nejdele'] is not None else "-"
+            self.stdout.write(
+                f"{radek['nazev']}: {radek['pocet']} úloh, hotovo {radek['hotovo']}, čeká {radek['ceka']}, "
+                f"chyb {radek['chyby']}, pokusů {radek['pokusu_celkem']}, průměr {prumer}, nejdéle {nejdele}"
+            )
+        self.stdout.write(self.style.SUCCESS("Statistiky vypsány."))
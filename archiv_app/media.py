@@ -0,0 +1,174 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from .storage import BLOB_DIR, TMP_DIR
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CONTENT_ADDRESSED_RE = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.\w+)?$')
+STREAM_BLOCK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    # Podporován je jediný rozsah; vícenásobné rozsahy obslouží celá odpověď 200.
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if first and last and int(last) < int(first):
+        # Syntakticky neplatný rozsah se podle RFC 9110 ignoruje.
+        return None
+    if size == 0:
+        raise RangeNotSatisfiable
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    parsed = parse_http_date_safe(if_range)
+    return parsed is not None and int(mtime) <= parsed
+
+
+def _stream_range(path, start, end):
+    remaining = end - start + 1
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while remaining > 0:
+            chunk = handle.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _astream_range(path, start, end):
+    # Čtení bloků běží mimo smyčku událostí a mezi bloky nedrží vlákno; pomalý klient tak
+    # blokuje jen svou korutinu.
+    handle = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+    try:
+        await sync_to_async(handle.seek, thread_sensitive=False)(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await sync_to_async(handle.read, thread_sensitive=False)(min(STREAM_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def resolve_media_path(path):
+    path = posixpath.normpath(path).lstrip('/')
+    if path.startswith(f'{BLOB_DIR}/{TMP_DIR}/'):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return path, full_path
+
+
+def _sendfile_response(path, full_path, content_type):
+    mode = getattr(settings, 'ARCHIV_MEDIA_SENDFILE', None)
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'ARCHIV_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        return None
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    path, full_path = resolve_media_path(path)
+    return _media_response(request, path, full_path, os.stat(full_path))
+
+
+@require_safe
+async def aserve_media(request, path):
+    path, full_path = await sync_to_async(resolve_media_path, thread_sensitive=False)(path)
+    stat = await sync_to_async(os.stat, thread_sensitive=False)(full_path)
+    return _media_response(request, path, full_path, stat, stream=_astream_range)
+
+
+def _media_response(request, path, full_path, stat, stream=None):
+    etag = quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        response = _sendfile_response(path, full_path, content_type)
+        if response is None:
+            response = _file_response(request, full_path, stat, etag, content_type, stream)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if CONTENT_ADDRESSED_RE.match(path) else REVALIDATE_CACHE_CONTROL
+    return response
+
+
+def _file_response(request, full_path, stat, etag, content_type, stream=None):
+    size = stat.st_size
+    range_header = request.META.get('HTTP_RANGE')
+    byte_range = None
+    if range_header and _if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None and stream is None:
+        # Celý soubor: WSGI server může přes wsgi.file_wrapper použít sendfile().
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(
+            (stream or _stream_range)(full_path, start, end),
+            status=206 if byte_range else 200,
+            content_type=content_type,
+        )
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
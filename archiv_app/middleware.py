@@ -0,0 +1,180 @@
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_SLOW_QUERIES_LOGGED = 5
+DEFAULT_DUPLICATE_QUERY_LIMIT = 5
+
+_SQL_PARAMETRY = re.compile(r"%s|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_SEZNAMY = re.compile(r"\(\?(?:, \?)*\)")
+
+
+class ReplicaStickinessMiddleware:
+    # Klient, který zapisoval, čte po dobu ARCHIV_REPLICA_STICKY_SECONDS z primární databáze,
+    # dokud replika nedožene zpoždění.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.request_scope(pinned=routers.STICKY_COOKIE in request.COOKIES) as stav:
+            response = self.get_response(request)
+        return self._pin(response, stav)
+
+    async def __acall__(self, request):
+        with routers.request_scope(pinned=routers.STICKY_COOKIE in request.COOKIES) as stav:
+            response = await self.get_response(request)
+        return self._pin(response, stav)
+
+    def _pin(self, response, stav):
+        if stav.zapsano:
+            response.set_cookie(
+                routers.STICKY_COOKIE, '1', max_age=routers.sticky_seconds(), httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class _Mereni:
+    def __init__(self):
+        self.dotazy = []
+        self.db = 0.0
+        self.sablony = 0.0
+
+
+_mereni = contextvars.ContextVar('archiv_mereni', default=None)
+_instalovano = False
+
+
+def normalize_sql(sql):
+    # Hodnoty a seznamy parametrů se nahradí otazníkem; dotazy lišící se jen hodnotami pak splynou.
+    sql = _SQL_PARAMETRY.sub('?', ' '.join(sql.split()))
+    return _SQL_SEZNAMY.sub('(?, …)', sql)
+
+
+def _zaznamenat_dotaz(execute, sql, params, many, context):
+    mereni = _mereni.get()
+    if mereni is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trvani = time.perf_counter() - start
+        mereni.db += trvani
+        mereni.dotazy.append((trvani, sql))
+
+
+def _pridat_wrapper(sender=None, connection=None, **kwargs):
+    if _zaznamenat_dotaz not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_zaznamenat_dotaz)
+
+
+def _merit_sablony(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        mereni = _mereni.get()
+        if mereni is None:
+            return render(self, *args, **kwargs)
+        start, db = time.perf_counter(), mereni.db
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            # Dotazy líných querysetů vyhodnocených v šabloně se počítají jen do databáze.
+            mereni.sablony += time.perf_counter() - start - (mereni.db - db)
+    return wrapper
+
+
+def _instalovat():
+    # Měřicí háčky se zapojí jen se zapnutým middlewarem; mimo měřený požadavek jen předávají volání dál.
+    global _instalovano
+    if not _instalovano:
+        _instalovano = True
+        connection_created.connect(_pridat_wrapper, dispatch_uid='archiv_server_timing')
+        Template.render = _merit_sablony(Template.render)
+    # Spojení otevřená v tomto vlákně už dřív signál connection_created nezachytí.
+    for connection in connections.all(initialized_only=True):
+        _pridat_wrapper(connection=connection)
+
+
+class ServerTimingMiddleware:
+    # Počet a čas SQL dotazů, čas šablon a pohledu v hlavičce Server-Timing; pomalé požadavky
+    # a opakované dotazy (N+1) zapisuje do logu. Vypnutý (ARCHIV_SERVER_TIMING) se z řetězce vyřadí.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ARCHIV_SERVER_TIMING', False):
+            raise MiddlewareNotUsed
+        _instalovat()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _mereni.set(_Mereni())
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self._vyhodnotit(request, response, _mereni.get(), time.perf_counter() - start)
+        finally:
+            _mereni.reset(token)
+
+    async def __acall__(self, request):
+        token = _mereni.set(_Mereni())
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self._vyhodnotit(request, response, _mereni.get(), time.perf_counter() - start)
+        finally:
+            _mereni.reset(token)
+
+    def _vyhodnotit(self, request, response, mereni, celkem):
+        # Pohled = celkový čas bez databáze a šablon. U streamovaných odpovědí (export) se měří jen do jejich vrácení.
+        pohled = max(celkem - mereni.db - mereni.sablony, 0)
+        response['Server-Timing'] = (
+            f'db;dur={mereni.db * 1000:.1f};desc="SQL x{len(mereni.dotazy)}", '
+            f'tpl;dur={mereni.sablony * 1000:.1f};desc="Templates", '
+            f'view;dur={pohled * 1000:.1f};desc="View", '
+            f'total;dur={celkem * 1000:.1f}'
+        )
+
+        limit = getattr(settings, 'ARCHIV_DUPLICATE_QUERY_LIMIT', DEFAULT_DUPLICATE_QUERY_LIMIT)
+        opakovane = Counter(normalize_sql(sql) for _, sql in mereni.dotazy)
+        for sql, pocet in opakovane.most_common():
+            if pocet < limit:
+                break
+            logger.warning("%s %s: dotaz se opakuje %s× (N+1?): %s", request.method, request.path, pocet, sql)
+
+        if celkem * 1000 >= getattr(settings, 'ARCHIV_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS):
+            nejpomalejsi = sorted(mereni.dotazy, key=lambda dotaz: dotaz[0], reverse=True)
+            nejpomalejsi = nejpomalejsi[:getattr(settings, 'ARCHIV_SLOW_QUERIES_LOGGED', DEFAULT_SLOW_QUERIES_LOGGED)]
+            logger.warning(
+                "Pomalý požadavek %s %s: %.0f ms (SQL %s× %.0f ms, šablony %.0f ms, pohled %.0f ms)%s",
+                request.method, request.path, celkem * 1000, len(mereni.dotazy), mereni.db * 1000,
+                mereni.sablony * 1000, pohled * 1000,
+                ''.join(f"\n  {trvani * 1000:.1f} ms: {sql}" for trvani, sql in nejpomalejsi),
+            )
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 12:28
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Q, Subquery
+
+
+def spocitat_archivalie(apps, schema_editor):
+    Osoba = apps.get_model('archiv_app', 'Osoba')
+    ArchivovanyObjekt = apps.get_model('archiv_app', 'ArchivovanyObjekt')
+    db_alias = schema_editor.connection.alias
+    objekty = ArchivovanyObjekt.objects.filter(
+        Q(osoba=OuterRef('pk')) |
+        Q(pk__in=ArchivovanyObjekt.osoby.through.objects.filter(osoba=OuterRef(OuterRef('pk'))).values('archivovanyobjekt'))
+    ).order_by().annotate(pocet=Func(F('pk'), function='COUNT')).values('pocet')
+    Osoba.objects.using(db_alias).update(pocet_archivalii=Subquery(objekty, output_field=models.PositiveIntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0004_alter_archivovanyobjekt_soubor_alter_osoba_pohlavi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='osoba',
+            name='pocet_archivalii',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Denormalizovaný počet archiválií spojených s osobou', verbose_name='Počet archiválií'),
+        ),
+        migrations.RunPython(spocitat_archivalie, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 13:05
+
+from django.db import migrations
+
+CREATE_SQL = '''
+    CREATE VIRTUAL TABLE archiv_app_fulltext USING fts5(
+        popis, osoby, druh, typ_fotografie,
+        tokenize = "unicode61 remove_diacritics 2"
+    )
+'''
+
+POPULATE_SQL = '''
+    INSERT INTO archiv_app_fulltext (rowid, popis, osoby, druh, typ_fotografie)
+    SELECT o.id,
+           o.popis,
+           (SELECT group_concat(p.jmeno || ' ' || p.prijmeni, ' ')
+              FROM archiv_app_osoba p
+             WHERE p.id = o.osoba_id
+                OR p.id IN (SELECT m.osoba_id FROM archiv_app_archivovanyobjekt_osoby m
+                             WHERE m.archivovanyobjekt_id = o.id)),
+           (SELECT d.nazev || ' ' || d.popis
+              FROM archiv_app_dokument k
+              JOIN archiv_app_druh d ON d.id = k.druh_id
+             WHERE k.archivovanyobjekt_ptr_id = o.id),
+           (SELECT f.typ_fotografie
+              FROM archiv_app_fotografie f
+             WHERE f.archivovanyobjekt_ptr_id = o.id)
+      FROM archiv_app_archivovanyobjekt o
+'''
+
+
+def vytvorit_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(POPULATE_SQL)
+
+
+def odstranit_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS archiv_app_fulltext')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0005_osoba_pocet_archivalii'),
+    ]
+
+    operations = [
+        migrations.RunPython(vytvorit_index, odstranit_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0006_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soubor',
+            name='nahled',
+            field=models.FileField(blank=True, editable=False, help_text='Zmenšený náhled (JPEG)', upload_to='nahledy/', verbose_name='Náhled'),
+        ),
+        migrations.AddField(
+            model_name='soubor',
+            name='nahled_webp',
+            field=models.FileField(blank=True, editable=False, help_text='Zmenšený náhled (WebP)', upload_to='nahledy/', verbose_name='Náhled WebP'),
+        ),
+    ]
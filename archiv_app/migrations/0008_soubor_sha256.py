@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-18 12:32
+
+import hashlib
+import os
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def spocitat_otisky(apps, schema_editor):
+    Soubor = apps.get_model('archiv_app', 'Soubor')
+    ArchivovanyObjekt = apps.get_model('archiv_app', 'ArchivovanyObjekt')
+    db_alias = schema_editor.connection.alias
+
+    kanonicke = {}
+    for soubor in Soubor.objects.using(db_alias).order_by('pk').iterator():
+        if not soubor.file:
+            continue
+        try:
+            path = soubor.file.path
+            digest, velikost = _sha256(path), os.path.getsize(path)
+        except (OSError, ValueError, NotImplementedError):
+            continue
+        if digest in kanonicke:
+            # Duplicitní obsah – objekty převedeme na první kopii, soubor na disku uklidí GC.
+            ArchivovanyObjekt.objects.using(db_alias).filter(soubor=soubor).update(soubor=kanonicke[digest])
+            soubor.delete(using=db_alias)
+            continue
+        kanonicke[digest] = soubor.pk
+        Soubor.objects.using(db_alias).filter(pk=soubor.pk).update(sha256=digest, velikost=velikost)
+
+    for pk, pocet in Soubor.objects.using(db_alias).annotate(pocet=Count('archivovanyobjekt')).values_list('pk', 'pocet'):
+        Soubor.objects.using(db_alias).filter(pk=pk).update(pocet_odkazu=pocet)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0007_soubor_nahled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soubor',
+            name='pocet_odkazu',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Počet archivovaných objektů, které soubor používají', verbose_name='Počet odkazů'),
+        ),
+        migrations.AddField(
+            model_name='soubor',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 obsahu souboru', max_length=64, null=True, unique=True, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='soubor',
+            name='velikost',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Velikost souboru v bajtech', null=True, verbose_name='Velikost'),
+        ),
+        migrations.RunPython(spocitat_otisky, migrations.RunPython.noop),
+    ]
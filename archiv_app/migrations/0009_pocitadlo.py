@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+def naplnit_pocitadla(apps, schema_editor):
+    Pocitadlo = apps.get_model('archiv_app', 'Pocitadlo')
+    db_alias = schema_editor.connection.alias
+    for nazev, model_name in (('dokumenty', 'Dokument'), ('fotografie', 'Fotografie'), ('osoby', 'Osoba')):
+        pocet = apps.get_model('archiv_app', model_name).objects.using(db_alias).count()
+        Pocitadlo.objects.using(db_alias).create(nazev=nazev, hodnota=pocet)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0008_soubor_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pocitadlo',
+            fields=[
+                ('nazev', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Název')),
+                ('hodnota', models.BigIntegerField(default=0, verbose_name='Hodnota')),
+            ],
+            options={
+                'verbose_name': 'Počítadlo',
+                'verbose_name_plural': 'Počítadla',
+            },
+        ),
+        migrations.RunPython(naplnit_pocitadla, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0009_pocitadlo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivovanyobjekt',
+            name='upraveno',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Naposledy upraveno'),
+        ),
+        migrations.AddField(
+            model_name='druh',
+            name='upraveno',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Naposledy upraveno'),
+        ),
+        migrations.AddField(
+            model_name='osoba',
+            name='upraveno',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Naposledy upraveno'),
+        ),
+        migrations.AddField(
+            model_name='pocitadlo',
+            name='zmeneno',
+            field=models.DateTimeField(auto_now=True, verbose_name='Naposledy změněno'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0010_upraveno'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(fields=['-datum_archivace', 'typ'], name='objekt_archivace_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(fields=['typ', '-datum_archivace'], name='objekt_typ_archivace_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(fields=['rok_vzniku', '-datum_archivace', 'typ'], name='objekt_rok_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(fields=['stoleti_vzniku', '-datum_archivace', 'typ'], name='objekt_stoleti_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(fields=['datum_vzniku_presne'], name='objekt_datum_vzniku_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dokument',
+            index=models.Index(fields=['jazyk'], name='dokument_jazyk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='druh',
+            index=models.Index(fields=['nazev'], name='druh_nazev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fotografie',
+            index=models.Index(fields=['typ_fotografie'], name='fotografie_typ_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='osoba',
+            index=models.Index(fields=['prijmeni', 'jmeno'], name='osoba_jmeno_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 12:47
+
+import datetime
+
+from django.db import migrations, models
+
+
+def _rozsah(datum_presne, rok, stoleti):
+    if datum_presne:
+        return datum_presne, datum_presne
+    if rok:
+        return datetime.date(rok, 1, 1), datetime.date(rok, 12, 31)
+    if stoleti:
+        stoleti = int(stoleti)
+        return datetime.date((stoleti - 1) * 100 + 1, 1, 1), datetime.date(stoleti * 100, 12, 31)
+    return None, None
+
+
+def spocitat_datace(apps, schema_editor):
+    ArchivovanyObjekt = apps.get_model('archiv_app', 'ArchivovanyObjekt')
+    db_alias = schema_editor.connection.alias
+    objekty = ArchivovanyObjekt.objects.using(db_alias).only('datum_vzniku_presne', 'rok_vzniku', 'stoleti_vzniku').order_by('pk')
+    davka = []
+    for objekt in objekty.iterator(chunk_size=2000):
+        objekt.datace_od, objekt.datace_do = _rozsah(objekt.datum_vzniku_presne, objekt.rok_vzniku, objekt.stoleti_vzniku)
+        davka.append(objekt)
+        if len(davka) >= 2000:
+            ArchivovanyObjekt.objects.using(db_alias).bulk_update(davka, ['datace_od', 'datace_do'])
+            davka = []
+    ArchivovanyObjekt.objects.using(db_alias).bulk_update(davka, ['datace_od', 'datace_do'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0011_indexy'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivovanyobjekt',
+            name='datace_do',
+            field=models.DateField(blank=True, editable=False, help_text='Nejpozdější možné datum vzniku odvozené z datace.', null=True, verbose_name='Datace do'),
+        ),
+        migrations.AddField(
+            model_name='archivovanyobjekt',
+            name='datace_od',
+            field=models.DateField(blank=True, editable=False, help_text='Nejdřívější možné datum vzniku odvozené z datace.', null=True, verbose_name='Datace od'),
+        ),
+        migrations.RunPython(spocitat_datace, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(fields=['datace_od', 'datace_do'], name='objekt_datace_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-18 13:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _klic(text):
+    rozlozeny = unicodedata.normalize('NFKD', text or '')
+    return ''.join(znak for znak in rozlozeny if not unicodedata.combining(znak)).casefold()
+
+
+def spocitat_klice(apps, schema_editor):
+    Osoba = apps.get_model('archiv_app', 'Osoba')
+    db_alias = schema_editor.connection.alias
+    davka = []
+    for osoba in Osoba.objects.using(db_alias).only('jmeno', 'prijmeni').order_by('pk').iterator(chunk_size=2000):
+        osoba.klic_prijmeni, osoba.klic_jmeno = _klic(osoba.prijmeni), _klic(osoba.jmeno)
+        davka.append(osoba)
+        if len(davka) >= 2000:
+            Osoba.objects.using(db_alias).bulk_update(davka, ['klic_prijmeni', 'klic_jmeno'])
+            davka = []
+    Osoba.objects.using(db_alias).bulk_update(davka, ['klic_prijmeni', 'klic_jmeno'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0012_datace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='osoba',
+            name='klic_jmeno',
+            field=models.CharField(blank=True, editable=False, help_text='Jméno bez diakritiky a malými písmeny pro našeptávač', max_length=100, verbose_name='Klíč jména'),
+        ),
+        migrations.AddField(
+            model_name='osoba',
+            name='klic_prijmeni',
+            field=models.CharField(blank=True, editable=False, help_text='Příjmení bez diakritiky a malými písmeny pro našeptávač', max_length=100, verbose_name='Klíč příjmení'),
+        ),
+        migrations.RunPython(spocitat_klice, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='osoba',
+            index=models.Index(fields=['klic_prijmeni', 'klic_jmeno'], name='osoba_klic_prijmeni_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='osoba',
+            index=models.Index(fields=['klic_jmeno', 'klic_prijmeni'], name='osoba_klic_jmeno_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 13:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0013_osoba_klice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Uloha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nazev', models.CharField(max_length=100, verbose_name='Název úlohy')),
+                ('parametry', models.JSONField(blank=True, default=dict, verbose_name='Parametry')),
+                ('stav', models.CharField(choices=[('ceka', 'Čeká'), ('bezi', 'Běží'), ('hotovo', 'Hotovo'), ('chyba', 'Chyba')], default='ceka', max_length=10, verbose_name='Stav')),
+                ('pokusy', models.PositiveIntegerField(default=0, verbose_name='Počet pokusů')),
+                ('max_pokusu', models.PositiveIntegerField(default=5, verbose_name='Nejvýše pokusů')),
+                ('spustit_po', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Spustit po')),
+                ('pracovnik', models.CharField(blank=True, max_length=100, verbose_name='Pracovník')),
+                ('zamceno_do', models.DateTimeField(blank=True, null=True, verbose_name='Zamčeno do')),
+                ('zalozeno', models.DateTimeField(auto_now_add=True, verbose_name='Založeno')),
+                ('zahajeno', models.DateTimeField(blank=True, null=True, verbose_name='Zahájeno')),
+                ('dokonceno', models.DateTimeField(blank=True, null=True, verbose_name='Dokončeno')),
+                ('trvani', models.FloatField(blank=True, null=True, verbose_name='Trvání (s)')),
+                ('chyba', models.TextField(blank=True, verbose_name='Poslední chyba')),
+            ],
+            options={
+                'verbose_name': 'Úloha',
+                'verbose_name_plural': 'Úlohy',
+                'indexes': [models.Index(fields=['stav', 'spustit_po'], name='uloha_fronta_idx')],
+            },
+        ),
+    ]
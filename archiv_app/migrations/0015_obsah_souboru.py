@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-18 13:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# FTS5 neumí přidat sloupec; index se vytvoří znovu se sloupcem 'obsah' (text souborů).
+# Tabulka obsahů je v této migraci nová a prázdná, sloupec se naplní příkazem extract_text.
+CREATE_SQL = '''
+    CREATE VIRTUAL TABLE archiv_app_fulltext USING fts5(
+        popis, osoby, druh, typ_fotografie{obsah},
+        tokenize = "unicode61 remove_diacritics 2"
+    )
+'''
+
+POPULATE_SQL = '''
+    INSERT INTO archiv_app_fulltext (rowid, popis, osoby, druh, typ_fotografie)
+    SELECT o.id,
+           o.popis,
+           (SELECT group_concat(p.jmeno || ' ' || p.prijmeni, ' ')
+              FROM archiv_app_osoba p
+             WHERE p.id = o.osoba_id
+                OR p.id IN (SELECT m.osoba_id FROM archiv_app_archivovanyobjekt_osoby m
+                             WHERE m.archivovanyobjekt_id = o.id)),
+           (SELECT d.nazev || ' ' || d.popis
+              FROM archiv_app_dokument k
+              JOIN archiv_app_druh d ON d.id = k.druh_id
+             WHERE k.archivovanyobjekt_ptr_id = o.id),
+           (SELECT f.typ_fotografie
+              FROM archiv_app_fotografie f
+             WHERE f.archivovanyobjekt_ptr_id = o.id)
+      FROM archiv_app_archivovanyobjekt o
+'''
+
+
+def _vytvorit_index(schema_editor, obsah):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS archiv_app_fulltext')
+    schema_editor.execute(CREATE_SQL.format(obsah=', obsah' if obsah else ''))
+    schema_editor.execute(POPULATE_SQL)
+
+
+def pridat_sloupec_obsah(apps, schema_editor):
+    _vytvorit_index(schema_editor, obsah=True)
+
+
+def odebrat_sloupec_obsah(apps, schema_editor):
+    _vytvorit_index(schema_editor, obsah=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0014_uloha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObsahSouboru',
+            fields=[
+                ('soubor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='obsah', serialize=False, to='archiv_app.soubor', verbose_name='Soubor')),
+                ('sha256', models.CharField(help_text='SHA-256 obsahu souboru, ze kterého byl text vytažen', max_length=64, verbose_name='SHA-256')),
+                ('data', models.BinaryField(help_text='Text komprimovaný zlibem (UTF-8)', verbose_name='Komprimovaný text')),
+                ('delka', models.PositiveIntegerField(default=0, help_text='Počet znaků nekomprimovaného textu', verbose_name='Délka textu')),
+                ('chyba', models.TextField(blank=True, help_text='Proč se text nepodařilo vytáhnout', verbose_name='Chyba')),
+                ('extrahovano', models.DateTimeField(auto_now=True, verbose_name='Extrahováno')),
+            ],
+            options={
+                'verbose_name': 'Obsah souboru',
+                'verbose_name_plural': 'Obsahy souborů',
+            },
+        ),
+        migrations.RunPython(pridat_sloupec_obsah, odebrat_sloupec_obsah),
+    ]
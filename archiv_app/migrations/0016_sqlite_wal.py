@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def _journal_mode(mode):
+    def nastavit(apps, schema_editor):
+        # Režim WAL je trvalý (uloží se do hlavičky souboru), stačí ho proto nastavit jednou.
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode={mode}')
+    return nastavit
+
+
+zapnout_wal = _journal_mode('WAL')
+vypnout_wal = _journal_mode('DELETE')
+
+
+class Migration(migrations.Migration):
+    # Režim žurnálu nelze měnit uvnitř transakce.
+    atomic = False
+
+    dependencies = [
+        ('archiv_app', '0015_obsah_souboru'),
+    ]
+
+    operations = [
+        migrations.RunPython(zapnout_wal, vypnout_wal, atomic=False),
+    ]
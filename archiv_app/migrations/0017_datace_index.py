@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiv_app', '0016_sqlite_wal'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(models.ExpressionWrapper(models.Q(('datace_od__isnull', True)), output_field=models.BooleanField()), models.F('datace_od'), models.F('datace_do'), name='objekt_bez_datace_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivovanyobjekt',
+            index=models.Index(models.F('typ'), models.ExpressionWrapper(models.Q(('datace_od__isnull', True)), output_field=models.BooleanField()), models.F('datace_od'), models.F('datace_do'), models.F('id'), name='objekt_typ_datace_idx'),
+        ),
+    ]
@@ -1,8 +1,59 @@
-from django.db import models
+import datetime
+import unicodedata
+import zlib
+
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.conf import settings
 from polymorphic.models import PolymorphicModel
-from django.db.models import Q
+from django.db.models import ExpressionWrapper, F, Func, OuterRef, Q, Subquery
+
+
+def slozeny_klic(text):
+    # Klíč pro vyhledávání podle začátku: bez diakritiky a bez ohledu na velikost písmen.
+    rozlozeny = unicodedata.normalize('NFKD', text or '')
+    return ''.join(znak for znak in rozlozeny if not unicodedata.combining(znak)).casefold()
+
+
+def denormalized_counts_enabled():
+    return getattr(settings, 'ARCHIV_DENORMALIZED_COUNTS', False)
+
+
+def archivalie_count_subquery():
+    objekty = ArchivovanyObjekt.objects.non_polymorphic().filter(
+        Q(osoba=OuterRef('pk')) |
+        Q(pk__in=ArchivovanyObjekt.osoby.through.objects.filter(osoba=OuterRef(OuterRef('pk'))).values('archivovanyobjekt'))
+    ).order_by().annotate(pocet=Func(F('pk'), function='COUNT')).values('pocet')
+    return Subquery(objekty, output_field=models.PositiveIntegerField())
+
+
+class OsobaQuerySet(models.QuerySet):
+    def with_archivalie_count(self):
+        if denormalized_counts_enabled():
+            return self.annotate(archivalie_count=F('pocet_archivalii'))
+        return self.annotate(archivalie_count=archivalie_count_subquery())
+
+    def recount_archivalie(self):
+        return self.update(pocet_archivalii=archivalie_count_subquery())
+
+    def podle_zacatku(self, dotaz):
+        # Rozsahové dotazy na složené klíče (klíč >= p AND klíč < p + U+FFFF) jdou indexem, LIKE by nešel.
+        slova = slozeny_klic(dotaz).split()
+        if not slova:
+            return self.none()
+
+        def zacina(pole, predpona):
+            return Q(**{f'{pole}__gte': predpona, f'{pole}__lt': predpona + '\uffff'})
+
+        if len(slova) == 1:
+            return self.filter(zacina('klic_prijmeni', slova[0]) | zacina('klic_jmeno', slova[0]))
+        prvni, zbytek = slova[0], ' '.join(slova[1:])
+        return self.filter(
+            (zacina('klic_prijmeni', prvni) & zacina('klic_jmeno', zbytek)) |
+            (zacina('klic_jmeno', prvni) & zacina('klic_prijmeni', zbytek))
+        )
+
 
 class Osoba(models.Model):
     jmeno = models.CharField(
@@ -36,8 +87,40 @@ class Osoba(models.Model):
         help_text="Pohlaví osoby", 
         verbose_name="Pohlaví")
 
+    pocet_archivalii = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Denormalizovaný počet archiválií spojených s osobou",
+        verbose_name="Počet archiválií")
+
+    upraveno = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Naposledy upraveno")
+
+    klic_prijmeni = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        help_text="Příjmení bez diakritiky a malými písmeny pro našeptávač",
+        verbose_name="Klíč příjmení")
+
+    klic_jmeno = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        help_text="Jméno bez diakritiky a malými písmeny pro našeptávač",
+        verbose_name="Klíč jména")
+
+    objects = OsobaQuerySet.as_manager()
+
     class Meta:
         ordering = ['prijmeni', 'jmeno']
+        indexes = [
+            models.Index(fields=['prijmeni', 'jmeno'], name='osoba_jmeno_idx'),
+            models.Index(fields=['klic_prijmeni', 'klic_jmeno'], name='osoba_klic_prijmeni_idx'),
+            models.Index(fields=['klic_jmeno', 'klic_prijmeni'], name='osoba_klic_jmeno_idx'),
+        ]
         verbose_name = "Osoba"
         verbose_name_plural = "Osoby"
     
@@ -48,7 +131,22 @@ class Osoba(models.Model):
     def cele_jmeno(self):
         return f"{self.jmeno} {self.prijmeni}"
 
+    def nastavit_klice(self):
+        self.klic_prijmeni = slozeny_klic(self.prijmeni)
+        self.klic_jmeno = slozeny_klic(self.jmeno)
+
+    def save(self, *args, **kwargs):
+        self.nastavit_klice()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'jmeno', 'prijmeni'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'klic_prijmeni', 'klic_jmeno'}
+        super().save(*args, **kwargs)
+
     def get_archiválie_count(self):
+        if hasattr(self, 'archivalie_count'):
+            return self.archivalie_count
+        if denormalized_counts_enabled():
+            return self.pocet_archivalii
         count = ArchivovanyObjekt.objects.filter(
             Q(osoba=self) | Q(osoby=self)
         ).distinct().count()
@@ -57,6 +155,36 @@ class Osoba(models.Model):
 
 class Soubor(models.Model):
     file = models.FileField(upload_to='archivovane_soubory/', help_text="Soubor k archivaci", verbose_name="Soubor")
+    nahled = models.FileField(
+        upload_to='nahledy/',
+        blank=True,
+        editable=False,
+        help_text="Zmenšený náhled (JPEG)",
+        verbose_name="Náhled")
+    nahled_webp = models.FileField(
+        upload_to='nahledy/',
+        blank=True,
+        editable=False,
+        help_text="Zmenšený náhled (WebP)",
+        verbose_name="Náhled WebP")
+    sha256 = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True, blank=True,
+        editable=False,
+        help_text="SHA-256 obsahu souboru",
+        verbose_name="SHA-256")
+    velikost = models.PositiveBigIntegerField(
+        null=True, blank=True,
+        editable=False,
+        help_text="Velikost souboru v bajtech",
+        verbose_name="Velikost")
+    pocet_odkazu = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Počet archivovaných objektů, které soubor používají",
+        verbose_name="Počet odkazů")
+
     class Meta:
         verbose_name = "Soubor"
         verbose_name_plural = "Soubory"
@@ -64,6 +192,67 @@ class Soubor(models.Model):
     def __str__(self):
         return self.file.name
 
+    def delete_files(self):
+        for field_file in (self.file, self.nahled, self.nahled_webp):
+            if field_file:
+                field_file.delete(save=False)
+
+    def _delete_files_if_unused(self):
+        # Stejný obsah mohl být mezitím nahrán znovu; unlink_names to ověří těsně před smazáním.
+        from . import storage
+        storage.unlink_names(field_file.name for field_file in (self.file, self.nahled, self.nahled_webp) if field_file)
+
+    def release_reference(self):
+        with transaction.atomic():
+            Soubor.objects.filter(pk=self.pk, pocet_odkazu__gt=0).update(pocet_odkazu=F('pocet_odkazu') - 1)
+            zbyva = Soubor.objects.filter(pk=self.pk).values_list('pocet_odkazu', flat=True).first()
+            if zbyva is None or zbyva > 0 or self.archivovanyobjekt_set.exists():
+                return
+            self.delete()
+            transaction.on_commit(self._delete_files_if_unused)
+
+class ObsahSouboru(models.Model):
+    # Text vytažený ze souboru (PDF, ODT, DOCX, TXT) pro fulltext; uložený komprimovaný zlibem.
+    soubor = models.OneToOneField(
+        Soubor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='obsah',
+        verbose_name="Soubor")
+    sha256 = models.CharField(
+        max_length=64,
+        help_text="SHA-256 obsahu souboru, ze kterého byl text vytažen",
+        verbose_name="SHA-256")
+    data = models.BinaryField(
+        help_text="Text komprimovaný zlibem (UTF-8)",
+        verbose_name="Komprimovaný text")
+    delka = models.PositiveIntegerField(
+        default=0,
+        help_text="Počet znaků nekomprimovaného textu",
+        verbose_name="Délka textu")
+    chyba = models.TextField(
+        blank=True,
+        help_text="Proč se text nepodařilo vytáhnout",
+        verbose_name="Chyba")
+    extrahovano = models.DateTimeField(auto_now=True, verbose_name="Extrahováno")
+
+    class Meta:
+        verbose_name = "Obsah souboru"
+        verbose_name_plural = "Obsahy souborů"
+
+    def __str__(self):
+        return f"{self.soubor_id}: {self.delka} znaků"
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode() if self.data else ''
+
+    @text.setter
+    def text(self, value):
+        self.data = zlib.compress(value.encode(), 6)
+        self.delka = len(value)
+
+
 class Druh(models.Model):
     nazev = models.CharField(
         max_length=100, blank=False, 
@@ -75,8 +264,16 @@ class Druh(models.Model):
         blank=True, 
         help_text="Popis druhu dokumentu", 
         verbose_name="Popis druhu")
+
+    upraveno = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Naposledy upraveno")
     class Meta:
         ordering = ['nazev']
+        indexes = [
+            models.Index(fields=['nazev'], name='druh_nazev_idx'),
+        ]
         verbose_name = 'Druh dokumentu'
         verbose_name_plural = 'Druhy dokumentů'
 
@@ -93,6 +290,25 @@ STOLETÍ_CHOICES = [
     ('21', '21. století'),
 ]
 
+# Nejširší možná datace je století; filtry z toho odvozují dolní mez pro rozsah indexu.
+NEJDELSI_DATACE_LET = 100
+
+# Klíč řazení „bez datace“: SQLite neumí NULLS LAST v indexu, objekty bez datace proto
+# na konec řadí tento výraz, který má vlastní indexy (objekt_bez_datace_idx a objekt_typ_datace_idx).
+BEZ_DATACE = ExpressionWrapper(Q(datace_od__isnull=True), output_field=models.BooleanField())
+
+
+def datace_rozsah(datum_presne, rok, stoleti):
+    if datum_presne:
+        return datum_presne, datum_presne
+    if rok:
+        return datetime.date(rok, 1, 1), datetime.date(rok, 12, 31)
+    if stoleti:
+        stoleti = int(stoleti)
+        return datetime.date((stoleti - 1) * 100 + 1, 1, 1), datetime.date(stoleti * 100, 12, 31)
+    return None, None
+
+
 class ArchivovanyObjekt(PolymorphicModel):
     TYPY_OBJEKTU = [
         ('dokument', 'Dokument'),
@@ -151,8 +367,35 @@ class ArchivovanyObjekt(PolymorphicModel):
 
     osoby = models.ManyToManyField(Osoba, related_name="objekty", blank=True, help_text="Osoby spojené s objektem", verbose_name="Osoby")
 
+    datace_od = models.DateField(
+        null=True, blank=True,
+        editable=False,
+        verbose_name="Datace od",
+        help_text="Nejdřívější možné datum vzniku odvozené z datace.")
+    datace_do = models.DateField(
+        null=True, blank=True,
+        editable=False,
+        verbose_name="Datace do",
+        help_text="Nejpozdější možné datum vzniku odvozené z datace.")
+
+    upraveno = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Naposledy upraveno")
+
     class Meta:
         ordering = ['-datum_archivace', 'typ']
+        # SQLite za klíč indexu implicitně přidává rowid (pk), index tedy pokryje i řazení keyset stránkování.
+        indexes = [
+            models.Index(fields=['-datum_archivace', 'typ'], name='objekt_archivace_idx'),
+            models.Index(fields=['typ', '-datum_archivace'], name='objekt_typ_archivace_idx'),
+            models.Index(fields=['rok_vzniku', '-datum_archivace', 'typ'], name='objekt_rok_idx'),
+            models.Index(fields=['stoleti_vzniku', '-datum_archivace', 'typ'], name='objekt_stoleti_idx'),
+            models.Index(fields=['datum_vzniku_presne'], name='objekt_datum_vzniku_idx'),
+            models.Index(fields=['datace_od', 'datace_do'], name='objekt_datace_idx'),
+            models.Index(BEZ_DATACE, F('datace_od'), F('datace_do'), name='objekt_bez_datace_idx'),
+            models.Index(F('typ'), BEZ_DATACE, F('datace_od'), F('datace_do'), F('id'), name='objekt_typ_datace_idx'),
+        ]
         verbose_name = 'Archivovaný objekt'
         verbose_name_plural = 'Archivované objekty'
         
@@ -168,11 +411,44 @@ class ArchivovanyObjekt(PolymorphicModel):
 
     def __str__(self):
         return f"{self.typ.capitalize()} #{self.id} ({self.get_datace_display()})"
+
+    def nastavit_datace(self):
+        self.datace_od, self.datace_do = datace_rozsah(self.datum_vzniku_presne, self.rok_vzniku, self.stoleti_vzniku)
+
+    @property
+    def verze_radku(self):
+        # Vše, co mění vykreslený řádek seznamu, z dat načtených přes select_related/prefetch_related.
+        # Uloží-li se objekt, změní vazby (m2m_changed mění upraveno), osobu, druh nebo náhled, mění se i verze.
+        druh = getattr(self, 'druh', None)
+        soubor = self.soubor
+        return (
+            self.upraveno,
+            self.osoba_id and self.osoba.upraveno,
+            druh and (druh.pk, druh.upraveno),
+            tuple((osoba.pk, osoba.upraveno) for osoba in self.osoby.all()),
+            soubor and (soubor.pk, soubor.nahled.name, soubor.nahled_webp.name),
+        )
+
+    def save(self, *args, **kwargs):
+        self.nastavit_datace()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'datum_vzniku_presne', 'rok_vzniku', 'stoleti_vzniku'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'datace_od', 'datace_do'}
+        super().save(*args, **kwargs)
     
+    def release_soubor(self):
+        soubor = self.soubor
+        if soubor is None:
+            return
+        self.soubor = None
+        if self.pk:
+            ArchivovanyObjekt.objects.non_polymorphic().filter(pk=self.pk).update(soubor=None)
+        soubor.release_reference()
+
     def delete(self, *args, **kwargs):
-        if self.soubor and self.soubor.file:
-            self.soubor.file.delete(save=False)
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            self.release_soubor()
+            return super().delete(*args, **kwargs)
 
 class Dokument(ArchivovanyObjekt):
     JAZYK_CHOICES = [
@@ -211,6 +487,9 @@ class Dokument(ArchivovanyObjekt):
         verbose_name = "Dokument"
         verbose_name_plural = "Dokumenty"
         ordering = ['-datum_archivace', 'jazyk']
+        indexes = [
+            models.Index(fields=['jazyk'], name='dokument_jazyk_idx'),
+        ]
 
 class Fotografie(ArchivovanyObjekt):
     typ_fotografie = models.CharField(
@@ -239,5 +518,58 @@ class Fotografie(ArchivovanyObjekt):
         verbose_name = "Fotografie"
         verbose_name_plural = "Fotografie"
         ordering = ['-datum_archivace', 'typ_fotografie']
+        indexes = [
+            models.Index(fields=['typ_fotografie'], name='fotografie_typ_idx'),
+        ]
 
 
+class Pocitadlo(models.Model):
+    # Udržované počty řádků velkých tabulek, aby hlavní stránka nemusela volat COUNT(*).
+    nazev = models.CharField(max_length=50, primary_key=True, verbose_name='Název')
+    hodnota = models.BigIntegerField(default=0, verbose_name='Hodnota')
+    zmeneno = models.DateTimeField(auto_now=True, verbose_name='Naposledy změněno')
+
+    class Meta:
+        verbose_name = 'Počítadlo'
+        verbose_name_plural = 'Počítadla'
+
+    def __str__(self):
+        return f"{self.nazev}: {self.hodnota}"
+
+
+class Uloha(models.Model):
+    # Fronta úloh na pozadí v databázi (viz jobs.py a příkaz runworker), bez externího brokeru.
+    CEKA = 'ceka'
+    BEZI = 'bezi'
+    HOTOVO = 'hotovo'
+    CHYBA = 'chyba'
+    STAV_CHOICES = [
+        (CEKA, 'Čeká'),
+        (BEZI, 'Běží'),
+        (HOTOVO, 'Hotovo'),
+        (CHYBA, 'Chyba'),
+    ]
+
+    nazev = models.CharField(max_length=100, verbose_name='Název úlohy')
+    parametry = models.JSONField(default=dict, blank=True, verbose_name='Parametry')
+    stav = models.CharField(max_length=10, choices=STAV_CHOICES, default=CEKA, verbose_name='Stav')
+    pokusy = models.PositiveIntegerField(default=0, verbose_name='Počet pokusů')
+    max_pokusu = models.PositiveIntegerField(default=5, verbose_name='Nejvýše pokusů')
+    spustit_po = models.DateTimeField(default=timezone.now, verbose_name='Spustit po')
+    pracovnik = models.CharField(max_length=100, blank=True, verbose_name='Pracovník')
+    zamceno_do = models.DateTimeField(null=True, blank=True, verbose_name='Zamčeno do')
+    zalozeno = models.DateTimeField(auto_now_add=True, verbose_name='Založeno')
+    zahajeno = models.DateTimeField(null=True, blank=True, verbose_name='Zahájeno')
+    dokonceno = models.DateTimeField(null=True, blank=True, verbose_name='Dokončeno')
+    trvani = models.FloatField(null=True, blank=True, verbose_name='Trvání (s)')
+    chyba = models.TextField(blank=True, verbose_name='Poslední chyba')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stav', 'spustit_po'], name='uloha_fronta_idx'),
+        ]
+        verbose_name = 'Úloha'
+        verbose_name_plural = 'Úlohy'
+
+    def __str__(self):
+        return f"{self.nazev} #{self.pk} ({self.get_stav_display()})"
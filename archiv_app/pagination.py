@@ -0,0 +1,224 @@
+import base64
+import binascii
+import copy
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, OrderBy, Q, Value
+from django.db.models.lookups import Exact
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_PAGE_SIZE_CHOICES = (25, 50, 100, 200)
+
+
+def get_page_size_choices():
+    return tuple(getattr(settings, 'ARCHIV_PAGE_SIZE_CHOICES', DEFAULT_PAGE_SIZE_CHOICES))
+
+
+def get_page_size(request):
+    default = getattr(settings, 'ARCHIV_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        return default
+    return page_size if page_size in get_page_size_choices() else default
+
+
+class KeysetPage:
+    def __init__(self, request, object_list, keys, page_size, has_next, has_previous):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+        self.next_cursor = keys.encode(object_list[-1]) if self.has_next else None
+        self.previous_cursor = keys.encode(object_list[0]) if self.has_previous else None
+        self.page_size_choices = get_page_size_choices()
+        self._request = request
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _url(self, key, value):
+        query = self._request.GET.copy()
+        for param in ('after', 'before', key):
+            query.pop(param, None)
+        query[key] = value
+        return f"?{query.urlencode()}"
+
+    @property
+    def next_url(self):
+        return self._url('after', self.next_cursor) if self.next_cursor else None
+
+    @property
+    def previous_url(self):
+        return self._url('before', self.previous_cursor) if self.previous_cursor else None
+
+    @property
+    def page_size_links(self):
+        return [(size, self._url('page_size', size)) for size in self.page_size_choices]
+
+
+class KeysetOrdering:
+    # Položky řazení jsou názvy polí ('-pole') nebo F('pole').asc()/desc() s nulls_first/nulls_last.
+    # Bez určení se NULL řadí jako nejmenší hodnota (nativní chování SQLite).
+    # Jiný výraz (např. BEZ_DATACE.asc()) se k dotazu připojí metodou annotate() a dál se s ním
+    # zachází jako s polem; jeho hodnota se tak dostane do kurzoru i do podmínek seek().
+    def __init__(self, model, ordering):
+        self.model = model
+        self.keys = []
+        self.annotations = {}
+        names = []
+        for item in ordering:
+            if isinstance(item, OrderBy) and not isinstance(item.expression, F):
+                name = f'razeni_{len(self.annotations)}'
+                self.annotations[name] = item.expression
+                field = copy.copy(item.expression.output_field)
+                field.set_attributes_from_name(name)
+                names.append(name)
+                self.keys.append((field, item.descending, item.nulls_last or (item.descending and not item.nulls_first)))
+                continue
+            if isinstance(item, OrderBy):
+                name, descending = item.expression.name, item.descending
+                nulls_last = item.nulls_last or (descending and not item.nulls_first)
+            else:
+                descending = item.startswith('-')
+                name, nulls_last = item.lstrip('-'), descending
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            if field.name in names:
+                continue
+            names.append(field.name)
+            self.keys.append((field, descending, nulls_last))
+        if model._meta.pk.name not in names:
+            self.keys.append((model._meta.pk, False, False))
+
+    def annotate(self, queryset):
+        return queryset.annotate(**self.annotations) if self.annotations else queryset
+
+    def order_by(self, reverse=False):
+        expressions = []
+        for field, descending, nulls_last in self.keys:
+            nulls = {}
+            if field.null:
+                nulls = {'nulls_last': True} if nulls_last != reverse else {'nulls_first': True}
+            expression = F(field.name)
+            expressions.append(expression.desc(**nulls) if descending != reverse else expression.asc(**nulls))
+        return expressions
+
+    def values(self, obj):
+        return [getattr(obj, field.attname) for field, *_ in self.keys]
+
+    def encode(self, obj):
+        values = [None if value is None else field.value_to_string(obj) for (field, *_), value in zip(self.keys, self.values(obj))]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (binascii.Error, ValueError, TypeError):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            return None
+        try:
+            return [None if value is None else field.to_python(value) for (field, *_), value in zip(self.keys, values)]
+        except (ValidationError, TypeError):
+            return None
+
+    def _comes_after(self, field, descending, nulls_after, value):
+        # nulls_after: ve směru průchodu následují NULL až za všemi hodnotami.
+        if value is None:
+            return Q(pk__in=[]) if nulls_after else Q(**{f"{field.name}__isnull": False})
+        condition = Q(**{f"{field.name}__{'lt' if descending else 'gt'}": value})
+        if nulls_after and field.null:
+            condition |= Q(**{f"{field.name}__isnull": True})
+        return condition
+
+    def _equals(self, field, value):
+        if value is None:
+            return Q(**{f"{field.name}__isnull": True})
+        return Q(**{field.name: value})
+
+    def _seek(self, keys, values, reverse):
+        condition = Q()
+        prefix = Q()
+        for (field, descending, nulls_last), value in zip(keys, values):
+            condition |= prefix & self._comes_after(field, descending != reverse, nulls_last != reverse, value)
+            prefix &= self._equals(field, value)
+        # Redundantní omezení prvního klíče umožní SQLite použít rozsahový průchod indexem.
+        # Platí jen tehdy, když za kurzorem nenásledují řádky s NULL.
+        field, descending, nulls_last = keys[0]
+        descending = descending != reverse
+        if values[0] is not None and (not field.null or nulls_last == reverse):
+            condition &= Q(**{f"{field.name}__{'lte' if descending else 'gte'}": values[0]})
+        return condition
+
+    def seek(self, values, reverse=False):
+        return self._seek(self.keys, values, reverse)
+
+    def queries(self, queryset, values=None, reverse=False):
+        # Dotazy stránky v pořadí, ve kterém se čtou, dokud stránku nenaplní.
+        # Výrazový první klíč (BEZ_DATACE) dělí řádky na úseky podle NULL v dalším klíči. Podmínka
+        # přes hranici úseku by skončila u OR, se kterým SQLite nepoužije rozsah indexu, proto se
+        # zbytek úseku kurzoru čte zvlášť (výraz je v něm konstantní, v ORDER BY se vynechá, a NULL
+        # dalšího klíče za kurzorem nenásleduje) a další úseky až po něm.
+        ordering = self.order_by(reverse)
+        if values is None:
+            return [queryset.order_by(*ordering)]
+        field, descending, nulls_last = self.keys[0]
+        if field.name not in self.annotations:
+            return [queryset.filter(self.seek(values, reverse)).order_by(*ordering)]
+        rest = [(key, key_descending, reverse) for key, key_descending, _ in self.keys[1:]]
+        return [
+            queryset.filter(Exact(F(field.name), Value(values[0])), self._seek(rest, values[1:], reverse))
+            .order_by(*ordering[1:]),
+            queryset.filter(self._comes_after(field, descending != reverse, nulls_last != reverse, values[0]))
+            .order_by(*ordering),
+        ]
+
+
+def _keyset_query(request, queryset, ordering, page_size):
+    keys = KeysetOrdering(queryset.model, ordering)
+    queryset = keys.annotate(queryset)
+    page_size = page_size or get_page_size(request)
+
+    before = keys.decode(request.GET['before']) if request.GET.get('before') else None
+    after = keys.decode(request.GET['after']) if request.GET.get('after') and before is None else None
+
+    if before is not None:
+        queries = keys.queries(queryset, before, reverse=True)
+    else:
+        queries = keys.queries(queryset, after)
+    return queries, (keys, page_size, before is not None, after is not None)
+
+
+def _keyset_page(request, rows, keys, page_size, backwards, forwards):
+    if backwards:
+        object_list = rows[:page_size][::-1]
+        return KeysetPage(request, object_list, keys, page_size, has_next=True, has_previous=len(rows) > page_size)
+    return KeysetPage(request, rows[:page_size], keys, page_size, has_next=len(rows) > page_size, has_previous=forwards)
+
+
+def paginate_keyset(request, queryset, ordering, page_size=None):
+    queries, state = _keyset_query(request, queryset, ordering, page_size)
+    page_size = state[1]
+    rows = []
+    for query in queries:
+        rows += query[:page_size + 1 - len(rows)]
+        if len(rows) > page_size:
+            break
+    return _keyset_page(request, rows, *state)
+
+
+async def apaginate_keyset(request, queryset, ordering, page_size=None):
+    queries, (keys, page_size, backwards, forwards) = _keyset_query(request, queryset, ordering, page_size)
+    rows = []
+    for query in queries:
+        rows += [obj async for obj in query[:page_size + 1 - len(rows)].aiterator(chunk_size=page_size + 1)]
+        if len(rows) > page_size:
+            break
+    return _keyset_page(request, rows, keys, page_size, backwards, forwards)
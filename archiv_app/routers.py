@@ -0,0 +1,101 @@
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'archiv_primary'
+DEFAULT_STICKY_SECONDS = 10
+
+
+class _Stav:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.zapsano = False
+        self.cteni = None
+
+
+_stav = contextvars.ContextVar('archiv_replica_stav', default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, 'ARCHIV_READ_REPLICA', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def sticky_seconds():
+    return getattr(settings, 'ARCHIV_REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+
+@contextmanager
+def request_scope(pinned):
+    token = _stav.set(_Stav(pinned))
+    try:
+        yield _stav.get()
+    finally:
+        _stav.reset(token)
+
+
+def is_pinned():
+    stav = _stav.get()
+    return stav is not None and (stav.pinned or stav.zapsano)
+
+
+def mark_written():
+    # Volají ho pohledy, které mění data archivu. Ostatní zápisy (počítadla, session) klienta
+    # k primární databázi nepřipoutají.
+    stav = _stav.get()
+    if stav is not None:
+        stav.zapsano = True
+
+
+@contextmanager
+def reads_from(alias):
+    token = _stav.set(_Stav()) if _stav.get() is None else None
+    stav = _stav.get()
+    predchozi, stav.cteni = stav.cteni, alias
+    try:
+        yield
+    finally:
+        stav.cteni = predchozi
+        if token is not None:
+            _stav.reset(token)
+
+
+def read_from_replica(view):
+    # Čtecí pohled jde na repliku, pokud klient právě nezapisoval (jinak by po přesměrování viděl stará data).
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            alias = replica_alias()
+            if alias is None or is_pinned():
+                return await view(request, *args, **kwargs)
+            with reads_from(alias):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = replica_alias()
+        if alias is None or is_pinned():
+            return view(request, *args, **kwargs)
+        with reads_from(alias):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        stav = _stav.get()
+        if stav is None or stav.cteni is None or stav.zapsano:
+            return None
+        return stav.cteni
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replika je kopií primární databáze, vazby mezi objekty z obou jsou v pořádku.
+        return True
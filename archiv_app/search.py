@@ -0,0 +1,114 @@
+import re
+import zlib
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+FTS_TABLE = 'archiv_app_fulltext'
+# Váhy sloupců pro bm25 v pořadí: popis, osoby, druh, typ_fotografie, obsah (text souboru).
+BM25_WEIGHTS = (1.0, 3.0, 2.0, 2.0, 0.5)
+DEFAULT_SEARCH_LIMIT = 100
+ID_BATCH_SIZE = 500
+
+_INDEX_SELECT_SQL = f'''
+    INSERT INTO {FTS_TABLE} (rowid, popis, osoby, druh, typ_fotografie, obsah)
+    SELECT o.id,
+           o.popis,
+           (SELECT group_concat(p.jmeno || ' ' || p.prijmeni, ' ')
+              FROM archiv_app_osoba p
+             WHERE p.id = o.osoba_id
+                OR p.id IN (SELECT m.osoba_id FROM archiv_app_archivovanyobjekt_osoby m
+                             WHERE m.archivovanyobjekt_id = o.id)),
+           (SELECT d.nazev || ' ' || d.popis
+              FROM archiv_app_dokument k
+              JOIN archiv_app_druh d ON d.id = k.druh_id
+             WHERE k.archivovanyobjekt_ptr_id = o.id),
+           (SELECT f.typ_fotografie
+              FROM archiv_app_fotografie f
+             WHERE f.archivovanyobjekt_ptr_id = o.id),
+           (SELECT archiv_text(t.data)
+              FROM archiv_app_obsahsouboru t
+             WHERE t.soubor_id = o.soubor_id)
+      FROM archiv_app_archivovanyobjekt o
+'''
+
+
+def _rozbalit_text(data):
+    return zlib.decompress(data).decode() if data else None
+
+
+@receiver(connection_created)
+def register_functions(sender, connection, **kwargs):
+    # Text souborů je v tabulce komprimovaný; indexovací SQL ho rozbalí funkcí archiv_text().
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('archiv_text', 1, _rozbalit_text, deterministic=True)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def _batches(ids):
+    ids = sorted({pk for pk in ids if pk is not None})
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        yield ids[start:start + ID_BATCH_SIZE]
+
+
+def index_objekty(objekt_ids):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for batch in _batches(objekt_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+            cursor.execute(f'{_INDEX_SELECT_SQL} WHERE o.id IN ({placeholders})', batch)
+
+
+def index_soubory(soubor_ids):
+    from .models import ArchivovanyObjekt
+    index_objekty(ArchivovanyObjekt.objects.non_polymorphic().filter(soubor__in=list(soubor_ids)).values_list('pk', flat=True))
+
+
+def remove_objekty(objekt_ids):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for batch in _batches(objekt_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+
+
+def rebuild_index():
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_INDEX_SELECT_SQL)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def build_match_query(query):
+    tokens = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_ids(query, limit=None):
+    match = build_match_query(query)
+    if not match:
+        return []
+    limit = limit or getattr(settings, 'ARCHIV_SEARCH_LIMIT', DEFAULT_SEARCH_LIMIT)
+    from .models import ArchivovanyObjekt
+    if not is_available():
+        return list(ArchivovanyObjekt.objects.non_polymorphic().filter(popis__icontains=query).values_list('pk', flat=True)[:limit])
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    with connections[router.db_for_read(ArchivovanyObjekt)].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
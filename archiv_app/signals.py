@@ -0,0 +1,177 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, search
+from .models import ArchivovanyObjekt, Dokument, Druh, Fotografie, Osoba, denormalized_counts_enabled
+
+
+def _recount_osoby(osoba_ids):
+    osoba_ids = {pk for pk in osoba_ids if pk is not None}
+    if osoba_ids:
+        Osoba.objects.filter(pk__in=osoba_ids).recount_archivalie()
+
+
+@receiver(pre_save)
+def archivovany_objekt_pre_save(sender, instance, raw, **kwargs):
+    if raw or not issubclass(sender, ArchivovanyObjekt) or not denormalized_counts_enabled():
+        return
+    instance._puvodni_osoba_id = None
+    if instance.pk:
+        instance._puvodni_osoba_id = ArchivovanyObjekt.objects.non_polymorphic().filter(
+            pk=instance.pk).values_list('osoba_id', flat=True).first()
+
+
+@receiver(post_save)
+def archivovany_objekt_post_save(sender, instance, raw, **kwargs):
+    if raw or not issubclass(sender, ArchivovanyObjekt) or not denormalized_counts_enabled():
+        return
+    puvodni_osoba_id = getattr(instance, '_puvodni_osoba_id', None)
+    if puvodni_osoba_id != instance.osoba_id:
+        _recount_osoby([puvodni_osoba_id, instance.osoba_id])
+
+
+# Při mazání potomka (Dokument, Fotografie) je vždy sebrán i rodičovský řádek,
+# proto stačí reagovat na odesílatele ArchivovanyObjekt.
+@receiver(pre_delete, sender=ArchivovanyObjekt)
+def archivovany_objekt_pre_delete(sender, instance, **kwargs):
+    if denormalized_counts_enabled():
+        instance._osoby_pred_smazanim = {instance.osoba_id, *instance.osoby.values_list('pk', flat=True)}
+
+
+@receiver(post_delete, sender=ArchivovanyObjekt)
+def archivovany_objekt_post_delete(sender, instance, **kwargs):
+    if denormalized_counts_enabled():
+        _recount_osoby(getattr(instance, '_osoby_pred_smazanim', ()))
+
+
+@receiver(m2m_changed, sender=ArchivovanyObjekt.osoby.through)
+def archivovany_objekt_osoby_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not denormalized_counts_enabled():
+        return
+    if action == 'pre_clear':
+        if reverse:
+            instance._osoby_pred_vymazanim = {instance.pk}
+        else:
+            instance._osoby_pred_vymazanim = set(instance.osoby.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _recount_osoby(getattr(instance, '_osoby_pred_vymazanim', ()))
+    elif action in ('post_add', 'post_remove'):
+        _recount_osoby([instance.pk] if reverse else pk_set or ())
+
+
+@receiver(post_save)
+def archivovany_objekt_reindex(sender, instance, raw, **kwargs):
+    if not raw and issubclass(sender, ArchivovanyObjekt):
+        search.index_objekty([instance.pk])
+
+
+@receiver(post_delete, sender=ArchivovanyObjekt)
+def archivovany_objekt_remove_from_index(sender, instance, **kwargs):
+    search.remove_objekty([instance.pk])
+
+
+def _objekty_zmeneny(objekt_ids):
+    objekt_ids = list(objekt_ids)
+    if objekt_ids:
+        search.index_objekty(objekt_ids)
+        ArchivovanyObjekt.objects.non_polymorphic().filter(pk__in=objekt_ids).update(upraveno=timezone.now())
+        counters.bump_version('verze_objekty')
+
+
+@receiver(m2m_changed, sender=ArchivovanyObjekt.osoby.through)
+def archivovany_objekt_osoby_reindex(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _objekty_zmeneny([instance.pk])
+    elif action == 'pre_clear':
+        instance._objekty_pred_vymazanim = list(instance.objekty.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _objekty_zmeneny(getattr(instance, '_objekty_pred_vymazanim', ()))
+    elif action in ('post_add', 'post_remove'):
+        _objekty_zmeneny(pk_set or ())
+
+
+def _objekty_osoby(osoba):
+    return ArchivovanyObjekt.objects.non_polymorphic().filter(
+        Q(osoba=osoba) | Q(osoby=osoba)).values_list('pk', flat=True).distinct()
+
+
+@receiver(post_save, sender=Osoba)
+def osoba_reindex(sender, instance, created, raw, **kwargs):
+    if not raw and not created:
+        search.index_objekty(_objekty_osoby(instance))
+
+
+@receiver(pre_delete, sender=Osoba)
+def osoba_pre_delete_index(sender, instance, **kwargs):
+    instance._objekty_pred_smazanim = list(_objekty_osoby(instance))
+
+
+@receiver(post_delete, sender=Osoba)
+def osoba_post_delete_index(sender, instance, **kwargs):
+    search.index_objekty(getattr(instance, '_objekty_pred_smazanim', ()))
+
+
+@receiver(post_save, sender=Druh)
+def druh_reindex(sender, instance, created, raw, **kwargs):
+    if not raw and not created:
+        search.index_objekty(Dokument.objects.non_polymorphic().filter(druh=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Druh)
+def druh_pre_delete_index(sender, instance, **kwargs):
+    instance._dokumenty_pred_smazanim = list(Dokument.objects.non_polymorphic().filter(druh=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Druh)
+def druh_post_delete_index(sender, instance, **kwargs):
+    search.index_objekty(getattr(instance, '_dokumenty_pred_smazanim', ()))
+
+
+COUNTER_NAMES = {model: nazev for nazev, model in counters.COUNTERS.items()}
+
+
+@receiver(post_save, sender=Dokument)
+@receiver(post_save, sender=Fotografie)
+@receiver(post_save, sender=Osoba)
+def pocitadlo_post_save(sender, instance, created, raw, **kwargs):
+    # loaddata ukládá s raw=True; počty po něm srovná counters.reconcile() (příkaz recount).
+    if created and not raw:
+        counters.increment(COUNTER_NAMES[sender])
+
+
+# Smazání rodičovského řádku sebere i potomka, signál tedy vždy přijde s odesílatelem Dokument/Fotografie.
+@receiver(post_delete, sender=Dokument)
+@receiver(post_delete, sender=Fotografie)
+@receiver(post_delete, sender=Osoba)
+def pocitadlo_post_delete(sender, instance, **kwargs):
+    counters.increment(COUNTER_NAMES[sender], -1)
+
+
+VERSION_NAMES = {
+    ArchivovanyObjekt: 'verze_objekty',
+    Osoba: 'verze_osoby',
+    Druh: 'verze_druhy',
+}
+
+
+def _version_name(sender):
+    if issubclass(sender, ArchivovanyObjekt):
+        return VERSION_NAMES[ArchivovanyObjekt]
+    return VERSION_NAMES.get(sender)
+
+
+@receiver(post_save)
+def verze_post_save(sender, instance, **kwargs):
+    nazev = _version_name(sender)
+    if nazev:
+        counters.bump_version(nazev)
+
+
+@receiver(post_delete, sender=ArchivovanyObjekt)
+@receiver(post_delete, sender=Osoba)
+@receiver(post_delete, sender=Druh)
+def verze_post_delete(sender, instance, **kwargs):
+    counters.bump_version(VERSION_NAMES[sender])
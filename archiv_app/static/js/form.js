@@ -67,4 +67,62 @@ document.addEventListener('DOMContentLoaded', function() {
 
         }
     }
-}); 
\ No newline at end of file
+
+    document.querySelectorAll('select[data-autocomplete="osoby"]').forEach(function(select) {
+        // Formulář vykreslí jen vybrané osoby, další se dohledávají podle začátku příjmení nebo jména.
+        const hledani = document.createElement('input');
+        hledani.type = 'search';
+        hledani.placeholder = 'Hledat osobu…';
+        hledani.autocomplete = 'off';
+        hledani.classList.add('form-control', 'mb-1');
+        const nabidka = document.createElement('div');
+        nabidka.classList.add('list-group', 'mb-2');
+        select.parentNode.insertBefore(hledani, select);
+        select.parentNode.insertBefore(nabidka, select);
+
+        Array.from(select.options).forEach(function(option) { option.selected = true; });
+        select.title = 'Kliknutím osobu z výběru odeberete.';
+        select.addEventListener('mousedown', function(event) {
+            if (event.target.tagName === 'OPTION') {
+                event.preventDefault();
+                event.target.remove();
+            }
+        });
+
+        let casovac = null;
+        let posledniDotaz = '';
+        hledani.addEventListener('input', function() {
+            clearTimeout(casovac);
+            casovac = setTimeout(function() {
+                const dotaz = hledani.value.trim();
+                posledniDotaz = dotaz;
+                if (!dotaz) {
+                    nabidka.replaceChildren();
+                    return;
+                }
+                fetch(select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(dotaz), {headers: {'Accept': 'application/json'}})
+                    .then(function(response) { return response.json(); })
+                    .then(function(data) {
+                        if (dotaz !== posledniDotaz) {
+                            return;
+                        }
+                        nabidka.replaceChildren();
+                        data.results.forEach(function(osoba) {
+                            if (select.querySelector('option[value="' + osoba.id + '"]')) {
+                                return;
+                            }
+                            const polozka = document.createElement('button');
+                            polozka.type = 'button';
+                            polozka.classList.add('list-group-item', 'list-group-item-action');
+                            polozka.textContent = osoba.text;
+                            polozka.addEventListener('click', function() {
+                                select.add(new Option(osoba.text, osoba.id, true, true));
+                                polozka.remove();
+                            });
+                            nabidka.appendChild(polozka);
+                        });
+                    });
+            }, 200);
+        });
+    });
+});
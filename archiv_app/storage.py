@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'archivovane_soubory'
+TMP_DIR = '.tmp'
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+UNLINK_BATCH_SIZE = 500
+
+_unlink_executor = None
+
+
+def sharded_name(directory, digest, suffix=''):
+    shards = [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+    return str(PurePosixPath(directory, *shards, f"{digest}{suffix}"))
+
+
+def blob_name(digest, original_name):
+    return sharded_name(BLOB_DIR, digest, PurePosixPath(original_name).suffix.lower())
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _stream_to_temp(uploaded_file):
+    tmp_dir = Path(default_storage.path(BLOB_DIR)) / TMP_DIR
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+    return tmp.name, hasher.hexdigest(), size
+
+
+def _acquire_existing(digest, tmp_path):
+    from .models import Soubor
+    if not Soubor.objects.filter(sha256=digest).update(pocet_odkazu=F('pocet_odkazu') + 1):
+        return None
+    soubor = Soubor.objects.get(sha256=digest)
+    target = Path(default_storage.path(soubor.file.name))
+    if not target.exists():
+        # Odložené mazání mohlo soubor odstranit těsně předtím, než se na něj začalo znovu odkazovat;
+        # obsah je stejný, stačí ho vrátit na místo.
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+    return soubor
+
+
+def prepare_upload(uploaded_file):
+    # Zkopíruje nahrávaný soubor do dočasného souboru a spočítá SHA-256. Volá se před transakcí:
+    # pod BEGIN IMMEDIATE by jinak zámek zápisu čekal na kopírování celého (i velkého) souboru.
+    # Vrací (dočasná cesta, digest, velikost, původní jméno) pro store_prepared().
+    tmp_path, digest, size = _stream_to_temp(uploaded_file)
+    return tmp_path, digest, size, uploaded_file.name
+
+
+# Vrací (Soubor, vytvořen); odkaz volajícího je již započten v pocet_odkazu. Dočasný soubor vždy odstraní.
+# Pokud se transakce volajícího vrátí, zůstane zapsaný soubor bez řádku Soubor; uklidí ho příkaz gc_soubory.
+def store_prepared(prepared):
+    from .models import Soubor
+    tmp_path, digest, size, original_name = prepared
+    try:
+        with transaction.atomic():
+            soubor = _acquire_existing(digest, tmp_path)
+            if soubor is not None:
+                return soubor, False
+            name = blob_name(digest, original_name)
+            target = Path(default_storage.path(name))
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, target)
+            try:
+                with transaction.atomic():
+                    return Soubor.objects.create(file=name, sha256=digest, velikost=size, pocet_odkazu=1), True
+            except IntegrityError:
+                # Stejný obsah mezitím uložil souběžný požadavek.
+                return _acquire_existing(digest, tmp_path), False
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def discard_prepared(prepared):
+    # Odstraní dočasné soubory připravené nahrávky, které se neuložily (store_prepared je maže sám).
+    for tmp_path, *_ in prepared:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def store_upload(uploaded_file):
+    return store_prepared(prepare_upload(uploaded_file))
+
+
+def referenced_names(names):
+    # Jména, na která dosud odkazuje některý řádek Soubor (stejný obsah mohl být mezitím nahrán znovu).
+    from .models import Soubor
+    names = list(names)
+    referenced = set()
+    for i in range(0, len(names), UNLINK_BATCH_SIZE):
+        batch = names[i:i + UNLINK_BATCH_SIZE]
+        for row in Soubor.objects.filter(
+            Q(file__in=batch) | Q(nahled__in=batch) | Q(nahled_webp__in=batch)
+        ).values_list('file', 'nahled', 'nahled_webp'):
+            referenced.update(row)
+    return referenced
+
+
+def unlink_names(names):
+    # Smaže soubory v úložišti; co se smazat nepodaří, zůstane pro příkaz gc_soubory. Vrací počet smazaných.
+    # Kontrola odkazů i mazání dávky běží v jedné zápisové transakci: pod BEGIN IMMEDIATE drží zámek,
+    # který potřebuje i store_prepared() pro os.replace a INSERT, souběžné nahrání stejného obsahu
+    # proto proběhne celé před kontrolou, nebo až po smazání.
+    names = sorted(set(names))
+    smazano = 0
+    for i in range(0, len(names), UNLINK_BATCH_SIZE):
+        batch = names[i:i + UNLINK_BATCH_SIZE]
+        with transaction.atomic():
+            referenced = referenced_names(batch)
+            for name in batch:
+                if name in referenced:
+                    continue
+                try:
+                    os.unlink(default_storage.path(name))
+                    smazano += 1
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    logger.warning("Soubor %s se nepodařilo smazat.", name, exc_info=True)
+    return smazano
+
+
+def _unlink_in_background(names):
+    try:
+        unlink_names(names)
+    except Exception:
+        logger.exception("Odložené mazání souborů selhalo.")
+    finally:
+        connection.close()
+
+
+def _get_unlink_executor():
+    global _unlink_executor
+    if _unlink_executor is None:
+        _unlink_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archiv-unlink')
+    return _unlink_executor
+
+
+def schedule_unlink(names):
+    # Fyzické mazání proběhne až po potvrzení transakce a mimo vlákno požadavku.
+    from . import jobs
+    names = [name for name in names if name]
+    if not names:
+        return
+    if jobs.is_enabled():
+        jobs.enqueue('smazat_soubory', names=names)
+    elif getattr(settings, 'ARCHIV_UNLINK_ASYNC', True):
+        transaction.on_commit(lambda: _get_unlink_executor().submit(_unlink_in_background, names))
+    else:
+        transaction.on_commit(lambda: unlink_names(names))
+
+
+def release_soubory(soubor_ids):
+    # Hromadná obdoba Soubor.release_reference(): soubor_ids obsahuje jedno ID za každý uvolněný odkaz.
+    # Musí běžet v transakci po smazání odkazujících objektů; vrací počet smazaných řádků Soubor.
+    from .models import ArchivovanyObjekt, Soubor
+    podle_poctu = {}
+    for soubor_id, pocet in Counter(pk for pk in soubor_ids if pk is not None).items():
+        podle_poctu.setdefault(pocet, []).append(soubor_id)
+    for pocet, ids in podle_poctu.items():
+        Soubor.objects.filter(pk__in=ids).update(pocet_odkazu=Greatest(F('pocet_odkazu') - pocet, 0))
+
+    ids = [soubor_id for ids in podle_poctu.values() for soubor_id in ids]
+    nepouzite = Soubor.objects.filter(pk__in=ids, pocet_odkazu=0).exclude(
+        pk__in=ArchivovanyObjekt.objects.non_polymorphic().filter(soubor__in=ids).values('soubor'))
+    rows = list(nepouzite.values_list('pk', 'file', 'nahled', 'nahled_webp'))
+    Soubor.objects.filter(pk__in=[pk for pk, *_ in rows]).delete()
+    schedule_unlink([name for _, *names in rows for name in names])
+    return len(rows)
@@ -0,0 +1,122 @@
+import datetime
+import hashlib
+import random
+from collections import Counter
+from pathlib import Path
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import default_storage
+
+from . import counters, search, storage
+from .importer import insert_children
+from .models import STOLETÍ_CHOICES, ArchivovanyObjekt, Dokument, Druh, Fotografie, Osoba, Soubor
+
+JMENA = ['Jan', 'Marie', 'Josef', 'Anna', 'Karel', 'Ludmila', 'František', 'Božena', 'Václav', 'Věra']
+PRIJMENI = ['Novák', 'Svoboda', 'Dvořák', 'Černý', 'Procházka', 'Kučera', 'Veselý', 'Horák', 'Němec', 'Pokorný']
+DRUHY = ['Dopis', 'Matrika', 'Kronika', 'Smlouva', 'Pohlednice', 'Úřední list']
+TYPY_FOTOGRAFIE = ['portrét', 'krajina', 'skupinová', 'reportážní']
+SLOVA = ['dopis', 'z', 'fronty', 'svatba', 'křest', 'pole', 'škola', 'rodina', 'statek', 'kostel', 'pouť', 'výlet']
+BATCH_SIZE = 2000
+
+
+def _popis(rng):
+    return ' '.join(rng.choices(SLOVA, k=rng.randint(2, 8))).capitalize()
+
+
+def _datace(rng):
+    volba = rng.random()
+    if volba < 0.4:
+        return {'rok_vzniku': rng.randint(1850, 2020)}
+    if volba < 0.7:
+        return {'stoleti_vzniku': rng.choice(STOLETÍ_CHOICES)[0]}
+    return {'datum_vzniku_presne': datetime.date(1850, 1, 1) + datetime.timedelta(days=rng.randint(0, 60000))}
+
+
+def _soubory(rng, pocet):
+    # Malé textové soubory rovnou v úložišti podle obsahu; obsah je jedinečný, deduplikace není potřeba.
+    soubory = []
+    for i in range(pocet):
+        obsah = f"{i} {_popis(rng)}\n".encode()
+        digest = hashlib.sha256(obsah).hexdigest()
+        name = storage.blob_name(digest, f"{i}.txt")
+        path = Path(default_storage.path(name))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(obsah)
+        soubory.append(Soubor(file=name, sha256=digest, velikost=len(obsah), pocet_odkazu=0))
+    return Soubor.objects.bulk_create(soubory, batch_size=BATCH_SIZE)
+
+
+def seed(objekty=10000, osoby=None, podil_fotografii=0.4, seed_value=0, soubory=0):
+    # Hromadně vloží syntetická data (soubory > 0: každý objekt dostane jeden z tolika souborů v MEDIA_ROOT);
+    # vrací počty vytvořených řádků.
+    rng = random.Random(seed_value)
+    osoby = osoby if osoby is not None else max(objekty // 10, 1)
+    dnes = datetime.date.today()
+
+    nove_osoby = [Osoba(jmeno=rng.choice(JMENA), prijmeni=f"{rng.choice(PRIJMENI)}{i}") for i in range(osoby)]
+    for osoba in nove_osoby:
+        osoba.nastavit_klice()
+    Osoba.objects.bulk_create(nove_osoby, batch_size=BATCH_SIZE)
+    druhy = Druh.objects.bulk_create([Druh(nazev=nazev) for nazev in DRUHY])
+    osoba_ids = [osoba.pk for osoba in nove_osoby]
+    ctypes = ContentType.objects.get_for_models(Dokument, Fotografie, for_concrete_models=False)
+    nove_soubory = _soubory(rng, soubory)
+    odkazy = Counter()
+
+    pocty = {'dokumenty': 0, 'fotografie': 0}
+    for start in range(0, objekty, BATCH_SIZE):
+        rodice, typy = [], []
+        for _ in range(min(BATCH_SIZE, objekty - start)):
+            model = Fotografie if rng.random() < podil_fotografii else Dokument
+            typy.append(model)
+            rodice.append(ArchivovanyObjekt(
+                polymorphic_ctype_id=ctypes[model].pk,
+                typ=model.__name__.lower(),
+                osoba_id=rng.choice(osoba_ids) if osoba_ids else None,
+                soubor=rng.choice(nove_soubory) if nove_soubory else None,
+                datum_archivace=dnes - datetime.timedelta(days=rng.randint(0, 3650)),
+                popis=_popis(rng),
+                **_datace(rng),
+            ))
+        for rodic in rodice:
+            rodic.nastavit_datace()
+        odkazy.update(rodic.soubor_id for rodic in rodice if rodic.soubor_id)
+        ArchivovanyObjekt.objects.bulk_create(rodice, batch_size=BATCH_SIZE)
+
+        dokumenty, fotografie, vazby = [], [], []
+        for rodic, model in zip(rodice, typy):
+            if model is Dokument:
+                dokumenty.append(Dokument(
+                    archivovanyobjekt_ptr_id=rodic.pk,
+                    druh=rng.choice(druhy),
+                    jazyk=rng.choice(Dokument.JAZYK_CHOICES)[0],
+                ))
+            else:
+                fotografie.append(Fotografie(
+                    archivovanyobjekt_ptr_id=rodic.pk,
+                    typ_fotografie=rng.choice(TYPY_FOTOGRAFIE),
+                    vyska=rng.randint(5, 40),
+                    sirka=rng.randint(5, 40),
+                ))
+            if osoba_ids:
+                vazby.extend(
+                    ArchivovanyObjekt.osoby.through(archivovanyobjekt_id=rodic.pk, osoba_id=osoba_id)
+                    for osoba_id in {rodic.osoba_id, *rng.sample(osoba_ids, min(2, len(osoba_ids)))}
+                )
+        insert_children(Dokument, dokumenty)
+        insert_children(Fotografie, fotografie)
+        ArchivovanyObjekt.osoby.through.objects.bulk_create(vazby, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        search.index_objekty(rodic.pk for rodic in rodice)
+        pocty['dokumenty'] += len(dokumenty)
+        pocty['fotografie'] += len(fotografie)
+
+    for soubor in nove_soubory:
+        soubor.pocet_odkazu = odkazy[soubor.pk]
+    Soubor.objects.bulk_update(nove_soubory, ['pocet_odkazu'], batch_size=BATCH_SIZE)
+
+    counters.reconcile()
+    for nazev in counters.VERSIONS:
+        counters.bump_version(nazev)
+    pocty['osoby'] = osoby
+    pocty['soubory'] = soubory
+    return pocty
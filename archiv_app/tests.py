@@ -1 +1,1523 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from importlib import import_module
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import extraction, filters, jobs, search, storage, thumbnails, views
+from .management.commands import benchmark_queries, benchmark_views
+from .middleware import ServerTimingMiddleware, normalize_sql
+from .pagination import KeysetOrdering
+from .models import ArchivovanyObjekt, Dokument, Druh, Fotografie, ObsahSouboru, Osoba, Pocitadlo, Soubor, Uloha
+
+# Název modulu migrace začíná číslicí, běžný import nejde.
+sqlite_wal = import_module('archiv_app.migrations.0016_sqlite_wal')
+
+
+class ListQueryBudgetTests(TestCase):
+    def _create_dokument(self, druh, osoby):
+        dokument = Dokument.objects.create(druh=druh, osoba=osoby[0], popis="Dopis z fronty", rok_vzniku=1916)
+        dokument.osoby.set(osoby)
+        return dokument
+
+    def _create_fotografie(self, osoby):
+        foto = Fotografie.objects.create(osoba=osoby[0], typ_fotografie="portrét", vyska=10, sirka=15, stoleti_vzniku='19')
+        foto.osoby.set(osoby)
+        return foto
+
+    def _count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def _assert_constant_query_count(self, url_name, create_row):
+        create_row()
+        baseline = self._count_queries(url_name)
+        for _ in range(10):
+            create_row()
+        self.assertEqual(self._count_queries(url_name), baseline)
+
+    def test_dokumenty_list_query_count_does_not_grow_with_rows(self):
+        druh = Druh.objects.create(nazev="Dopis")
+        osoby = [Osoba.objects.create(jmeno="Jan", prijmeni="Novák"), Osoba.objects.create(jmeno="Marie", prijmeni="Nováková")]
+        self._assert_constant_query_count('archiv_app:dokumenty_list', lambda: self._create_dokument(druh, osoby))
+
+    def test_fotografie_list_query_count_does_not_grow_with_rows(self):
+        osoby = [Osoba.objects.create(jmeno="Jan", prijmeni="Novák"), Osoba.objects.create(jmeno="Marie", prijmeni="Nováková")]
+        self._assert_constant_query_count('archiv_app:fotografie_list', lambda: self._create_fotografie(osoby))
+
+
+@override_settings(ARCHIV_PAGE_SIZE=3, ARCHIV_PAGE_SIZE_CHOICES=(3, 5))
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        jazyky = ['de', 'cs', 'en']
+        for i in range(8):
+            Dokument.objects.create(jazyk=jazyky[i % 3], datum_archivace=datetime.date(2024, 1, 1 + i // 3), rok_vzniku=1900 + i)
+        cls.expected = list(Dokument.objects.order_by('-datum_archivace', 'jazyk', 'pk').values_list('pk', flat=True))
+
+    def _get(self, query=''):
+        response = self.client.get(reverse('archiv_app:dokumenty_list') + query)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page']
+
+    def test_walks_forward_and_back_over_all_rows(self):
+        pages = [self._get()]
+        while pages[-1].next_url:
+            pages.append(self._get(pages[-1].next_url))
+        self.assertEqual([obj.pk for page in pages for obj in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertFalse(pages[0].has_previous)
+
+        back = self._get(pages[-1].previous_url)
+        self.assertEqual([obj.pk for obj in back], [obj.pk for obj in pages[1]])
+        back = self._get(back.previous_url)
+        self.assertEqual([obj.pk for obj in back], [obj.pk for obj in pages[0]])
+        self.assertIsNone(back.previous_url)
+
+    def test_page_size_is_limited_to_configured_choices(self):
+        self.assertEqual(len(self._get('?page_size=5')), 5)
+        self.assertEqual(len(self._get('?page_size=1000')), 3)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.assertEqual([obj.pk for obj in self._get('?after=nonsense')], self.expected[:3])
+
+
+class ArchivalieCountTests(TestCase):
+    def setUp(self):
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        self.marie = Osoba.objects.create(jmeno="Marie", prijmeni="Nováková")
+
+    def _create_dokument(self, osoba, osoby):
+        dokument = Dokument.objects.create(osoba=osoba)
+        dokument.osoby.set(osoby)
+        return dokument
+
+    def _counts(self):
+        return {osoba.pk: osoba.get_archiválie_count() for osoba in Osoba.objects.with_archivalie_count()}
+
+    def test_annotation_counts_fk_and_m2m_links_once(self):
+        self._create_dokument(self.jan, [self.jan, self.marie])
+        self._create_dokument(None, [self.marie])
+        self._create_dokument(self.jan, [])
+        self.assertEqual(self._counts(), {self.jan.pk: 2, self.marie.pk: 2})
+
+    def test_osoby_list_count_is_a_single_query(self):
+        for _ in range(3):
+            self._create_dokument(self.jan, [self.marie])
+        # Jeden dotaz na ETag seznamu, jeden na řádky i s počty archiválií.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('archiv_app:osoby_list'))
+
+    @override_settings(ARCHIV_DENORMALIZED_COUNTS=True)
+    def test_denormalized_counter_follows_changes(self):
+        dokument = self._create_dokument(self.jan, [self.jan, self.marie])
+        self.assertEqual(self._counts(), {self.jan.pk: 1, self.marie.pk: 1})
+
+        dokument.osoba = self.marie
+        dokument.save()
+        dokument.osoby.remove(self.jan)
+        self.assertEqual(self._counts(), {self.jan.pk: 0, self.marie.pk: 1})
+
+        dokument.osoby.clear()
+        self.assertEqual(self._counts(), {self.jan.pk: 0, self.marie.pk: 1})
+
+        dokument.delete()
+        self.assertEqual(self._counts(), {self.jan.pk: 0, self.marie.pk: 0})
+
+    @override_settings(ARCHIV_DENORMALIZED_COUNTS=True)
+    def test_recount_command_repairs_drift(self):
+        self._create_dokument(self.jan, [self.marie])
+        Osoba.objects.update(pocet_archivalii=7)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn("Odchylek opraveno: 2", out.getvalue())
+        self.assertEqual(self._counts(), {self.jan.pk: 1, self.marie.pk: 1})
+
+
+class FulltextSearchTests(TestCase):
+    def setUp(self):
+        self.osoba = Osoba.objects.create(jmeno="Řehoř", prijmeni="Šťastný")
+        self.druh = Druh.objects.create(nazev="Úmrtní list")
+        self.dokument = Dokument.objects.create(druh=self.druh, popis="Zápis z kroniky obce Žďár", osoba=self.osoba)
+        self.foto = Fotografie.objects.create(typ_fotografie="Skupinová", vyska=9, sirka=13, popis="Svatba")
+        self.foto.osoby.set([self.osoba])
+
+    def _search(self, dotaz):
+        response = self.client.get(reverse('archiv_app:hledat'), {'q': dotaz})
+        self.assertEqual(response.status_code, 200)
+        return [objekt.pk for objekt in response.context['vysledky']]
+
+    def test_search_ignores_diacritics_and_case(self):
+        self.assertEqual(self._search("zdar"), [self.dokument.pk])
+        self.assertEqual(self._search("UMRTNI"), [self.dokument.pk])
+        self.assertEqual(self._search("skupin"), [self.foto.pk])
+        self.assertCountEqual(self._search("stastny rehor"), [self.dokument.pk, self.foto.pk])
+
+    def test_index_follows_related_changes(self):
+        self.osoba.prijmeni = "Novák"
+        self.osoba.save()
+        self.assertCountEqual(self._search("novak"), [self.dokument.pk, self.foto.pk])
+        self.foto.osoby.clear()
+        self.assertEqual(self._search("novak"), [self.dokument.pk])
+        self.druh.nazev = "Matrika"
+        self.druh.save()
+        self.assertEqual(self._search("matrika"), [self.dokument.pk])
+        self.dokument.delete()
+        self.assertEqual(self._search("matrika"), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM archiv_app_fulltext")
+        self.assertEqual(self._search("svatba"), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search("svatba"), [self.foto.pk])
+
+
+def _image_upload(name="foto.png", size=(1200, 800)):
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new('RGB', size, (120, 80, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+
+@unittest.skipUnless(thumbnails.is_available(), "Pillow není nainstalován")
+@override_settings(ARCHIV_THUMBNAILS_ASYNC=False, ARCHIV_THUMBNAIL_SIZE=(100, 100))
+class ThumbnailTests(TemporaryMediaMixin, TestCase):
+    def test_upload_generates_jpeg_and_webp_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('archiv_app:add_fotografie'), {
+                'typ_datace': 'rok', 'rok_vzniku': 1925, 'vyska': 9, 'sirka': 13,
+                'uploaded_file': _image_upload(),
+            })
+        self.assertEqual(response.status_code, 302)
+        soubor = Fotografie.objects.get().soubor
+        self.assertTrue(soubor.nahled.name.endswith('_100x100.jpg'))
+        self.assertTrue(soubor.nahled_webp.name.endswith('_100x100.webp'))
+        from PIL import Image
+        with Image.open(soubor.nahled.path) as image:
+            self.assertLessEqual(max(image.size), 100)
+
+        response = self.client.get(reverse('archiv_app:fotografie_list'))
+        self.assertContains(response, soubor.nahled_webp.url)
+
+    def test_backfill_command_fills_missing_thumbnails(self):
+        soubor = Soubor.objects.create(file=_image_upload("stara.png"))
+        Fotografie.objects.create(soubor=soubor, vyska=9, sirka=13)
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        soubor.refresh_from_db()
+        self.assertTrue(soubor.nahled)
+        self.assertIn("Hotovo: 1 náhledů, chyb: 0", out.getvalue())
+
+
+def _zip_upload(name, member, xml):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(member, xml)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def _pdf_upload(name, text):
+    # Jednostránkové PDF s textem ve standardním písmu Helvetica; tabulka xref s dopočítanými posuny.
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objekty = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    data = b"%PDF-1.4\n"
+    posuny = []
+    for cislo, objekt in enumerate(objekty, 1):
+        posuny.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (cislo, objekt)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objekty) + 1)
+    data += b"".join(b"%010d 00000 n \n" % posun for posun in posuny)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objekty) + 1, xref)
+    return SimpleUploadedFile(name, data)
+
+
+@override_settings(ARCHIV_EXTRACT_ASYNC=False)
+class TextExtractionTests(TemporaryMediaMixin, TestCase):
+    def _add_dokument(self, uploaded_file, popis=""):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('archiv_app:add_dokument'), {
+                'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs', 'popis': popis, 'uploaded_file': uploaded_file,
+            })
+        self.assertEqual(response.status_code, 302)
+        return Dokument.objects.latest('pk')
+
+    def _search(self, dotaz):
+        return [objekt.pk for objekt in self.client.get(reverse('archiv_app:hledat'), {'q': dotaz}).context['vysledky']]
+
+    def test_uploaded_documents_are_searchable_by_content(self):
+        txt = self._add_dokument(SimpleUploadedFile("zapis.txt", "Kronika obce Třebíč\n".encode('cp1250')))
+        docx = self._add_dokument(_zip_upload(
+            "dopis.docx", 'word/document.xml',
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:t>Dopis z </w:t></w:r><w:r><w:t>Olomouce</w:t></w:r></w:p></w:body></w:document>',
+        ))
+        odt = self._add_dokument(_zip_upload(
+            "smlouva.odt", 'content.xml',
+            '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+            'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:text>'
+            '<text:h>Kupní smlouva</text:h><text:p>Usedlost čp. 12</text:p></office:text></office:body></office:document-content>',
+        ))
+
+        self.assertEqual(self._search("trebic"), [txt.pk])
+        self.assertEqual(self._search("dopis olomouce"), [docx.pk])
+        self.assertEqual(self._search("usedlost"), [odt.pk])
+        obsah = ObsahSouboru.objects.get(soubor=odt.soubor)
+        self.assertEqual(obsah.text, "Kupní smlouva Usedlost čp. 12")
+        self.assertEqual(obsah.sha256, odt.soubor.sha256)
+        self.assertNotEqual(obsah.data, obsah.text.encode())
+
+        # Popis váží víc než text souboru.
+        popis = self._add_dokument(SimpleUploadedFile("jiny.txt", b"nic"), popis="Olomouc")
+        self.assertEqual(self._search("olomouc*"), [popis.pk, docx.pk])
+
+    @unittest.skipUnless(extraction.PdfReader is not None, "pypdf není nainstalován")
+    def test_pdf_text_is_extracted(self):
+        dokument = self._add_dokument(_pdf_upload("matrika.pdf", "Matrika farnosti Jihlava"))
+        self.assertEqual(ObsahSouboru.objects.get(soubor=dokument.soubor).text, "Matrika farnosti Jihlava")
+        self.assertEqual(self._search("jihlava"), [dokument.pk])
+
+    def test_corrupt_file_is_recorded_with_error(self):
+        with self.assertLogs('archiv_app.extraction', 'WARNING'):
+            dokument = self._add_dokument(SimpleUploadedFile("rozbity.docx", b"neni to zip"))
+        obsah = ObsahSouboru.objects.get(soubor=dokument.soubor)
+        self.assertEqual(obsah.text, "")
+        self.assertIn("BadZipFile", obsah.chyba)
+
+    def test_backfill_command_skips_unchanged_files(self):
+        soubor = Soubor.objects.create(file=SimpleUploadedFile("stary.txt", b"Zapomenuty protokol"))
+        dokument = Dokument.objects.create(soubor=soubor)
+        Soubor.objects.create(file=SimpleUploadedFile("foto.png", b"png"))
+        self.assertEqual(self._search("protokol"), [])
+
+        out = StringIO()
+        call_command('extract_text', workers=1, stdout=out)
+        self.assertIn("Hotovo: 1 souborů, beze změny: 0, chyb: 0", out.getvalue())
+        self.assertEqual(self._search("protokol"), [dokument.pk])
+        self.assertEqual(ObsahSouboru.objects.get().sha256, storage.hash_file(soubor.file.path))
+
+        out = StringIO()
+        call_command('extract_text', workers=1, stdout=out)
+        self.assertIn("Hotovo: 0 souborů, beze změny: 1, chyb: 0", out.getvalue())
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    def _add_dokument(self, content, name="sken.pdf"):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('archiv_app:add_dokument'), {
+                'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs',
+                'uploaded_file': SimpleUploadedFile(name, content),
+            })
+        self.assertEqual(response.status_code, 302)
+        return Dokument.objects.order_by('-pk').first()
+
+    def _delete(self, dokument):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('archiv_app:delete_dokument', args=[dokument.pk]))
+
+    def test_identical_uploads_share_one_blob(self):
+        prvni = self._add_dokument(b"stejny obsah", "a.pdf")
+        druhy = self._add_dokument(b"stejny obsah", "b.PDF")
+        self.assertEqual(prvni.soubor_id, druhy.soubor_id)
+        soubor = Soubor.objects.get()
+        self.assertEqual(soubor.pocet_odkazu, 2)
+        self.assertRegex(soubor.file.name, r'^archivovane_soubory/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        path = soubor.file.path
+
+        self._delete(prvni)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Soubor.objects.get().pocet_odkazu, 1)
+
+        self._delete(druhy)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Soubor.objects.exists())
+        self.assertFalse(Dokument.objects.exists())
+
+    def test_replacing_file_releases_previous_blob(self):
+        dokument = self._add_dokument(b"puvodni")
+        puvodni_path = dokument.soubor.file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('archiv_app:edit_dokument', args=[dokument.pk]), {
+                'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs',
+                'uploaded_file': SimpleUploadedFile("novy.pdf", b"novy obsah"),
+            })
+        dokument = Dokument.objects.get(pk=dokument.pk)
+        self.assertFalse(os.path.exists(puvodni_path))
+        self.assertEqual(Soubor.objects.get().pk, dokument.soubor_id)
+
+    def test_reupload_restores_blob_removed_by_delayed_unlink(self):
+        dokument = self._add_dokument(b"ztraceny obsah")
+        os.unlink(dokument.soubor.file.path)
+        druhy = self._add_dokument(b"ztraceny obsah")
+        self.assertEqual(druhy.soubor_id, dokument.soubor_id)
+        with open(druhy.soubor.file.path, 'rb') as handle:
+            self.assertEqual(handle.read(), b"ztraceny obsah")
+
+    def test_reuploading_same_content_keeps_blob(self):
+        dokument = self._add_dokument(b"puvodni")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('archiv_app:edit_dokument', args=[dokument.pk]), {
+                'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs',
+                'uploaded_file': SimpleUploadedFile("znovu.pdf", b"puvodni"),
+            })
+        soubor = Soubor.objects.get()
+        self.assertEqual(soubor.pocet_odkazu, 1)
+        self.assertTrue(os.path.exists(soubor.file.path))
+
+
+@override_settings(ARCHIV_UNLINK_ASYNC=False)
+class SouborCleanupTests(TemporaryMediaMixin, TestCase):
+    def _add_dokument(self, content, name="sken.pdf"):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('archiv_app:add_dokument'), {
+                'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs',
+                'uploaded_file': SimpleUploadedFile(name, content),
+            })
+        return Dokument.objects.order_by('-pk').first()
+
+    def test_bulk_delete_releases_files_after_commit(self):
+        prvni = self._add_dokument(b"sdileny obsah")
+        druhy = self._add_dokument(b"sdileny obsah")
+        zbyvajici = self._add_dokument(b"sdileny obsah")
+        vlastni = self._add_dokument(b"vlastni obsah")
+        sdileny_path, vlastni_path = zbyvajici.soubor.file.path, vlastni.soubor.file.path
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('archiv_app:bulk_delete_dokumenty'), {'ids': [prvni.pk, druhy.pk, vlastni.pk, 'x']})
+        self.assertRedirects(response, reverse('archiv_app:dokumenty_list'))
+        self.assertEqual(list(Dokument.objects.all()), [zbyvajici])
+        self.assertEqual(Soubor.objects.get().pocet_odkazu, 1)
+        self.assertTrue(os.path.exists(vlastni_path))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(vlastni_path))
+        self.assertTrue(os.path.exists(sdileny_path))
+
+    def test_gc_reports_and_removes_orphans(self):
+        dokument = self._add_dokument(b"pouzity")
+        bez_objektu = Soubor.objects.create(file=SimpleUploadedFile("bez_objektu.pdf", b"x"))
+        chybejici = Soubor.objects.create(file="archivovane_soubory/chybi.pdf")
+        Dokument.objects.create(soubor=chybejici, rok_vzniku=1920, jazyk='cs')
+        sirotek = os.path.join(self.media_root, 'archivovane_soubory', 'sirotek.pdf')
+        with open(sirotek, 'wb') as handle:
+            handle.write(b"sirotek")
+
+        out = StringIO()
+        call_command('gc_soubory', dry_run=True, min_stari=0, stdout=out)
+        self.assertIn("Osiřelý soubor: archivovane_soubory/sirotek.pdf", out.getvalue())
+        self.assertIn(f"Soubor #{chybejici.pk}: na disku chybí archivovane_soubory/chybi.pdf", out.getvalue())
+        self.assertIn("Osiřelých souborů nalezeno: 1, nepoužitých řádků Soubor nalezeno: 1", out.getvalue())
+        self.assertTrue(os.path.exists(sirotek))
+
+        call_command('gc_soubory', min_stari=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(sirotek))
+        self.assertFalse(os.path.exists(bez_objektu.file.path))
+        self.assertEqual(set(Soubor.objects.all()), {dokument.soubor, chybejici})
+        self.assertTrue(os.path.exists(dokument.soubor.file.path))
+
+    def test_gc_skips_recent_files(self):
+        os.makedirs(os.path.join(self.media_root, 'archivovane_soubory'))
+        sirotek = os.path.join(self.media_root, 'archivovane_soubory', 'prave_nahravany.pdf')
+        with open(sirotek, 'wb') as handle:
+            handle.write(b"x")
+        call_command('gc_soubory', stdout=StringIO())
+        self.assertTrue(os.path.exists(sirotek))
+
+
+@override_settings(ARCHIV_JOB_QUEUE=True, ARCHIV_JOB_MAX_ATTEMPTS=2, ARCHIV_JOB_BACKOFF=60)
+class JobQueueTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.volani = []
+        jobs.register('test_uloha')(lambda **parametry: self.volani.append(parametry))
+        self.addCleanup(jobs.ULOHY.pop, 'test_uloha')
+
+        def selhani():
+            raise RuntimeError("nepovedlo se")
+        jobs.register('test_selhani')(selhani)
+        self.addCleanup(jobs.ULOHY.pop, 'test_selhani')
+
+    def test_claim_is_compare_and_set(self):
+        uloha = jobs.enqueue('test_uloha', cislo=1)
+        self.assertEqual(jobs.claim(5, 'prvni'), [uloha.pk])
+        self.assertEqual(jobs.claim(5, 'druhy'), [])
+        self.assertTrue(jobs.execute(uloha.pk))
+        uloha.refresh_from_db()
+        self.assertEqual((uloha.stav, uloha.pokusy, uloha.pracovnik), (Uloha.HOTOVO, 1, 'prvni'))
+        self.assertIsNotNone(uloha.trvani)
+        self.assertEqual(self.volani, [{'cislo': 1}])
+
+    def test_expired_lease_is_reclaimed(self):
+        uloha = jobs.enqueue('test_uloha')
+        jobs.claim(1, 'spadly')
+        Uloha.objects.filter(pk=uloha.pk).update(zamceno_do=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(jobs.claim(1, 'novy'), [uloha.pk])
+        # Výsledek pracovníka, kterému úlohu převzali, se nezapíše.
+        jobs._vlastni(Uloha(pk=uloha.pk, pracovnik='spadly')).update(stav=Uloha.HOTOVO)
+        self.assertEqual(Uloha.objects.get(pk=uloha.pk).stav, Uloha.BEZI)
+
+    def test_renew_extends_only_own_leases(self):
+        moje, cizi = jobs.enqueue('test_uloha'), jobs.enqueue('test_uloha')
+        jobs.claim(1, 'prvni')
+        jobs.claim(1, 'druhy')
+        pred = timezone.now() + datetime.timedelta(seconds=5)
+        Uloha.objects.update(zamceno_do=pred)
+        self.assertEqual(jobs.renew([moje.pk, cizi.pk], 'prvni'), 1)
+        self.assertGreater(Uloha.objects.get(pk=moje.pk).zamceno_do, pred + datetime.timedelta(minutes=5))
+        self.assertEqual(Uloha.objects.get(pk=cizi.pk).zamceno_do, pred)
+        self.assertEqual(jobs.claim(1, 'treti'), [])
+
+    def test_failure_is_retried_with_backoff_then_marked_failed(self):
+        uloha = jobs.enqueue('test_selhani')
+        jobs.claim(1, 'w')
+        with self.assertLogs('archiv_app.jobs', 'WARNING'):
+            self.assertFalse(jobs.execute(uloha.pk))
+        uloha.refresh_from_db()
+        self.assertEqual(uloha.stav, Uloha.CEKA)
+        self.assertGreater(uloha.spustit_po, timezone.now() + datetime.timedelta(seconds=50))
+        self.assertIn("nepovedlo se", uloha.chyba)
+        self.assertEqual(jobs.claim(1, 'w'), [])
+
+        Uloha.objects.filter(pk=uloha.pk).update(spustit_po=timezone.now())
+        jobs.claim(1, 'w')
+        with self.assertLogs('archiv_app.jobs', 'ERROR'):
+            self.assertFalse(jobs.execute(uloha.pk))
+        self.assertEqual(Uloha.objects.get(pk=uloha.pk).stav, Uloha.CHYBA)
+
+    def test_rolled_back_request_leaves_no_job(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            jobs.enqueue('test_uloha')
+            raise RuntimeError
+        self.assertFalse(Uloha.objects.exists())
+
+
+# Pracovník provádí úlohy ve vlastním vlákně a spojení, data proto musí být skutečně potvrzená.
+@override_settings(ARCHIV_JOB_QUEUE=True)
+class RunworkerTests(TemporaryMediaMixin, TransactionTestCase):
+    def test_bulk_delete_enqueues_unlink(self):
+        soubor = Soubor.objects.create(file=SimpleUploadedFile("sken.pdf", b"x"), pocet_odkazu=1)
+        dokument = Dokument.objects.create(soubor=soubor, rok_vzniku=1920, jazyk='cs')
+        self.client.post(reverse('archiv_app:bulk_delete_dokumenty'), {'ids': [dokument.pk]})
+        self.assertTrue(os.path.exists(soubor.file.path))
+        uloha = Uloha.objects.get(nazev='smazat_soubory')
+
+        out = StringIO()
+        call_command('runworker', jednou=True, pool='vlakna', pracovnici=1, stdout=out)
+        self.assertIn("Zpracováno úloh: 1, neúspěšných pokusů: 0", out.getvalue())
+        self.assertFalse(os.path.exists(soubor.file.path))
+        self.assertEqual(Uloha.objects.get(pk=uloha.pk).stav, Uloha.HOTOVO)
+
+        out = StringIO()
+        call_command('runworker', statistiky=True, stdout=out)
+        self.assertIn("smazat_soubory: 1 úloh, hotovo 1, čeká 0, chyb 0, pokusů 1", out.getvalue())
+
+    @override_settings(ARCHIV_JOB_LEASE=0.5)
+    def test_worker_renews_lease_of_long_running_job(self):
+        # Úloha běží několikanásobně déle než zámek; druhý pracovník ji mezitím nesmí převzít.
+        prevzate = []
+
+        def dlouha():
+            for _ in range(10):
+                time.sleep(0.1)
+                prevzate.extend(jobs.claim(1, 'druhy'))
+        jobs.register('test_dlouha')(dlouha)
+        self.addCleanup(jobs.ULOHY.pop, 'test_dlouha')
+        uloha = jobs.enqueue('test_dlouha')
+
+        call_command('runworker', jednou=True, pool='vlakna', pracovnici=1, interval=0.05, stdout=StringIO())
+        self.assertEqual(prevzate, [])
+        uloha.refresh_from_db()
+        self.assertEqual((uloha.stav, uloha.pokusy), (Uloha.HOTOVO, 1))
+
+
+class MediaViewTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'archivovane_soubory'))
+        with open(os.path.join(self.media_root, 'archivovane_soubory', 'kronika.pdf'), 'wb') as handle:
+            handle.write(bytes(range(256)) * 4)
+        self.url = '/media/archivovane_soubory/kronika.pdf'
+
+    def test_full_response_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+
+        cached = self.client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        cached = self.client.get(self.url, headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-6'})
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(250, 256)))
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=5000-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=5-3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1024')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"jina-verze"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_rejects_paths_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/archivovane_soubory/neexistuje.pdf').status_code, 404)
+
+    @override_settings(ARCHIV_MEDIA_SENDFILE='x-accel-redirect', ARCHIV_MEDIA_ACCEL_PREFIX='/internal/')
+    def test_accel_redirect_handoff(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/archivovane_soubory/kronika.pdf')
+        self.assertEqual(response.content, b'')
+
+
+class ImportArchivTests(TemporaryMediaMixin, TestCase):
+    def _write(self, name, content):
+        path = os.path.join(self.media_root, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_imports_csv_rows_into_parent_child_and_m2m_tables(self):
+        os.makedirs(os.path.join(self.media_root, 'vstup'))
+        self._write('vstup/sken.pdf', 'obsah skenu')
+        Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        path = self._write('import.csv', (
+            "typ,jmeno,prijmeni,narozeni,popis,rok_vzniku,stoleti_vzniku,osoby,druh,jazyk,typ_fotografie,vyska,sirka,soubor\n"
+            "osoba,Marie,Nováková,1890-05-01,,,,,,,,,,\n"
+            "dokument,,,,Křestní list,1911,,Jan Novák;Marie Nováková,Matrika,cs,,,,sken.pdf\n"
+            "fotografie,,,,Svatba,,19,Marie Nováková,,,Skupinová,9,13,sken.pdf\n"
+            "fotografie,,,,Bez rozměrů,1950,,,,,,,,\n"
+            "dokument,,,,Špatná datace,1911,19,,,,,,,\n"
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_archiv', path, media_dir=os.path.join(self.media_root, 'vstup'), batch_size=2, stdout=out, stderr=err)
+
+        self.assertIn("Hotovo: 3 z 5 řádků uloženo v 2 dávkách", out.getvalue())
+        self.assertIn("Řádek 5: vyska", err.getvalue())
+        self.assertIn("Řádek 6: typ_datace", err.getvalue())
+
+        dokument, foto = ArchivovanyObjekt.objects.order_by('pk')
+        self.assertIsInstance(dokument, Dokument)
+        self.assertIsInstance(foto, Fotografie)
+        self.assertEqual(dokument.druh.nazev, "Matrika")
+        self.assertEqual(dokument.osoba.prijmeni, "Novák")
+        self.assertEqual(sorted(dokument.osoby.values_list('jmeno', flat=True)), ["Jan", "Marie"])
+        self.assertEqual((foto.typ_fotografie, foto.vyska, foto.sirka, foto.stoleti_vzniku), ("Skupinová", 9, 13, '19'))
+        self.assertEqual(Osoba.objects.count(), 2)
+        self.assertEqual(Osoba.objects.get(prijmeni="Nováková").narozeni, datetime.date(1890, 5, 1))
+        self.assertEqual(Soubor.objects.get().pocet_odkazu, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, storage.BLOB_DIR, storage.TMP_DIR)), [])
+        self.assertEqual(search.search_ids("krestni novakova"), [dokument.pk])
+
+    def test_jsonl_dry_run_saves_nothing(self):
+        path = self._write('import.jsonl', (
+            '{"typ": "dokument", "popis": "Dopis", "datum_vzniku_presne": "12.03.1920", '
+            '"osoby": [{"jmeno": "Jan", "prijmeni": "Novák"}]}\n'
+            'neni json\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_archiv', path, dry_run=True, stdout=out, stderr=err)
+        self.assertIn("Hotovo: 1 z 2 řádků ověřeno (bez uložení)", out.getvalue())
+        self.assertIn("Řádek 2: Neplatný JSON", err.getvalue())
+        self.assertFalse(ArchivovanyObjekt.objects.exists())
+        self.assertFalse(Osoba.objects.exists())
+
+
+class ExportArchivTests(TestCase):
+    def setUp(self):
+        jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        marie = Osoba.objects.create(jmeno="Marie", prijmeni="Nováková")
+        matrika = Druh.objects.create(nazev="Matrika")
+        for rok in (1911, 1912, 1913):
+            dokument = Dokument.objects.create(druh=matrika, osoba=marie, popis=f"Zápis {rok}", rok_vzniku=rok, jazyk='de')
+            dokument.osoby.set([jan, marie])
+
+    def _stream(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export_uses_constant_number_of_queries(self):
+        with self.assertNumQueries(2):
+            obsah = self._stream(reverse('archiv_app:export', args=['dokumenty', 'csv']))
+        radky = obsah.lstrip('\ufeff').splitlines()
+        self.assertEqual(len(radky), 4)
+        self.assertTrue(radky[0].startswith("id,typ,popis,"))
+        self.assertIn("Zápis 1911", radky[1])
+        self.assertIn(",1911,rok,", radky[1])
+        self.assertIn("Marie Nováková; Jan Novák", radky[1])
+        self.assertIn("Matrika,de,Němčina", radky[1])
+
+    def test_jsonl_export_round_trips_through_import(self):
+        obsah = self._stream(reverse('archiv_app:export', args=['dokumenty', 'jsonl']))
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as handle:
+            handle.write(obsah)
+        self.addCleanup(os.unlink, handle.name)
+        ArchivovanyObjekt.objects.all().delete()
+
+        call_command('import_archiv', handle.name, stdout=StringIO(), stderr=StringIO())
+        dokument = Dokument.objects.get(popis="Zápis 1912")
+        self.assertEqual((dokument.rok_vzniku, dokument.jazyk, dokument.druh.nazev), (1912, 'de', "Matrika"))
+        self.assertEqual(dokument.osoba.jmeno, "Marie")
+        self.assertEqual(dokument.osoby.count(), 2)
+
+    def test_csv_export_round_trips_multi_word_names(self):
+        ludwig = Osoba.objects.create(jmeno="Ludwig", prijmeni="van Beethoven")
+        jan = Osoba.objects.create(jmeno="Jan Nepomuk", prijmeni="Novák")
+        Dokument.objects.create(popis="Koncert", rok_vzniku=1808, jazyk='de').osoby.set([ludwig, jan])
+        obsah = self._stream(reverse('archiv_app:export', args=['dokumenty', 'csv']))
+        self.assertIn("van Beethoven, Ludwig; Jan Nepomuk Novák", obsah)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as handle:
+            handle.write(obsah)
+        self.addCleanup(os.unlink, handle.name)
+        ArchivovanyObjekt.objects.all().delete()
+
+        call_command('import_archiv', handle.name, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Osoba.objects.count(), 4)
+        self.assertCountEqual(Dokument.objects.get(popis="Koncert").osoby.all(), [ludwig, jan])
+
+    def test_command_and_unknown_type(self):
+        out = StringIO()
+        call_command('export_archiv', 'osoby', format='jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        self.assertEqual(self.client.get('/archiv_app/export/druhy.csv').status_code, 404)
+
+
+class DashboardCounterTests(TestCase):
+    def _counts(self):
+        response = self.client.get(reverse('archiv_app:main'))
+        return tuple(response.context[key] for key in ('dokumenty_count', 'fotografie_count', 'osoby_count'))
+
+    def test_main_page_reads_counters_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('archiv_app:main'))
+
+    def test_counters_follow_creates_and_deletes(self):
+        osoba = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        dokument = Dokument.objects.create(osoba=osoba, rok_vzniku=1916)
+        Dokument.objects.create(rok_vzniku=1917)
+        foto = Fotografie.objects.create(vyska=10, sirka=15, stoleti_vzniku='19')
+        dokument.save()
+        self.assertEqual(self._counts(), (2, 1, 1))
+
+        ArchivovanyObjekt.objects.non_polymorphic().get(pk=foto.pk).delete()
+        dokument.delete()
+        osoba.delete()
+        self.assertEqual(self._counts(), (1, 0, 0))
+
+    def test_import_and_reconciliation(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as handle:
+            handle.write("typ,popis,rok_vzniku,osoby\ndokument,Dopis,1920,Jan Novák\n")
+        self.addCleanup(os.unlink, handle.name)
+        call_command('import_archiv', handle.name, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self._counts(), (1, 0, 1))
+
+        Pocitadlo.objects.filter(nazev='dokumenty').update(hodnota=42)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn("Počítadlo 'dokumenty': uloženo 42, skutečně 1", out.getvalue())
+        self.assertEqual(self._counts(), (1, 0, 1))
+
+    def test_fixture_loads_do_not_touch_counters(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', encoding='utf-8', delete=False) as handle:
+            json.dump([{'model': 'archiv_app.osoba', 'pk': 50, 'fields': {'jmeno': "Jan", 'prijmeni': "Novák", 'upraveno': '2024-01-01T00:00:00Z'}}], handle)
+        self.addCleanup(os.unlink, handle.name)
+        call_command('loaddata', handle.name, verbosity=0)
+        self.assertEqual(Pocitadlo.objects.get(nazev='osoby').hodnota, 0)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self._counts(), (0, 0, 1))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        # ETag zahrnuje CSRF cookie; bez ní by se změnil hned po první odpovědi, která ji nastaví.
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        self.dokument = Dokument.objects.create(osoba=self.jan, rok_vzniku=1916)
+
+    def _get(self, url_name, *args, **headers):
+        return self.client.get(reverse(url_name, args=args), headers=headers)
+
+    def _assert_changes_etag(self, url_name, change, *args):
+        etag = self._get(url_name, *args)['ETag']
+        self.assertEqual(self._get(url_name, *args, if_none_match=etag).status_code, 304)
+        change()
+        response = self._get(url_name, *args, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_list_is_answered_with_304_in_one_query(self):
+        response = self._get('archiv_app:dokumenty_list')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            response = self._get('archiv_app:dokumenty_list', if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_list_etag_follows_rows_links_and_related_tables(self):
+        marie = Osoba.objects.create(jmeno="Marie", prijmeni="Nováková")
+        self._assert_changes_etag('archiv_app:dokumenty_list', lambda: Dokument.objects.create(rok_vzniku=1917))
+        self._assert_changes_etag('archiv_app:dokumenty_list', lambda: self.dokument.osoby.add(marie))
+        self._assert_changes_etag('archiv_app:dokumenty_list', lambda: marie.objekty.clear())
+        self._assert_changes_etag('archiv_app:dokumenty_list', lambda: Osoba.objects.get(pk=self.jan.pk).save())
+        self._assert_changes_etag('archiv_app:dokumenty_list', lambda: Druh.objects.create(nazev="Matrika"))
+        self._assert_changes_etag('archiv_app:osoby_list', lambda: self.dokument.delete())
+
+    def test_edit_page_etag_and_pending_messages(self):
+        self._assert_changes_etag('archiv_app:edit_osoba', lambda: Osoba.objects.get(pk=self.jan.pk).save(), self.jan.pk)
+
+        etag = self._get('archiv_app:druhy_list')['ETag']
+        druh = Druh.objects.create(nazev="Matrika")
+        self.client.post(reverse('archiv_app:delete_druh', args=[druh.pk]))
+        # Po smazání se seznam vrací do původního stavu, zpráva o smazání se ale musí zobrazit.
+        response = self._get('archiv_app:druhy_list', if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Matrika")
+
+
+@override_settings(ARCHIV_PAGE_SIZE=5, ARCHIV_PAGE_SIZE_CHOICES=(5,))
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        self.druh = Druh.objects.create(nazev="Dopis")
+
+    def _create(self, i):
+        datum = datetime.date(2024, 1, 1) + datetime.timedelta(days=i)
+        if i % 2:
+            objekt = Fotografie.objects.create(osoba=self.jan, vyska=10, sirka=15, rok_vzniku=1900 + i, datum_archivace=datum)
+        else:
+            objekt = Dokument.objects.create(osoba=self.jan, druh=self.druh, jazyk='de', rok_vzniku=1900 + i, datum_archivace=datum)
+        objekt.osoby.set([self.jan])
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_interleaving(self):
+        url = reverse('archiv_app:casova_osa')
+        self._create(0)
+        self._create(1)
+        self.client.get(url)
+        baseline = self._count_queries(url)
+        for i in range(2, 12):
+            self._create(i)
+        self.assertEqual(self._count_queries(url), baseline)
+
+    def test_api_merges_children_in_polymorphic_order(self):
+        for i in range(7):
+            self._create(i)
+        expected = list(ArchivovanyObjekt.objects.all())
+        data = self.client.get(reverse('archiv_app:casova_osa_api')).json()
+        rest = self.client.get(data['next']).json()
+        self.assertIsNone(rest['next'])
+
+        results = data['results'] + rest['results']
+        self.assertEqual([r['id'] for r in results], [o.pk for o in expected])
+        self.assertEqual({r['typ'] for r in results}, {'dokument', 'fotografie'})
+        dokument = next(r for r in results if r['typ'] == 'dokument')
+        foto = next(r for r in results if r['typ'] == 'fotografie')
+        self.assertEqual((dokument['druh'], dokument['jazyk_nazev']), ("Dopis", "Němčina"))
+        self.assertEqual((foto['vyska'], foto['sirka']), (10, 15))
+        self.assertEqual(foto['osoby'], [{'jmeno': "Jan", 'prijmeni': "Novák"}])
+
+
+@override_settings(ARCHIV_PAGE_SIZE=3, ARCHIV_PAGE_SIZE_CHOICES=(3,))
+class DataceTests(TestCase):
+    def setUp(self):
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        self.druh = Druh.objects.create(nazev="Dopis")
+
+    def _dokument(self, **datace):
+        return Dokument.objects.create(osoba=self.jan, druh=self.druh, jazyk='cs', **datace)
+
+    def test_range_is_derived_from_each_kind_of_dating(self):
+        presne = self._dokument(datum_vzniku_presne=datetime.date(1905, 3, 4))
+        rok = self._dokument(rok_vzniku=1911)
+        stoleti = self._dokument(stoleti_vzniku='19')
+        self.assertEqual((presne.datace_od, presne.datace_do), (datetime.date(1905, 3, 4), datetime.date(1905, 3, 4)))
+        self.assertEqual((rok.datace_od, rok.datace_do), (datetime.date(1911, 1, 1), datetime.date(1911, 12, 31)))
+        self.assertEqual((stoleti.datace_od, stoleti.datace_do), (datetime.date(1801, 1, 1), datetime.date(1900, 12, 31)))
+
+        rok.rok_vzniku = None
+        rok.stoleti_vzniku = '20'
+        rok.save(update_fields=['rok_vzniku', 'stoleti_vzniku'])
+        rok.refresh_from_db()
+        self.assertEqual((rok.datace_od, rok.datace_do), (datetime.date(1901, 1, 1), datetime.date(2000, 12, 31)))
+
+    def test_overlap_includes_wider_dating_only_on_request(self):
+        uvnitr = self._dokument(rok_vzniku=1895)
+        stoleti = self._dokument(stoleti_vzniku='19')
+        self._dokument(rok_vzniku=1950)
+        url = reverse('archiv_app:dokumenty_list')
+
+        response = self.client.get(url, {'datace_od': 1890, 'datace_do': 1920})
+        self.assertEqual([d.pk for d in response.context['dokumenty_list']], [uvnitr.pk])
+        response = self.client.get(url, {'datace_od': 1920, 'datace_do': 1890, 'prekryv': '1'})
+        self.assertEqual({d.pk for d in response.context['dokumenty_list']}, {uvnitr.pk, stoleti.pk})
+
+    def test_list_sorts_chronologically_across_pages(self):
+        roky = [1960, 1850, 1905, 1999, 1875, 1930, 1911]
+        for rok in roky:
+            self._dokument(rok_vzniku=rok)
+        url = reverse('archiv_app:dokumenty_list')
+        nalezeno = []
+        response = self.client.get(url, {'razeni': 'datace'})
+        pages = 0
+        while True:
+            pages += 1
+            nalezeno += [d.rok_vzniku for d in response.context['dokumenty_list']]
+            if not response.context['page'].next_url:
+                break
+            response = self.client.get(url + response.context['page'].next_url)
+        self.assertEqual(nalezeno, sorted(roky))
+        self.assertEqual(pages, 3)
+
+    def _projit(self, url, response, odkaz):
+        # Projde stránky po odkazech next_url/previous_url; vrací seznam stránek a poslední odpověď.
+        stranky = []
+        while True:
+            stranky.append([d.pk for d in response.context['dokumenty_list']])
+            dalsi = getattr(response.context['page'], odkaz)
+            if not dalsi:
+                return stranky, response
+            response = self.client.get(url + dalsi)
+
+    def test_undated_objects_sort_last_in_both_directions(self):
+        datovane = [self._dokument(rok_vzniku=rok) for rok in (1930, 1850, 1905, 1875)]
+        bez_datace = [self._dokument() for _ in range(3)]
+        url = reverse('archiv_app:dokumenty_list')
+        od_nejstarsich = [d.pk for d in sorted(datovane, key=lambda d: d.rok_vzniku)] + [d.pk for d in bez_datace]
+        od_nejmladsich = [d.pk for d in sorted(datovane, key=lambda d: -d.rok_vzniku)] + [d.pk for d in bez_datace[::-1]]
+
+        stranky, posledni = self._projit(url, self.client.get(url, {'razeni': 'datace'}), 'next_url')
+        self.assertEqual(sum(stranky, []), od_nejstarsich)
+        # Zpět od poslední stránky, jejíž kurzor má datace NULL.
+        zpet, _ = self._projit(url, posledni, 'previous_url')
+        self.assertEqual(zpet[::-1], stranky)
+
+        stranky, _ = self._projit(url, self.client.get(url, {'razeni': '-datace'}), 'next_url')
+        self.assertEqual(sum(stranky, []), od_nejmladsich)
+
+    def test_datace_pages_seek_through_the_bez_datace_index(self):
+        for rok in range(1850, 1870):
+            self._dokument(rok_vzniku=rok)
+        self._dokument()
+        keys = KeysetOrdering(Dokument, filters.RAZENI['datace'])
+        queryset = keys.annotate(Dokument.objects.filter(typ='dokument'))
+        kurzor = keys.decode(keys.encode(keys.queries(queryset)[0][9]))
+        for reverse in (False, True):
+            dotazy = keys.queries(queryset, kurzor, reverse=reverse)
+            # Zbytek úseku datovaných a pak úsek bez datace, oba rozsahem přes objekt_typ_datace_idx.
+            self.assertEqual(len(dotazy), 2)
+            for dotaz in dotazy:
+                plan = dotaz.explain()
+                self.assertIn("objekt_typ_datace_idx (typ=? AND <expr>", plan)
+                self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        self.marie = Osoba.objects.create(jmeno="Marie", prijmeni="Dvořáková")
+        self.dopis = Druh.objects.create(nazev="Dopis")
+        self.kronika = Druh.objects.create(nazev="Kronika")
+        for druh, jazyk, osoby in [
+            (self.dopis, 'cs', [self.jan]),
+            (self.dopis, 'de', [self.jan, self.marie]),
+            (self.kronika, 'cs', [self.marie]),
+        ]:
+            dokument = Dokument.objects.create(osoba=osoby[0], druh=druh, jazyk=jazyk, stoleti_vzniku='19')
+            dokument.osoby.set(osoby)
+
+    def _facety(self, response):
+        return {
+            faseta['nazev']: {moznost['popisek']: moznost['pocet'] for moznost in faseta['moznosti']}
+            for faseta in response.context['filtr']['facety']
+        }
+
+    def test_counts_for_all_facets_come_from_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('archiv_app:dokumenty_list'))
+        self.assertEqual(sum('UNION ALL' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual(self._facety(response), {
+            'jazyk': {"Čeština": 2, "Němčina": 1},
+            'druh': {"Dopis": 2, "Kronika": 1},
+            'stoleti': {"19. století": 3},
+            'osoba': {"Novák Jan": 2, "Dvořáková Marie": 2},
+        })
+
+    def test_selected_facet_filters_list_but_keeps_its_own_counts(self):
+        response = self.client.get(reverse('archiv_app:dokumenty_list'), {'jazyk': 'cs', 'osoba': self.jan.pk})
+        self.assertEqual(len(response.context['dokumenty_list']), 1)
+        facety = self._facety(response)
+        self.assertEqual(facety['jazyk'], {"Čeština": 1, "Němčina": 1})
+        self.assertEqual(facety['druh'], {"Dopis": 1})
+        self.assertEqual(facety['osoba'], {"Novák Jan": 1, "Dvořáková Marie": 1})
+
+    def test_invalid_values_are_ignored(self):
+        response = self.client.get(reverse('archiv_app:dokumenty_list'), {'jazyk': 'xx', 'druh': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['dokumenty_list']), 3)
+
+    def test_fotografie_facets(self):
+        Fotografie.objects.create(osoba=self.jan, typ_fotografie="portrét", vyska=10, sirka=15)
+        Fotografie.objects.create(osoba=self.jan, typ_fotografie="", vyska=10, sirka=15)
+        response = self.client.get(reverse('archiv_app:fotografie_list'), {'typ_fotografie': "portrét"})
+        self.assertEqual(len(response.context['fotografie_list']), 1)
+        self.assertEqual(self._facety(response)['typ_fotografie'], {"portrét": 1})
+
+
+class OsobyAutocompleteTests(TestCase):
+    def setUp(self):
+        self.sebek = Osoba.objects.create(jmeno="Šimon", prijmeni="Šebek")
+        self.dvorak = Osoba.objects.create(jmeno="Jan", prijmeni="Dvořák")
+        ostatni = [Osoba(jmeno="Karel", prijmeni=f"Ostatní{i}") for i in range(30)]
+        for osoba in ostatni:
+            osoba.nastavit_klice()
+        Osoba.objects.bulk_create(ostatni)
+
+    def _hledat(self, dotaz):
+        response = self.client.get(reverse('archiv_app:osoby_autocomplete'), {'q': dotaz})
+        self.assertEqual(response.status_code, 200)
+        return [vysledek['id'] for vysledek in response.json()['results']]
+
+    def test_prefix_search_ignores_diacritics_and_case(self):
+        self.assertEqual(self._hledat("seb"), [self.sebek.pk])
+        self.assertEqual(self._hledat("ŠIM"), [self.sebek.pk])
+        self.assertEqual(self._hledat("jan dvo"), [self.dvorak.pk])
+        self.assertEqual(self._hledat("ebek"), [])
+        self.assertEqual(self._hledat(""), [])
+
+    @override_settings(ARCHIV_AUTOCOMPLETE_LIMIT=5)
+    def test_results_are_limited(self):
+        self.assertEqual(len(self._hledat("ostatni")), 5)
+
+    def test_form_renders_only_selected_persons(self):
+        dokument = Dokument.objects.create(osoba=self.dvorak, rok_vzniku=1920, jazyk='cs')
+        dokument.osoby.set([self.sebek, self.dvorak])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('archiv_app:edit_dokument', args=[dokument.pk]))
+        self.assertNotContains(response, "Ostatní")
+        obsah = response.content.decode()
+        self.assertLess(obsah.index("Dvořák Jan"), obsah.index("Šebek Šimon"))
+        dotazy_na_osoby = [q['sql'] for q in ctx.captured_queries if 'FROM "archiv_app_osoba"' in q['sql']]
+        self.assertEqual(len(dotazy_na_osoby), 1)
+        self.assertIn('IN (', dotazy_na_osoby[0])
+
+    def test_submitted_ids_are_validated_and_keep_their_order(self):
+        data = {'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs'}
+        response = self.client.post(reverse('archiv_app:add_dokument'), {**data, 'osoby_vyber': [self.sebek.pk, 999999]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Dokument.objects.exists())
+
+        response = self.client.post(reverse('archiv_app:add_dokument'), {**data, 'osoby_vyber': [self.sebek.pk, self.dvorak.pk]})
+        self.assertEqual(response.status_code, 302)
+        dokument = Dokument.objects.get()
+        self.assertEqual(dokument.osoba, self.sebek)
+        self.assertEqual(set(dokument.osoby.all()), {self.sebek, self.dvorak})
+
+
+class RowCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.druh = Druh.objects.create(nazev="Dopis")
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        self.dokument = Dokument.objects.create(druh=self.druh, osoba=self.jan, popis="Původní popis", rok_vzniku=1916)
+        self.dokument.osoby.set([self.jan])
+        self.url = reverse('archiv_app:dokumenty_list')
+
+    def test_unchanged_row_comes_from_cache(self):
+        self.assertContains(self.client.get(self.url), "Původní popis")
+        # update() obchází save() i upraveno, klíč řádku zůstává stejný.
+        Dokument.objects.filter(pk=self.dokument.pk).update(popis="Tiše změněno")
+        response = self.client.get(self.url)
+        self.assertContains(response, "Původní popis")
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+
+    def test_row_is_invalidated_by_changes_of_object_and_linked_rows(self):
+        self.client.get(self.url)
+        self.dokument.popis = "Nový popis"
+        self.dokument.save()
+        self.assertContains(self.client.get(self.url), "Nový popis")
+
+        self.jan.prijmeni = "Dvořák"
+        self.jan.save()
+        self.assertContains(self.client.get(self.url), "Jan Dvořák")
+
+        self.druh.nazev = "Kronika"
+        self.druh.save()
+        self.assertContains(self.client.get(self.url), "Kronika")
+
+        self.dokument.osoby.add(Osoba.objects.create(jmeno="Marie", prijmeni="Malá"))
+        self.assertContains(self.client.get(self.url), "Marie Malá")
+
+        self.druh.delete()
+        self.assertNotContains(self.client.get(self.url), "Kronika")
+
+    @override_settings(ARCHIV_ROW_CACHE_TIMEOUT=0)
+    def test_zero_timeout_disables_cache(self):
+        self.client.get(self.url)
+        Dokument.objects.filter(pk=self.dokument.pk).update(popis="Tiše změněno")
+        self.assertContains(self.client.get(self.url), "Tiše změněno")
+
+
+class BenchmarkQueriesTests(TestCase):
+    def test_command_reports_plans_and_rolls_back_seeded_data(self):
+        out = StringIO()
+        call_command('benchmark_queries', objekty=300, repeat=1, page_size=10, stdout=out)
+        self.assertIn("== dokumenty (další stránka) ==", out.getvalue())
+        self.assertIn("USING INDEX objekt_typ_archivace_idx", out.getvalue())
+        self.assertIn("Dotazů s tříděním celého výsledku", out.getvalue())
+        self.assertFalse(ArchivovanyObjekt.objects.exists())
+        self.assertFalse(Osoba.objects.exists())
+
+    def test_any_full_sort_is_flagged_whether_the_plan_scans_or_searches(self):
+        self.assertTrue(benchmark_queries.sorts_whole_result(
+            "7 0 0 SEARCH archiv_app_archivovanyobjekt USING INDEX objekt_datace_idx (datace_od>?)\n"
+            "73 0 0 USE TEMP B-TREE FOR ORDER BY"
+        ))
+        self.assertTrue(benchmark_queries.sorts_whole_result(
+            "9 0 0 SCAN archiv_app_dokument\n86 0 0 USE TEMP B-TREE FOR ORDER BY"
+        ))
+        self.assertFalse(benchmark_queries.sorts_whole_result(
+            "10 0 0 SEARCH archiv_app_archivovanyobjekt USING INDEX objekt_typ_archivace_idx (typ=?)\n"
+            "102 0 0 USE TEMP B-TREE FOR RIGHT PART OF ORDER BY"
+        ))
+
+    def test_view_benchmark_writes_json_and_rolls_back_seeded_data(self):
+        vystup = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(vystup))
+        out, err = StringIO(), StringIO()
+        call_command('benchmark_views', objekty=40, soubory=5, repeat=1, vystup=vystup, stdout=out, stderr=err)
+        self.assertIn("Vygenerováno", out.getvalue())
+        with open(vystup, encoding='utf-8') as handle:
+            data = json.load(handle)
+        self.assertEqual(data['vygenerovano']['soubory'], 5)
+        vysledky = data['vysledky']
+        self.assertEqual(vysledky['dokumenty_list']['status'], 200)
+        self.assertGreater(vysledky['dokumenty_list']['dotazy'], 0)
+        self.assertIn('pamet_kb', vysledky['hledat'])
+        self.assertIn('export osoby.csv', vysledky)
+        self.assertEqual(vysledky['delete_dokument']['preskoceno'], "pouze POST")
+        self.assertEqual(benchmark_views.regrese(vysledky, vysledky, 0), [])
+        self.assertFalse(ArchivovanyObjekt.objects.exists())
+        self.assertFalse(Soubor.objects.exists())
+
+        out = StringIO()
+        call_command('benchmark_views', no_seed=True, repeat=1, porovnat=vystup, tolerance=1000, stdout=out, stderr=err)
+        self.assertEqual(json.loads(out.getvalue())['objekty'], 0)
+        self.assertIn("URL se zhoršením", err.getvalue())
+        self.assertEqual(benchmark_views.pocet('1M'), 1_000_000)
+
+    def test_asgi_benchmark_serves_downloads_on_both_paths(self):
+        out = StringIO()
+        call_command('benchmark_asgi', klienti=3, velikost=16, rychlost=0, vlakna=2, seznamy=0, stdout=out)
+        self.assertIn("WSGI (2 vláken)", out.getvalue())
+        self.assertIn("ASGI (async pohledy)", out.getvalue())
+        self.assertEqual(out.getvalue().count("chybných odpovědí 0"), 2)
+
+
+class SqliteConcurrencyTests(SimpleTestCase):
+    # Testovací databáze je sdílená v paměti; souběh se proto zkouší nad souborem se stejným nastavením.
+    alias = 'souběh'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'soubeh.sqlite3')
+        with self._connect() as db:
+            with db.schema_editor() as editor:
+                editor.create_model(Pocitadlo)
+            Pocitadlo.objects.using(self.alias).create(nazev='soubeh', hodnota=0)
+            sqlite_wal.zapnout_wal(None, SimpleNamespace(connection=db))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _connect(self):
+        test = self
+
+        class Pripojeni:
+            def __enter__(self):
+                self.db = DatabaseWrapper({**connection.settings_dict, 'NAME': test.path}, alias=test.alias)
+                connections[test.alias] = self.db
+                return self.db
+
+            def __exit__(self, *exc):
+                self.db.close()
+                del connections[test.alias]
+
+        return Pripojeni()
+
+    def _migrate(self):
+        # Pro testy, které procházejí celou aplikací, se souborová databáze zmigruje úplně.
+        self.path = os.path.join(self.tmpdir, 'aplikace.sqlite3')
+        with self._connect():
+            call_command('migrate', database=self.alias, verbosity=0)
+
+    def _ve_vlakne(self, funkce, chyby):
+        # Vlákno, jehož výchozí spojení (pohledy, storage) vede do souborové databáze místo testovací.
+        def beh():
+            connections['default'] = DatabaseWrapper({**connection.settings_dict, 'NAME': self.path}, alias=self.alias)
+            try:
+                funkce()
+            except Exception as e:
+                chyby.append(e)
+            finally:
+                connections['default'].close()
+        vlakno = threading.Thread(target=beh)
+        vlakno.start()
+        return vlakno
+
+    def test_pragmas_are_applied_on_connect(self):
+        with self._connect() as db, db.cursor() as cursor:
+            hodnoty = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f"PRAGMA {pragma}")
+                hodnoty[pragma] = cursor.fetchone()[0]
+        self.assertEqual(hodnoty, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'temp_store': 2})
+        self.assertEqual(db.transaction_mode, 'IMMEDIATE')
+
+    def test_connecting_does_not_change_journal_mode(self):
+        # WAL nastavuje jen migrace; pouhé připojení (check, runserver…) soubor databáze nepřepisuje.
+        with self._connect() as db:
+            sqlite_wal.vypnout_wal(None, SimpleNamespace(connection=db))
+        with open(self.path, 'rb') as handle:
+            hlavicka = handle.read(100)
+        with self._connect() as db, db.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'delete')
+        with open(self.path, 'rb') as handle:
+            self.assertEqual(handle.read(100), hlavicka)
+
+    def test_parallel_readers_and_writers_do_not_fail_or_lose_updates(self):
+        zapisovatelu, zapisu, ctenaru = 4, 25, 4
+        chyby, precteno = [], []
+        hotovo = threading.Event()
+
+        def zapisovatel():
+            try:
+                with self._connect():
+                    for _ in range(zapisu):
+                        # Čtení a zápis v jedné transakci: s odloženým BEGIN by souběh skončil chybou zámku.
+                        with transaction.atomic(using=self.alias):
+                            pocitadlo = Pocitadlo.objects.using(self.alias).get(nazev='soubeh')
+                            pocitadlo.hodnota += 1
+                            pocitadlo.save(using=self.alias)
+            except OperationalError as e:
+                chyby.append(e)
+
+        def ctenar():
+            try:
+                with self._connect():
+                    while not hotovo.is_set():
+                        precteno.append(Pocitadlo.objects.using(self.alias).get(nazev='soubeh').hodnota)
+            except OperationalError as e:
+                chyby.append(e)
+
+        ctenari = [threading.Thread(target=ctenar) for _ in range(ctenaru)]
+        zapisovatele = [threading.Thread(target=zapisovatel) for _ in range(zapisovatelu)]
+        for vlakno in ctenari + zapisovatele:
+            vlakno.start()
+        for vlakno in zapisovatele:
+            vlakno.join()
+        hotovo.set()
+        for vlakno in ctenari:
+            vlakno.join()
+
+        self.assertEqual(chyby, [])
+        self.assertTrue(precteno)
+        with self._connect():
+            self.assertEqual(Pocitadlo.objects.using(self.alias).get(nazev='soubeh').hodnota, zapisovatelu * zapisu)
+
+
+    @override_settings(ARCHIV_EXTRACT_ASYNC=False)
+    def test_upload_is_streamed_before_taking_the_write_lock(self):
+        # Zatímco se nahrávaný soubor kopíruje, musí ostatní zápisy projít i s krátkým čekáním na zámek.
+        self._migrate()
+        with self._connect():
+            Pocitadlo.objects.using(self.alias).create(nazev='soubeh', hodnota=0)
+        streamuje, pokracovat = threading.Event(), threading.Event()
+        chyby, odpovedi = [], []
+
+        class PomalySoubor(SimpleUploadedFile):
+            def chunks(self, chunk_size=None):
+                yield b"prvni cast "
+                streamuje.set()
+                pokracovat.wait(5)
+                yield b"zbytek skenu"
+
+        def nahravani():
+            request = RequestFactory().post(reverse('archiv_app:add_dokument'), {'typ_datace': 'rok', 'rok_vzniku': 1920, 'jazyk': 'cs'})
+            request.FILES['uploaded_file'] = PomalySoubor("sken.tif", b"prvni cast zbytek skenu")
+            request._messages = CookieStorage(request)
+            odpovedi.append(views.add_dokument_view(request))
+
+        with override_settings(MEDIA_ROOT=os.path.join(self.tmpdir, 'media')):
+            vlakno = self._ve_vlakne(nahravani, chyby)
+            try:
+                self.assertTrue(streamuje.wait(5))
+                with self._connect() as db:
+                    with db.cursor() as cursor:
+                        cursor.execute("PRAGMA busy_timeout=200")
+                    with transaction.atomic(using=self.alias):
+                        Pocitadlo.objects.using(self.alias).filter(nazev='soubeh').update(hodnota=1)
+            finally:
+                pokracovat.set()
+                vlakno.join()
+
+            self.assertEqual(chyby, [])
+            self.assertEqual(odpovedi[0].status_code, 302)
+            with self._connect():
+                soubor = Dokument.objects.using(self.alias).get().soubor
+                self.assertEqual(soubor.sha256, hashlib.sha256(b"prvni cast zbytek skenu").hexdigest())
+                self.assertTrue(os.path.exists(soubor.file.path))
+
+    def test_unlink_and_reupload_of_same_content_are_serialised(self):
+        # Nahrání stejného obsahu se trefí mezi kontrolu odkazů a smazání souboru; soubor nového řádku musí zůstat.
+        self._migrate()
+        zkontrolovano, nahrano = threading.Event(), threading.Event()
+        chyby = []
+        kontrola = storage.referenced_names
+
+        def pomala_kontrola(names):
+            referenced = kontrola(names)
+            zkontrolovano.set()
+            nahrano.wait(1)
+            return referenced
+
+        with override_settings(MEDIA_ROOT=os.path.join(self.tmpdir, 'media')):
+            name = storage.blob_name(hashlib.sha256(b"stejny obsah").hexdigest(), "sken.pdf")
+            os.makedirs(os.path.dirname(default_storage.path(name)))
+            with open(default_storage.path(name), 'wb') as handle:
+                handle.write(b"stejny obsah")
+
+            def nahrani():
+                zkontrolovano.wait(5)
+                storage.store_upload(SimpleUploadedFile("sken.pdf", b"stejny obsah"))
+                nahrano.set()
+
+            storage.referenced_names = pomala_kontrola
+            try:
+                mazani = self._ve_vlakne(lambda: storage.unlink_names([name]), chyby)
+                nahravani = self._ve_vlakne(nahrani, chyby)
+                mazani.join()
+                nahravani.join()
+            finally:
+                storage.referenced_names = kontrola
+
+            self.assertEqual(chyby, [])
+            with self._connect():
+                self.assertEqual(Soubor.objects.using(self.alias).get().file.name, name)
+            self.assertTrue(os.path.exists(default_storage.path(name)))
+
+@override_settings(ARCHIV_READ_REPLICA='replica')
+class ReplicaRoutingTests(TestCase):
+    # Testovací 'default' a 'replica' jsou dvě samostatné SQLite databáze; replikace se tu neděje.
+    databases = {'default', 'replica'}
+
+    def test_lists_read_from_replica_until_client_writes(self):
+        Druh.objects.using('replica').create(nazev="Jen v replice")
+        url = reverse('archiv_app:druhy_list')
+        self.assertContains(self.client.get(url), "Jen v replice")
+
+        response = self.client.post(reverse('archiv_app:add_druh'), {'nazev': "Nový druh"}, follow=True)
+        self.assertTrue(Druh.objects.using('default').filter(nazev="Nový druh").exists())
+        self.assertFalse(Druh.objects.using('replica').filter(nazev="Nový druh").exists())
+        self.assertContains(response, "Nový druh")
+        self.assertNotContains(response, "Jen v replice")
+        self.assertLessEqual(self.client.cookies['archiv_primary']['max-age'], settings.ARCHIV_REPLICA_STICKY_SECONDS)
+
+        del self.client.cookies['archiv_primary']
+        response = self.client.get(url)
+        self.assertContains(response, "Jen v replice")
+        self.assertNotContains(response, "Nový druh")
+
+    def test_edit_and_delete_read_and_write_primary(self):
+        osoba = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        Osoba.objects.using('replica').create(pk=osoba.pk, jmeno="Jan", prijmeni="Zastaralý")
+        response = self.client.post(reverse('archiv_app:edit_osoba', args=[osoba.pk]), {'jmeno': "Jan", 'prijmeni': "Dvořák"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Osoba.objects.using('default').get(pk=osoba.pk).prijmeni, "Dvořák")
+        self.client.post(reverse('archiv_app:delete_osoba', args=[osoba.pk]))
+        self.assertFalse(Osoba.objects.using('default').exists())
+        self.assertTrue(Osoba.objects.using('replica').exists())
+
+    def test_incidental_writes_do_not_pin_client_to_primary(self):
+        Pocitadlo.objects.all().delete()
+        response = self.client.get(reverse('archiv_app:main'))
+        self.assertTrue(Pocitadlo.objects.using('default').exists())
+        self.assertNotIn('archiv_primary', response.cookies)
+
+        response = self.client.post(reverse('archiv_app:add_druh'), {'nazev': ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('archiv_primary', response.cookies)
+
+    def test_replica_does_not_take_the_write_lock(self):
+        self.assertNotIn('transaction_mode', settings.DATABASES['replica']['OPTIONS'])
+        self.assertEqual(settings.DATABASES['default']['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+
+@override_settings(ROOT_URLCONF='archiv.urls_async', ARCHIV_PAGE_SIZE=3, ARCHIV_PAGE_SIZE_CHOICES=(3,))
+class AsyncViewTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.jan = Osoba.objects.create(jmeno="Jan", prijmeni="Novák")
+        druh = Druh.objects.create(nazev="Dopis")
+        for rok in (1901, 1902, 1903, 1904):
+            dokument = Dokument.objects.create(osoba=self.jan, druh=druh, jazyk='cs', rok_vzniku=rok, popis=f"Dopis {rok}")
+            dokument.osoby.set([self.jan])
+        os.makedirs(os.path.join(self.media_root, 'archivovane_soubory'))
+        with open(os.path.join(self.media_root, 'archivovane_soubory', 'kronika.pdf'), 'wb') as handle:
+            handle.write(bytes(range(256)) * 1024)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+        self.async_client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+
+    async def test_list_matches_sync_view_and_supports_conditional_get(self):
+        url = reverse('archiv_app:dokumenty_list')
+        with override_settings(ROOT_URLCONF='archiv.urls'):
+            expected = await sync_to_async(self.client.get)(url, {'razeni': 'datace', 'jazyk': 'cs'})
+        response = await self.async_client.get(url, {'razeni': 'datace', 'jazyk': 'cs'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [d.pk for d in response.context['dokumenty_list']],
+            [d.pk for d in expected.context['dokumenty_list']],
+        )
+        self.assertEqual(response.context['page'].next_url, expected.context['page'].next_url)
+        self.assertEqual(response['ETag'], expected['ETag'])
+        self.assertEqual(self._facety(response), self._facety(expected))
+
+        cached = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def _facety(self, response):
+        return [(f['nazev'], [(m['hodnota'], m['pocet']) for m in f['moznosti']]) for f in response.context['filtr']['facety']]
+
+    async def test_main_page_counts(self):
+        response = await self.async_client.get(reverse('archiv_app:main'))
+        self.assertEqual((response.context['dokumenty_count'], response.context['osoby_count']), (4, 1))
+
+    async def test_media_is_streamed_asynchronously(self):
+        url = '/media/archivovane_soubory/kronika.pdf'
+        response = await self.async_client.get(url)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(256 * 1024))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), bytes(range(256)) * 1024)
+
+        response = await self.async_client.get(url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual((response.status_code, response['Content-Range']), (206, f'bytes 10-19/{256 * 1024}'))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), bytes(range(10, 20)))
+        cached = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+
+@override_settings(ARCHIV_SERVER_TIMING=True, ARCHIV_SLOW_REQUEST_MS=60 * 1000, ARCHIV_DUPLICATE_QUERY_LIMIT=3)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            Osoba.objects.create(jmeno="Jan", prijmeni=f"Novák{i}")
+        # Zapojí měření i do už otevřeného spojení tohoto vlákna (asynchronní test vytváří middleware v jiném).
+        ServerTimingMiddleware(lambda request: HttpResponse())
+
+    def _metriky(self, response):
+        return {polozka.split(';')[0]: polozka for polozka in response['Server-Timing'].split(', ')}
+
+    def test_header_reports_query_count_and_timings(self):
+        with CaptureQueriesContext(connection) as dotazy:
+            response = self.client.get(reverse('archiv_app:osoby_list'))
+        metriky = self._metriky(response)
+        self.assertEqual(set(metriky), {'db', 'tpl', 'view', 'total'})
+        self.assertIn(f'desc="SQL x{len(dotazy)}"', metriky['db'])
+
+        with override_settings(ARCHIV_SERVER_TIMING=False):
+            # Řetězec middlewarů se sestavuje při prvním požadavku klienta.
+            self.assertNotIn('Server-Timing', self.client_class().get(reverse('archiv_app:osoby_list')))
+            with self.assertRaises(MiddlewareNotUsed):
+                ServerTimingMiddleware(lambda request: HttpResponse())
+
+    def test_logs_slow_requests_and_repeated_queries(self):
+        def n_plus_1(request):
+            for osoba in Osoba.objects.all():
+                Osoba.objects.filter(pk=osoba.pk).exists()
+            return HttpResponse()
+
+        with self.settings(ARCHIV_SLOW_REQUEST_MS=0), self.assertLogs('archiv_app.middleware', 'WARNING') as logy:
+            response = ServerTimingMiddleware(n_plus_1)(RequestFactory().get('/n-plus-1/'))
+        self.assertIn('desc="SQL x4"', response['Server-Timing'])
+        vystup = '\n'.join(logy.output)
+        self.assertIn("GET /n-plus-1/: dotaz se opakuje 3×", vystup)
+        self.assertIn('WHERE "archiv_app_osoba"."id" = ? LIMIT ?', vystup)
+        self.assertIn("Pomalý požadavek GET /n-plus-1/", vystup)
+
+    async def test_async_requests_are_measured(self):
+        async def pohled(request):
+            pocet = await Osoba.objects.acount()
+            return HttpResponse(str(pocet))
+
+        response = await ServerTimingMiddleware(pohled)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'3')
+        self.assertIn('desc="SQL x1"', response['Server-Timing'])
+
+    def test_normalize_sql_merges_queries_differing_in_values(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s) AND nazev = 'a''b'  LIMIT 21"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s) AND nazev = 'c' LIMIT 1"),
+        )
@@ -0,0 +1,123 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .storage import sharded_name
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'nahledy'
+DEFAULT_THUMBNAIL_SIZE = (320, 320)
+DEFAULT_THUMBNAIL_WORKERS = 2
+JPEG_QUALITY = 82
+WEBP_QUALITY = 78
+
+_executor = None
+
+
+def is_available():
+    return Image is not None
+
+
+def get_thumbnail_size():
+    return tuple(getattr(settings, 'ARCHIV_THUMBNAIL_SIZE', DEFAULT_THUMBNAIL_SIZE))
+
+
+def get_thumbnail_workers():
+    return getattr(settings, 'ARCHIV_THUMBNAIL_WORKERS', DEFAULT_THUMBNAIL_WORKERS)
+
+
+def thumbnail_names(file_name, size):
+    base = sharded_name(THUMBNAIL_DIR, PurePosixPath(file_name).stem, f"_{size[0]}x{size[1]}")
+    return f"{base}.jpg", f"{base}.webp"
+
+
+def render_thumbnails(source_path, jpeg_path, webp_path, size):
+    # Běží v pracovním procesu – pracuje pouze s cestami, bez ORM.
+    try:
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(size)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            os.makedirs(os.path.dirname(jpeg_path), exist_ok=True)
+            image.save(jpeg_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            image.save(webp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return False
+    return True
+
+
+def thumbnail_job(soubor):
+    size = get_thumbnail_size()
+    jpeg_name, webp_name = thumbnail_names(soubor.file.name, size)
+    return (
+        soubor.pk, jpeg_name, webp_name,
+        (default_storage.path(soubor.file.name), default_storage.path(jpeg_name), default_storage.path(webp_name), size),
+    )
+
+
+def run_thumbnail_job(args):
+    return render_thumbnails(*args)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=get_thumbnail_workers())
+    return _executor
+
+
+def _store_result(soubor_pk, jpeg_name, webp_name, ok):
+    from . import counters
+    from .models import Soubor
+    if ok:
+        Soubor.objects.filter(pk=soubor_pk).update(nahled=jpeg_name, nahled_webp=webp_name)
+        # Seznam fotografií zobrazuje náhledy, jeho ETag se proto musí změnit.
+        counters.bump_version('verze_objekty')
+    else:
+        logger.warning("Náhled pro soubor #%s se nepodařilo vytvořit.", soubor_pk)
+
+
+def _on_done(soubor_pk, jpeg_name, webp_name, future):
+    try:
+        _store_result(soubor_pk, jpeg_name, webp_name, future.result())
+    except Exception:
+        logger.exception("Generování náhledu pro soubor #%s selhalo.", soubor_pk)
+    finally:
+        connection.close()
+
+
+def generate_now(soubor):
+    soubor_pk, jpeg_name, webp_name, args = thumbnail_job(soubor)
+    _store_result(soubor_pk, jpeg_name, webp_name, render_thumbnails(*args))
+
+
+def generate(soubor):
+    if not is_available() or not soubor.file:
+        return
+    if not getattr(settings, 'ARCHIV_THUMBNAILS_ASYNC', True):
+        generate_now(soubor)
+        return
+    soubor_pk, jpeg_name, webp_name, args = thumbnail_job(soubor)
+    future = _get_executor().submit(run_thumbnail_job, args)
+    future.add_done_callback(lambda f: _on_done(soubor_pk, jpeg_name, webp_name, f))
+
+
+def schedule(soubor):
+    from . import jobs
+    if jobs.is_enabled():
+        # Úloha vzniká v transakci požadavku, pracovník runworker ji uvidí až po potvrzení.
+        jobs.enqueue('vytvorit_nahled', soubor_id=soubor.pk)
+        return
+    transaction.on_commit(lambda: generate(soubor))
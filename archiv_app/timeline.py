@@ -0,0 +1,60 @@
+from django.contrib.contenttypes.models import ContentType
+
+from . import filters
+from .models import ArchivovanyObjekt, Dokument
+from .pagination import paginate_keyset
+
+# Vazby potomků, které se načítají spolu s jejich vlastními sloupci.
+CHILD_SELECT_RELATED = {
+    Dokument: ('druh',),
+}
+SHARED_RELATIONS = ('osoba', 'soubor')
+
+
+def base_queryset():
+    return ArchivovanyObjekt.objects.non_polymorphic().select_related(*SHARED_RELATIONS).prefetch_related('osoby')
+
+
+def _child_queryset(model, ids):
+    # Sloupce rodiče už máme z hlavního dotazu, od potomka stačí jeho vlastní sloupce.
+    fields = [field.name for field in model._meta.local_concrete_fields]
+    return (
+        model.objects.non_polymorphic()
+        .filter(pk__in=ids)
+        .select_related(*CHILD_SELECT_RELATED.get(model, ()))
+        .only(*fields)
+        .order_by()
+    )
+
+
+def _merge(objekt, child):
+    for field in ArchivovanyObjekt._meta.concrete_fields:
+        setattr(child, field.attname, getattr(objekt, field.attname))
+    for name in SHARED_RELATIONS:
+        field = ArchivovanyObjekt._meta.get_field(name)
+        if field.is_cached(objekt):
+            field.set_cached_value(child, field.get_cached_value(objekt))
+    if hasattr(objekt, '_prefetched_objects_cache'):
+        child._prefetched_objects_cache = objekt._prefetched_objects_cache
+    return child
+
+
+def load_children(objekty):
+    # Jeden dotaz IN na každý typ potomka bez ohledu na to, jak se typy na stránce střídají.
+    ids_by_model = {}
+    for objekt in objekty:
+        model = ContentType.objects.get_for_id(objekt.polymorphic_ctype_id).model_class()
+        ids_by_model.setdefault(model, []).append(objekt.pk)
+    children = {}
+    for model, ids in ids_by_model.items():
+        children.update((child.pk, child) for child in _child_queryset(model, ids))
+    # Objekt smazaný mezi dotazy se na stránce vynechá.
+    return [_merge(objekt, children[objekt.pk]) for objekt in objekty if objekt.pk in children]
+
+
+def paginate_timeline(request):
+    queryset, filtr = filters.apply_list_filters(request, base_queryset())
+    ordering = filters.razeni(request) or list(ArchivovanyObjekt._meta.ordering)
+    page = paginate_keyset(request, queryset, ordering)
+    page.object_list = load_children(page.object_list)
+    return page, filtr
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import URLPattern, path
 from .views import *
 
 
@@ -10,6 +10,11 @@ urlpatterns = [
     path('fotografie/', fotografie_list_view, name='fotografie_list'),
     path('osoby/', osoby_list_view, name='osoby_list'),
     path('druhy/', druhy_list_view, name='druhy_list'),
+    path('casova-osa/', casova_osa_view, name='casova_osa'),
+    path('api/casova-osa/', casova_osa_api_view, name='casova_osa_api'),
+    path('hledat/', hledat_view, name='hledat'),
+    path('api/osoby/', osoby_autocomplete_view, name='osoby_autocomplete'),
+    path('export/<slug:typ>.<slug:format>', export_view, name='export'),
     
     path('dokumenty/edit/<int:pk>/', edit_dokument_view, name='edit_dokument'),
     path('fotografie/edit/<int:pk>/', edit_fotografie_view, name='edit_fotografie'),
@@ -19,9 +24,24 @@ urlpatterns = [
     path('fotografie/delete/<int:pk>/', delete_fotografie_view, name='delete_fotografie'),
     path('osoby/delete/<int:pk>/', delete_osoba_view, name='delete_osoba'),
     path('druhy/delete/<int:pk>/', delete_druh_view, name='delete_druh'),
+    path('dokumenty/delete/', bulk_delete_dokumenty_view, name='bulk_delete_dokumenty'),
+    path('fotografie/delete/', bulk_delete_fotografie_view, name='bulk_delete_fotografie'),
     
     path('dokumenty/add/', add_dokument_view, name='add_dokument'),
     path('fotografie/add/', add_fotografie_view, name='add_fotografie'),
     path('osoby/add/', add_osoba_view, name='add_osoba'),
     path('druh/add/', add_druh_view, name='add_druh'),
-] 
\ No newline at end of file
+]
+
+# Pro ASGI (archiv.urls_async): čtecí pohledy v asynchronní podobě, ostatní beze změny.
+ASYNC_VIEWS = {
+    'main': amain_page,
+    'dokumenty_list': adokumenty_list_view,
+    'fotografie_list': afotografie_list_view,
+    'osoby_list': aosoby_list_view,
+    'druhy_list': adruhy_list_view,
+}
+async_urlpatterns = [
+    URLPattern(pattern.pattern, ASYNC_VIEWS.get(pattern.name, pattern.callback), pattern.default_args, pattern.name)
+    for pattern in urlpatterns
+]
@@ -1,29 +1,128 @@
-from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+from django.views.decorators.http import require_POST, require_safe
 from django.contrib import messages
 from .models import *
 from .forms import *
+from django.conf import settings
 from django.urls import reverse_lazy
 from django.shortcuts import get_object_or_404, render, redirect
-from django.db import models, IntegrityError
+from django.db import models, IntegrityError, transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from .pagination import apaginate_keyset, paginate_keyset
+from . import conditional, counters, export, filters, routers, search, storage, timeline
 
 
+def _main_context(counts):
+    return {
+        'dokumenty_count': counts['dokumenty'],
+        'fotografie_count': counts['fotografie'],
+        'osoby_count': counts['osoby'],
+    }
+
 def main_page(request):
-    context = {
-        'dokumenty_count': Dokument.objects.count(),
-        'fotografie_count': Fotografie.objects.count(),
-        'osoby_count': Osoba.objects.count(),
+    return render(request, 'archiv_app/main.html', _main_context(counters.get_counts()))
+
+async def amain_page(request):
+    context = _main_context(await counters.aget_counts())
+    return await sync_to_async(render)(request, 'archiv_app/main.html', context)
+
+# Filtr 'typ' je u potomků nadbytečný, SQLite ale díky němu projde index (typ, -datum_archivace)
+# v pořadí řazení místo třídění celé tabulky potomka.
+LIST_QUERYSET_SPECS = {
+    Dokument: {
+        'filter': {'typ': 'dokument'},
+        'list_filters': True,
+        'facets': ('jazyk', 'druh', 'stoleti', 'osoba'),
+        'non_polymorphic': True,
+        'select_related': ('druh', 'osoba', 'soubor'),
+        'prefetch_related': ('osoby',),
+    },
+    Fotografie: {
+        'filter': {'typ': 'fotografie'},
+        'list_filters': True,
+        'facets': ('typ_fotografie', 'stoleti', 'osoba'),
+        'non_polymorphic': True,
+        'select_related': ('osoba', 'soubor'),
+        'prefetch_related': ('osoby',),
+    },
+    Osoba: {
+        'queryset_methods': ('with_archivalie_count',),
+    },
+}
+
+# Tabulky, jejichž změna mění vykreslení stránek modelu (vazby, výběry ve formulářích, náhledy).
+ETAG_VERSIONS = {
+    ArchivovanyObjekt: ('verze_objekty', 'verze_osoby', 'verze_druhy'),
+    Dokument: ('verze_objekty', 'verze_osoby', 'verze_druhy'),
+    Fotografie: ('verze_objekty', 'verze_osoby'),
+    Osoba: ('verze_osoby', 'verze_objekty'),
+    Druh: ('verze_druhy',),
+}
+
+def _apply_list_queryset_spec(queryset, spec: dict):
+    if spec.get('filter'):
+        queryset = queryset.filter(**spec['filter'])
+    if spec.get('non_polymorphic'):
+        queryset = queryset.non_polymorphic()
+    if spec.get('select_related'):
+        queryset = queryset.select_related(*spec['select_related'])
+    if spec.get('prefetch_related'):
+        queryset = queryset.prefetch_related(*spec['prefetch_related'])
+    for method_name in spec.get('queryset_methods', ()):
+        queryset = getattr(queryset, method_name)()
+    return queryset
+
+def _list_setup(ModelClass, order_by_field):
+    spec = LIST_QUERYSET_SPECS.get(ModelClass, {})
+    queryset = _apply_list_queryset_spec(ModelClass.objects.all(), spec)
+    ordering = [order_by_field] if order_by_field else list(ModelClass._meta.ordering)
+    return spec, queryset, ordering
+
+# Vykreslené řádky seznamů se cachují pod klíčem (pk, verze_radku); změna řádku dává nový klíč.
+def _list_context(context_object_name, page, filtr):
+    return {
+        context_object_name: page.object_list,
+        'page': page,
+        'filtr': filtr,
+        'radky_cache_timeout': settings.ARCHIV_ROW_CACHE_TIMEOUT,
     }
-    return render(request, 'archiv_app/main.html', context)
 
+@routers.read_from_replica
 def _generic_list_view(request, ModelClass: type[models.Model], template_name: str, context_object_name: str, order_by_field: str = None):
-    queryset = ModelClass.objects.all()
-    if order_by_field:
-        queryset = queryset.order_by(order_by_field)
-    
-    context = {
-        context_object_name: queryset,
-    }
-    return render(request, template_name, context)
+    validators = conditional.list_validators(request, ModelClass.objects.all(), ETAG_VERSIONS[ModelClass])
+    not_modified = conditional.not_modified_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+
+    spec, queryset, ordering = _list_setup(ModelClass, order_by_field)
+    filtr = None
+    if spec.get('list_filters'):
+        queryset, filtr = filters.apply_list_filters(request, queryset, spec.get('facets', ()))
+        ordering = filters.razeni(request) or ordering
+    page = paginate_keyset(request, queryset, ordering)
+
+    context = _list_context(context_object_name, page, filtr)
+    return conditional.set_validators(render(request, template_name, context), validators)
+
+# Asynchronní varianta pro ASGI: dotazy jdou přes async ORM, šablona se vykreslí mimo smyčku událostí.
+@routers.read_from_replica
+async def _ageneric_list_view(request, ModelClass: type[models.Model], template_name: str, context_object_name: str, order_by_field: str = None):
+    validators = await conditional.alist_validators(request, ModelClass.objects.all(), ETAG_VERSIONS[ModelClass])
+    not_modified = await sync_to_async(conditional.not_modified_response)(request, validators)
+    if not_modified is not None:
+        return not_modified
+
+    spec, queryset, ordering = _list_setup(ModelClass, order_by_field)
+    filtr = None
+    if spec.get('list_filters'):
+        queryset, filtr = await filters.aapply_list_filters(request, queryset, spec.get('facets', ()))
+        ordering = filters.razeni(request) or ordering
+    page = await apaginate_keyset(request, queryset, ordering)
+
+    context = _list_context(context_object_name, page, filtr)
+    response = await sync_to_async(render)(request, template_name, context)
+    return conditional.set_validators(response, validators)
 
 def dokumenty_list_view(request):
     return _generic_list_view(request, Dokument, 'archiv_app/dokumenty_list.html', 'dokumenty_list')
@@ -37,15 +136,95 @@ def osoby_list_view(request):
 def druhy_list_view(request):
     return _generic_list_view(request, Druh, 'archiv_app/druhy_list.html', 'druhy_list', order_by_field='nazev')
 
+async def adokumenty_list_view(request):
+    return await _ageneric_list_view(request, Dokument, 'archiv_app/dokumenty_list.html', 'dokumenty_list')
+
+async def afotografie_list_view(request):
+    return await _ageneric_list_view(request, Fotografie, 'archiv_app/fotografie_list.html', 'fotografie_list')
+
+async def aosoby_list_view(request):
+    return await _ageneric_list_view(request, Osoba, 'archiv_app/osoby_list.html', 'osoby')
+
+async def adruhy_list_view(request):
+    return await _ageneric_list_view(request, Druh, 'archiv_app/druhy_list.html', 'druhy_list', order_by_field='nazev')
+
+@routers.read_from_replica
+def casova_osa_view(request):
+    validators = conditional.list_validators(request, ArchivovanyObjekt.objects.all(), ETAG_VERSIONS[ArchivovanyObjekt])
+    not_modified = conditional.not_modified_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+
+    page, filtr = timeline.paginate_timeline(request)
+    response = render(request, 'archiv_app/casova_osa.html', {
+        'objekty': page.object_list,
+        'page': page,
+        'filtr': filtr,
+    })
+    return conditional.set_validators(response, validators)
+
+@require_safe
+@routers.read_from_replica
+def casova_osa_api_view(request):
+    validators = conditional.list_validators(request, ArchivovanyObjekt.objects.all(), ETAG_VERSIONS[ArchivovanyObjekt])
+    not_modified = conditional.not_modified_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+
+    page, _ = timeline.paginate_timeline(request)
+    response = JsonResponse({
+        'results': [export.objekt_record(objekt) for objekt in page.object_list],
+        'next': request.build_absolute_uri(page.next_url) if page.next_url else None,
+        'previous': request.build_absolute_uri(page.previous_url) if page.previous_url else None,
+    }, json_dumps_params={'ensure_ascii': False})
+    return conditional.set_validators(response, validators)
+
+@routers.read_from_replica
+def hledat_view(request):
+    dotaz = request.GET.get('q', '').strip()
+    vysledky = []
+    if dotaz:
+        ids = search.search_ids(dotaz)
+        objekty = ArchivovanyObjekt.objects.non_polymorphic().filter(pk__in=ids).select_related('osoba').prefetch_related('osoby')
+        objekty_podle_id = {objekt.pk: objekt for objekt in objekty}
+        vysledky = [objekty_podle_id[pk] for pk in ids if pk in objekty_podle_id]
+
+    return render(request, 'archiv_app/hledani.html', {
+        'dotaz': dotaz,
+        'vysledky': vysledky,
+    })
+
+@require_safe
+@routers.read_from_replica
+def osoby_autocomplete_view(request):
+    limit = getattr(settings, 'ARCHIV_AUTOCOMPLETE_LIMIT', DEFAULT_AUTOCOMPLETE_LIMIT)
+    osoby = (
+        Osoba.objects.podle_zacatku(request.GET.get('q', ''))
+        .order_by('klic_prijmeni', 'klic_jmeno', 'pk')
+        .only('jmeno', 'prijmeni', 'narozeni', 'umrti')[:limit]
+    )
+    return JsonResponse({
+        'results': [{'id': osoba.pk, 'text': osoba_popisek(osoba)} for osoba in osoby],
+    }, json_dumps_params={'ensure_ascii': False})
+
+@require_safe
+def export_view(request, typ, format):
+    if typ not in export.EXPORT_SOURCES or format not in export.EXPORT_FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(export.stream_export(typ, format), content_type=export.EXPORT_FORMATS[format])
+    filename = f"archiv-{typ}-{timezone.localdate():%Y%m%d}.{format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 def _druh_pre_delete_check(druh_instance):
     if Dokument.objects.filter(druh=druh_instance).exists():
         return False, f"Druh '{druh_instance.nazev}' nelze smazat, protože je používán alespoň jedním dokumentem."
     return True, ""
 
 def _delete_associated_soubor_callback(instance_being_deleted):
-    soubor_obj = getattr(instance_being_deleted, 'soubor', None)
-    if soubor_obj:
-        soubor_obj.delete()
+    if getattr(instance_being_deleted, 'soubor', None):
+        instance_being_deleted.release_soubor()
 
 @require_POST
 def _generic_delete_view(request, pk, ModelClass: type[models.Model], 
@@ -63,10 +242,12 @@ def _generic_delete_view(request, pk, ModelClass: type[models.Model],
             return redirect(success_url_name)
 
     try:
-        if pre_main_obj_delete_related_callback:
-            pre_main_obj_delete_related_callback(obj)
+        with transaction.atomic():
+            if pre_main_obj_delete_related_callback:
+                pre_main_obj_delete_related_callback(obj)
 
-        obj.delete()
+            obj.delete()
+        routers.mark_written()
         messages.success(request, f"{obj_type_name.capitalize()} '{obj_repr}' byl úspěšně smazán.")
     except IntegrityError:
         messages.error(request, f"{obj_type_name.capitalize()} '{obj_repr}' nelze smazat, protože je používán v jiných záznamech.")
@@ -75,6 +256,22 @@ def _generic_delete_view(request, pk, ModelClass: type[models.Model],
     
     return redirect(success_url_name)
 
+# Hromadné mazání v jedné transakci; soubory se z disku odstraní až po potvrzení, mimo požadavek.
+def _generic_bulk_delete_view(request, ModelClass: type[models.Model], success_url_name: str):
+    ids = {int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()}
+    if not ids:
+        messages.error(request, "Nebyly vybrány žádné položky ke smazání.")
+        return redirect(success_url_name)
+
+    with transaction.atomic():
+        objekty = ModelClass.objects.non_polymorphic().filter(pk__in=ids)
+        soubor_ids = list(objekty.values_list('soubor_id', flat=True))
+        objekty.delete()
+        storage.release_soubory(soubor_ids)
+    routers.mark_written()
+    messages.success(request, f"{ModelClass._meta.verbose_name_plural}: smazáno {len(soubor_ids)}.")
+    return redirect(success_url_name)
+
 @require_POST
 def delete_druh_view(request, pk):
     return _generic_delete_view(request, pk, Druh, 
@@ -96,17 +293,34 @@ def delete_fotografie_view(request, pk):
                                 obj_type_name="Fotografie",
                                 pre_main_obj_delete_related_callback=_delete_associated_soubor_callback)
 
+@require_POST
+def bulk_delete_dokumenty_view(request):
+    return _generic_bulk_delete_view(request, Dokument, reverse_lazy('archiv_app:dokumenty_list'))
+
+@require_POST
+def bulk_delete_fotografie_view(request):
+    return _generic_bulk_delete_view(request, Fotografie, reverse_lazy('archiv_app:fotografie_list'))
+
 @require_POST
 def delete_osoba_view(request, pk):
     return _generic_delete_view(request, pk, Osoba, 
                                 success_url_name=reverse_lazy('archiv_app:osoby_list'), 
                                 obj_type_name="Osoba")
 
+# Zápisová transakce drží pod BEGIN IMMEDIATE zámek celé databáze; nahraný soubor se proto
+# zkopíruje a zahashuje ještě před ní a v transakci zůstanou jen zápisy řádků.
+def _prepare_upload(form):
+    if isinstance(form, FileUploadMixin):
+        form.prepare_upload()
+
 def _generic_add_view(request, FormClass, success_url_name, form_title, object_type_name_singular, template_name='archiv_app/object_form.html'):
     if request.method == 'POST':
         form = FormClass(request.POST, request.FILES)
         if form.is_valid():
-            instance = form.save()
+            _prepare_upload(form)
+            with transaction.atomic():
+                instance = form.save()
+            routers.mark_written()
             messages.success(request, f"{object_type_name_singular.capitalize()} '{instance}' byl úspěšně přidán.")
             return redirect(success_url_name)
         else:
@@ -165,21 +379,31 @@ def _generic_edit_view(request, pk, ModelClass, FormClass, success_url_name, for
     if request.method == 'POST':
         form = FormClass(request.POST, request.FILES, instance=obj)
         if form.is_valid():
-            form.save()
+            _prepare_upload(form)
+            with transaction.atomic():
+                form.save()
+            routers.mark_written()
             messages.success(request, f"{ModelClass.__name__} '{obj}' byl úspěšně upraven.")
             return redirect(success_url_name)
         else:
             messages.error(request, "Prosím, opravte chyby ve formuláři.")
     else:
+        validators = conditional.object_validators(request, obj, ETAG_VERSIONS[ModelClass])
+        not_modified = conditional.not_modified_response(request, validators)
+        if not_modified is not None:
+            return not_modified
         form = FormClass(instance=obj)
 
-    return render(request, template_name, {
+    response = render(request, template_name, {
         'form': form, 
         'object': obj, 
         'form_title': form_title, 
         'is_edit': True,
         'type': ModelClass.__name__.lower() 
     })
+    if request.method != 'POST':
+        conditional.set_validators(response, validators)
+    return response
 
 def edit_dokument_view(request, pk):
     return _generic_edit_view(